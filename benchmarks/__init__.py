@@ -0,0 +1,4 @@
+"""
+ResaleX - Замеры производительности
+startup.py — время запуска; run.py — сценарии нагрузки на сгенерированном наборе данных.
+"""
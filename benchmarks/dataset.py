@@ -0,0 +1,182 @@
+"""
+ResaleX - Данные для нагрузочных замеров
+Генерирует воспроизводимый набор (одинаковый для одного seed) пакетными INSERT без ORM:
+при scale=1 это 100 тыс. пользователей, 1 млн товаров, 100 тыс. заказов и 5 млн сообщений чата.
+Вызывается в контексте приложения с пустой базой, к которой применены миграции.
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+
+from extensions import db, search_backend, password_hasher
+from models import User, Product, Order, ChatMessage, rebuild_user_stats
+
+# Размер набора при scale=1
+SIZES = {'users': 100_000, 'products': 1_000_000, 'orders': 100_000, 'messages': 5_000_000}
+SELLER_SHARE = 0.1
+PENDING_SHARE = 0.05  # товары на модерации; проданные — те, на которые есть заказы
+CHUNK_SIZE = 10_000
+PASSWORD = 'benchmark'
+
+CATEGORIES = ['sneakers', 'clothing', 'accessories', 'electronics', 'collectibles']
+CONDITIONS = ['new', 'like_new', 'good', 'fair', 'poor']
+BRANDS = ['Nike', 'Adidas', 'Jordan', 'New Balance', 'Puma', 'Supreme', 'Stone Island', 'Apple',
+          'Sony', 'Rolex', 'Casio', 'Carhartt', 'Patagonia', 'Yeezy', 'Off-White', 'Vans']
+MODELS = ['Air Max', 'Dunk Low', 'Retro High', 'Ultraboost', 'Hoodie', 'Parka', 'Cargo Pants', 'Cap',
+          'Backpack', 'Watch', 'Headphones', 'Console', 'Figure', 'Card', 'Tee', 'Runner']
+COLORS = ['Black', 'White', 'Red', 'Navy', 'Olive', 'Grey', 'Sand', 'Royal', 'Pink', 'Orange']
+ORDER_STATUSES = ['paid', 'shipped', 'delivered', 'delivered', 'delivered', 'cancelled']
+PHRASES = ['Здравствуйте! Товар еще в наличии?', 'Отправлю завтра утром', 'Трек-номер пришлю вечером',
+           'Можно фото бирки?', 'Спасибо, все получил', 'Размер соответствует?', 'Оплатил, жду отправку']
+
+
+def sizes(scale):
+    """Число строк каждой таблицы при заданном масштабе (не меньше минимума для сценариев)"""
+    minimum = {'users': 20, 'products': 100, 'orders': 20, 'messages': 100}
+    return {table: max(minimum[table], int(count * scale)) for table, count in SIZES.items()}
+
+
+def _insert(model, rows):
+    """Пакетная вставка: один INSERT с executemany на CHUNK_SIZE строк"""
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            db.session.execute(insert(model), chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(model), chunk)
+        count += len(chunk)
+    return count
+
+
+def seed(scale=1.0, seed=42, progress=print):
+    """
+    Заполняет пустую базу и возвращает описание набора: размеры и id,
+    по которым сценарии выбирают пользователей, товары и заказы.
+    """
+    if db.session.query(User.id).first() is not None:
+        raise RuntimeError('Набор для замеров заполняется только в пустую базу')
+    rng = random.Random(seed)
+    counts = sizes(scale)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    def created(days=365):
+        return now - timedelta(seconds=rng.randrange(days * 24 * 3600))
+
+    # Хэш пароля считается один раз: пароль у всех пользователей набора одинаковый
+    password_hash = password_hasher.hash(PASSWORD)
+    sellers = max(2, int(counts['users'] * SELLER_SHARE))
+    roles = {1: 'admin', 2: 'moderator'}
+    _insert(User, ({
+        'id': user_id,
+        'username': f'user{user_id}',
+        'email': f'user{user_id}@example.com',
+        'password_hash': password_hash,
+        'role': roles.get(user_id) or ('seller' if user_id <= sellers + 2 else 'user'),
+        'created_at': created(),
+        'is_active': True,
+    } for user_id in range(1, counts['users'] + 1)))
+    seller_ids = range(3, sellers + 3)
+    buyer_ids = range(sellers + 3, counts['users'] + 1)
+    progress(f'  пользователи: {counts["users"]}')
+
+    # Заказы ссылаются на первые товары: они проданы, остальные одобрены или ждут модерации
+    sold = counts['orders']
+    product_sellers = {}
+
+    def products():
+        for product_id in range(1, counts['products'] + 1):
+            brand, model = rng.choice(BRANDS), rng.choice(MODELS)
+            seller_id = rng.choice(seller_ids)
+            if product_id <= sold:
+                product_sellers[product_id] = seller_id
+                status = 'sold'
+            else:
+                status = 'pending' if rng.random() < PENDING_SHARE else 'approved'
+            timestamp = created()
+            yield {
+                'id': product_id,
+                'name': f'{brand} {model} {rng.choice(COLORS)}',
+                'description': f'{brand} {model}, {rng.choice(CONDITIONS)}. Оригинал, полный комплект.',
+                'brand': brand,
+                'category': rng.choice(CATEGORIES),
+                'size': str(rng.randrange(36, 47)),
+                'condition': rng.choice(CONDITIONS),
+                'price': round(rng.uniform(20, 2000), 2),
+                'seller_id': seller_id,
+                'status': status,
+                'created_at': timestamp,
+                'updated_at': timestamp,
+            }
+    _insert(Product, products())
+    progress(f'  товары: {counts["products"]}')
+
+    order_parties = {}
+
+    def orders():
+        for order_id in range(1, counts['orders'] + 1):
+            buyer_id = rng.choice(buyer_ids)
+            order_parties[order_id] = (buyer_id, product_sellers[order_id])
+            timestamp = created(90)
+            yield {
+                'id': order_id,
+                'buyer_id': buyer_id,
+                'product_id': order_id,
+                'total_amount': round(rng.uniform(20, 2000), 2),
+                'status': rng.choice(ORDER_STATUSES),
+                'created_at': timestamp,
+                'updated_at': timestamp,
+            }
+    _insert(Order, orders())
+    progress(f'  заказы: {counts["orders"]}')
+
+    def messages():
+        # Сообщения идут подряд по чатам заказов, как при живой переписке
+        per_order = counts['messages'] // counts['orders']
+        extra = counts['messages'] - per_order * counts['orders']
+        message_id = 0
+        for order_id in range(1, counts['orders'] + 1):
+            buyer_id, seller_id = order_parties[order_id]
+            timestamp = created(90)
+            for _ in range(per_order + (1 if order_id <= extra else 0)):
+                message_id += 1
+                sender, receiver = (buyer_id, seller_id) if rng.random() < 0.5 else (seller_id, buyer_id)
+                timestamp += timedelta(minutes=rng.randrange(1, 240))
+                yield {
+                    'id': message_id,
+                    'sender_id': sender,
+                    'receiver_id': receiver,
+                    'order_id': order_id,
+                    'message': rng.choice(PHRASES),
+                    'created_at': timestamp,
+                    'is_read': rng.random() < 0.9,
+                }
+    _insert(ChatMessage, messages())
+    progress(f'  сообщения: {counts["messages"]}')
+
+    search_backend.rebuild()
+    rebuild_user_stats()
+    db.session.commit()
+    if db.engine.dialect.name == 'sqlite':
+        # Статистика для планировщика, как у базы, которая давно в работе
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+    progress(f'  индексы и счетчики собраны за {time.perf_counter() - started:.1f} с')
+
+    return {
+        'scale': scale,
+        'seed': seed,
+        'counts': counts,
+        'admin_id': 1,
+        'moderator_id': 2,
+        'seller_ids': [seller_ids.start, seller_ids.stop],
+        'buyer_ids': [buyer_ids.start, buyer_ids.stop],
+        'sold_products': sold,
+    }
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+ResaleX - Нагрузочные замеры
+Генерирует (один раз для пары scale/seed) набор данных в SQLite, прогоняет сценарии
+через тестовый клиент Flask в одном процессе и печатает пропускную способность
+и p50/p95/p99 по маршрутам. Результат сравнивается с сохраненным baseline:
+маршруты, у которых p95 вырос больше порога, помечаются как регрессия.
+Запуск: python -m benchmarks.run [--scale 1] [--requests 300] [--save-baseline] [--check]
+"""
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(ROOT, 'benchmarks', 'baselines')
+# Изменения короче этого порога — шум таймера, а не регрессия
+MIN_REGRESSION_MS = 1.0
+
+
+def percentile(values, p):
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def dataset_path(data_dir, scale, seed):
+    return os.path.join(data_dir, f'dataset-{scale:g}-{seed}.db')
+
+
+def prepare_dataset(data_dir, scale, seed, progress=print):
+    """
+    Возвращает путь к базе с набором и его описание; набор генерируется,
+    только если для этой пары scale/seed его еще нет.
+    """
+    from flask_migrate import upgrade
+    from app import create_app
+    from extensions import db
+    from benchmarks import dataset
+
+    path = dataset_path(data_dir, scale, seed)
+    info_path = f'{path}.json'
+    if os.path.exists(path) and os.path.exists(info_path):
+        with open(info_path) as source:
+            return path, json.load(source)
+
+    os.makedirs(data_dir, exist_ok=True)
+    for stale in (path, f'{path}-wal', f'{path}-shm'):
+        if os.path.exists(stale):
+            os.remove(stale)
+    progress(f'Генерация набора scale={scale:g} seed={seed}:')
+    # Без метрик: пакетные INSERT иначе заполнили бы журнал медленных запросов
+    app = create_app('testing', SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}', METRICS_ENABLED=False)
+    with app.app_context():
+        upgrade()
+        info = dataset.seed(scale, seed, progress=progress)
+        db.session.remove()
+        db.engine.dispose()
+    with open(info_path, 'w') as out:
+        json.dump(info, out, indent=2)
+    return path, info
+
+
+def copy_database(source, target):
+    """Рабочая копия набора: сценарии пишут в базу, а исходный набор остается неизменным"""
+    for stale in (target, f'{target}-wal', f'{target}-shm'):
+        if os.path.exists(stale):
+            os.remove(stale)
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def summarize(bench, elapsed):
+    """Пропускная способность и перцентили по маршрутам за один раунд"""
+    total = sum(len(timings) for timings in bench.timings.values())
+    return {
+        'requests': total,
+        'seconds': round(elapsed, 3),
+        'rps': round(total / elapsed, 1) if elapsed else 0.0,
+        'routes': {
+            route: {
+                'count': len(timings),
+                'p50_ms': round(percentile(timings, 50) * 1000, 3),
+                'p95_ms': round(percentile(timings, 95) * 1000, 3),
+                'p99_ms': round(percentile(timings, 99) * 1000, 3),
+                'errors': bench.errors[route],
+            }
+            for route, timings in sorted(bench.timings.items())
+        },
+    }
+
+
+def best_of(first, second):
+    """
+    Лучший из раундов, как у timeit: фоновая нагрузка на машине только замедляет,
+    поэтому минимум ближе всего к стоимости самого кода. Ошибки суммируются.
+    """
+    best = first if first['rps'] >= second['rps'] else second
+    routes = {}
+    for route in sorted(set(first['routes']) | set(second['routes'])):
+        candidates = [summary['routes'][route] for summary in (first, second) if route in summary['routes']]
+        routes[route] = {
+            'count': max(stats['count'] for stats in candidates),
+            **{key: min(stats[key] for stats in candidates) for key in ('p50_ms', 'p95_ms', 'p99_ms')},
+            'errors': sum(stats['errors'] for stats in candidates),
+        }
+    return {**best, 'routes': routes}
+
+
+def run(scale=1.0, seed=42, requests=300, workloads=None, data_dir=None, warmup=20, rounds=3, progress=print):
+    """Прогоняет сценарии и возвращает результаты в виде, который сохраняется как baseline"""
+    from app import create_app
+    from extensions import db
+    from benchmarks.workloads import WORKLOADS, Bench
+
+    data_dir = data_dir or os.path.join(ROOT, 'instance', 'benchmarks')
+    source, info = prepare_dataset(data_dir, scale, seed, progress)
+    work = os.path.join(data_dir, 'run.db')
+    copy_database(source, work)
+
+    app = create_app('testing', SQLALCHEMY_DATABASE_URI=f'sqlite:///{work}', PAYMENT_GATEWAY='fake')
+    bench = Bench(app, info, seed)
+    results = {
+        'meta': {
+            'scale': scale,
+            'seed': seed,
+            'requests': requests,
+            'rounds': rounds,
+            'counts': info['counts'],
+            'python': sys.version.split()[0],
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'workloads': {},
+    }
+    for name in workloads or WORKLOADS:
+        scenario = WORKLOADS[name]
+        # Прогрев: кэши, подготовленные запросы и страницы базы в памяти
+        scenario(bench, warmup)
+        best = None
+        for _ in range(rounds):
+            bench.reset()
+            started = time.perf_counter()
+            scenario(bench, requests)
+            summary = summarize(bench, time.perf_counter() - started)
+            best = summary if best is None else best_of(best, summary)
+        results['workloads'][name] = best
+        progress(f'  {name}: {best["requests"]} запросов, {best["rps"]} запросов/с')
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    return results
+
+
+def compare(results, baseline, threshold=0.2):
+    """Регрессии относительно baseline: [(сценарий, маршрут, было p95, стало p95)]"""
+    regressions = []
+    for name, workload in results['workloads'].items():
+        previous = baseline.get('workloads', {}).get(name, {}).get('routes', {})
+        for route, stats in workload['routes'].items():
+            if route not in previous:
+                continue
+            before, after = previous[route]['p95_ms'], stats['p95_ms']
+            if after > before * (1 + threshold) and after - before > MIN_REGRESSION_MS:
+                regressions.append((name, route, before, after))
+    return regressions
+
+
+def report(results, baseline=None, out=print):
+    for name, workload in results['workloads'].items():
+        previous = (baseline or {}).get('workloads', {}).get(name, {})
+        line = f'\n{name}: {workload["requests"]} запросов, {workload["rps"]} запросов/с'
+        if previous.get('rps'):
+            line += f' (baseline {previous["rps"]}, {(workload["rps"] / previous["rps"] - 1) * 100:+.0f}%)'
+        out(line)
+        out(f'  {"маршрут":<34} {"n":>5} {"p50 мс":>9} {"p95 мс":>9} {"p99 мс":>9} {"ошибки":>7}  p95 к baseline')
+        for route, stats in workload['routes'].items():
+            before = previous.get('routes', {}).get(route)
+            diff = ''
+            if before and before['p95_ms']:
+                diff = f'{(stats["p95_ms"] / before["p95_ms"] - 1) * 100:+.0f}%'
+            out(f'  {route:<34} {stats["count"]:>5} {stats["p50_ms"]:>9.2f} {stats["p95_ms"]:>9.2f} '
+                f'{stats["p99_ms"]:>9.2f} {stats["errors"]:>7}  {diff}')
+
+
+def main():
+    from benchmarks.workloads import WORKLOADS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1.0, help='доля полного набора (1 — 1 млн товаров)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=300, help='действий пользователя на сценарий')
+    parser.add_argument('--rounds', type=int, default=3, help='раундов на сценарий; в отчет идет лучший')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS), help='сценарии через запятую')
+    parser.add_argument('--data-dir', default=os.path.join(ROOT, 'instance', 'benchmarks'))
+    parser.add_argument('--baseline', help='файл baseline (по умолчанию benchmarks/baselines/scale-<scale>.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='сохранить результат как новый baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='допустимый рост p95 (0.2 — 20%%)')
+    parser.add_argument('--check', action='store_true', help='код выхода 1 при регрессиях')
+    args = parser.parse_args()
+
+    workloads = [name.strip() for name in args.workloads.split(',') if name.strip()]
+    unknown = set(workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f'неизвестные сценарии: {", ".join(sorted(unknown))}')
+
+    baseline_path = args.baseline or os.path.join(BASELINES, f'scale-{args.scale:g}.json')
+    baseline = None
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as source:
+            baseline = json.load(source)
+
+    results = run(args.scale, args.seed, args.requests, workloads, args.data_dir, rounds=args.rounds)
+    report(results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as out:
+            json.dump(results, out, indent=2, ensure_ascii=False)
+        print(f'\nBaseline сохранен: {baseline_path}')
+    elif baseline is None:
+        print(f'\nBaseline {baseline_path} не найден; сохраните его флагом --save-baseline')
+        return
+
+    regressions = compare(results, baseline, args.threshold) if baseline and not args.save_baseline else []
+    for name, route, before, after in regressions:
+        print(f'РЕГРЕССИЯ {name} {route}: p95 {before:.2f} -> {after:.2f} мс')
+    if regressions and args.check:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
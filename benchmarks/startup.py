@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+ResaleX - Замер времени запуска
+Каждый замер — новый интерпретатор: импорт app, create_app() и первый запрос.
+Так запускается каждый воркер gunicorn без preload и каждый процесс тестов.
+Запуск: python benchmarks/startup.py [--runs 10] [--config production]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули, которые при запуске не нужны и должны импортироваться только при первом использовании
+LAZY_MODULES = ('stripe', 'boto3', 'redis')
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(sys.argv[1])
+created = time.perf_counter()
+app.test_client().get('/login')
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'total_ms': (served - started) * 1000,
+    'loaded': [name for name in sys.argv[2:] if name in sys.modules],
+}))
+'''
+
+
+def measure(config_name='production', env=None):
+    """Один запуск в отдельном процессе; возвращает словарь времен в миллисекундах"""
+    result = subprocess.run([sys.executable, '-c', PROBE, config_name, *LAZY_MODULES], cwd=ROOT,
+                            env={**os.environ, **(env or {})}, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--config', default='production')
+    args = parser.parse_args()
+
+    # Запуск не должен трогать рабочую базу: первый запрос идет в отдельную базу в памяти
+    env = {'DATABASE_URL': 'sqlite://'}
+    runs = [measure(args.config, env) for _ in range(args.runs)]
+    print(f"Запуск приложения ({args.config}), {args.runs} процессов:")
+    for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms'):
+        values = [run[key] for run in runs]
+        print(f"  {key:<18} медиана {statistics.median(values):7.1f}  мин {min(values):7.1f}  макс {max(values):7.1f}")
+    loaded = sorted({name for run in runs for name in run['loaded']})
+    print(f"  лишние модули при запуске: {', '.join(loaded) or 'нет'}")
+
+
+if __name__ == '__main__':
+    main()
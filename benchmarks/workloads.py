@@ -0,0 +1,171 @@
+"""
+ResaleX - Сценарии нагрузки
+Каждый сценарий делает заданное число действий пользователя через тестовый клиент Flask
+(в процессе, без сети) и замеряет каждый запрос. Случайный выбор идет от одного seed,
+поэтому повторный прогон на том же наборе делает те же запросы.
+"""
+
+import random
+import re
+import time
+from collections import Counter, defaultdict
+
+from extensions import db, payment_gateway
+from models import Order, Product, job_queue
+from benchmarks.dataset import BRANDS, MODELS, COLORS, CATEGORIES
+
+NEXT_PAGE_RE = re.compile(r'[?&;]after=([^&"\s]+)')
+SAMPLE_SIZE = 5000
+
+
+class Bench:
+    """Клиенты, выборки id и замеры одного прогона"""
+
+    def __init__(self, app, dataset, seed=42):
+        self.app = app
+        self.dataset = dataset
+        self.rng = random.Random(seed)
+        self.timings = defaultdict(list)
+        self.errors = Counter()
+        self.clients = {}
+        counts = dataset['counts']
+        with app.app_context():
+            self.gateway = payment_gateway._get_current_object()
+            # Одобренные товары из случайной выборки: их открывают и покупают
+            candidates = self.rng.sample(range(dataset['sold_products'] + 1, counts['products'] + 1),
+                                         min(SAMPLE_SIZE, counts['products'] - dataset['sold_products']))
+            self.approved = sorted(product_id for product_id, in db.session.query(Product.id).filter(
+                Product.id.in_(candidates), Product.status == 'approved'))
+            db.session.remove()
+
+    def user(self, role):
+        first, stop = self.dataset['seller_ids' if role == 'seller' else 'buyer_ids']
+        return self.rng.randrange(first, stop)
+
+    def client(self, user_id=None):
+        """Тестовый клиент, авторизованный как user_id (None — анонимный посетитель)"""
+        if user_id not in self.clients:
+            client = self.app.test_client()
+            if user_id is not None:
+                with client.session_transaction() as session:
+                    session['_user_id'] = str(user_id)
+                    session['_fresh'] = True
+            self.clients[user_id] = client
+        return self.clients[user_id]
+
+    def request(self, route, client, url, method='GET', expect=(200,), **kwargs):
+        """Выполняет запрос и записывает время до последнего байта ответа под именем route"""
+        started = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        response.get_data()
+        self.timings[route].append(time.perf_counter() - started)
+        if response.status_code not in expect:
+            self.errors[route] += 1
+        return response
+
+    def reset(self):
+        self.timings.clear()
+        self.errors.clear()
+
+
+def browse(bench, actions):
+    """Анонимный посетитель: главная, каталог по категориям со следующей страницей, карточки"""
+    client = bench.client()
+    for _ in range(actions):
+        roll = bench.rng.random()
+        if roll < 0.2:
+            bench.request('GET /', client, '/')
+        elif roll < 0.5:
+            category = bench.rng.choice(CATEGORIES)
+            page = bench.request('GET /products?category', client, f'/products?category={category}')
+            match = NEXT_PAGE_RE.search(page.get_data(as_text=True))
+            if match:
+                bench.request('GET /products?after', client, f'/products?category={category}&after={match.group(1)}')
+        else:
+            bench.request('GET /product/<id>', client, f'/product/{bench.rng.choice(bench.approved)}')
+
+
+def search(bench, actions):
+    """Авторизованный покупатель ищет по бренду, модели и префиксам: кэш страниц не помогает"""
+    client = bench.client(bench.user('buyer'))
+    for _ in range(actions):
+        roll = bench.rng.random()
+        if roll < 0.5:
+            term = f'{bench.rng.choice(BRANDS)} {bench.rng.choice(MODELS)}'
+        elif roll < 0.8:
+            term = f'{bench.rng.choice(MODELS)} {bench.rng.choice(COLORS)}'
+        else:
+            term = bench.rng.choice(BRANDS)[:3]
+        bench.request('GET /products?search', client, '/products', query_string={'search': term})
+
+
+def checkout(bench, actions):
+    """Покупка: бронь товара, страница оплаты, намерение от воркера и вебхук об оплате"""
+    for _ in range(actions):
+        if not bench.approved:
+            break
+        client = bench.client(bench.user('buyer'))
+        product_id = bench.approved.pop(bench.rng.randrange(len(bench.approved)))
+        response = bench.request('POST /buy/<id>', client, f'/buy/{product_id}', method='POST', expect=(302,))
+        location = response.headers.get('Location', '')
+        if '/payment/' not in location:
+            continue
+        order_id = int(location.rsplit('/', 1)[1])
+        bench.request('GET /payment/<id>', client, f'/payment/{order_id}')
+        # Намерение создает воркер; его время в замер запросов не входит
+        with bench.app.app_context():
+            job_queue.run_pending()
+            intent_id = db.session.get(Order, order_id).payment_intent_id
+            db.session.remove()
+        bench.request('GET /api/orders/<id>/payment', client, f'/api/orders/{order_id}/payment')
+        payload = bench.gateway.event_payload('payment_intent.succeeded', intent_id, order_id)
+        bench.request('POST /stripe/webhook', bench.client(), '/stripe/webhook', method='POST', data=payload,
+                      headers={'Stripe-Signature': bench.gateway.sign(payload)})
+
+
+def chat(bench, actions):
+    """Покупатель открывает чат заказа, пишет, догружает новые сообщения и отмечает прочитанное"""
+    for _ in range(actions):
+        order_id = bench.rng.randrange(1, bench.dataset['counts']['orders'] + 1)
+        with bench.app.app_context():
+            buyer_id = db.session.get(Order, order_id).buyer_id
+            db.session.remove()
+        client = bench.client(buyer_id)
+        bench.request('GET /chat/<id>', client, f'/chat/{order_id}')
+        sent = bench.request('POST /api/chat/<id>', client, f'/api/chat/{order_id}', method='POST',
+                             json={'message': 'Добрый день, когда отправка?'}, expect=(201,))
+        last_id = (sent.get_json() or {}).get('id', 0)
+        bench.request('GET /api/chat/<id>?since', client, f'/api/chat/{order_id}?since={last_id - 5}')
+        bench.request('POST /api/chat/<id>/read', client, f'/api/chat/{order_id}/read', method='POST',
+                      json={'up_to': last_id})
+
+
+def dashboard(bench, actions):
+    """Дашборды продавца и покупателя, таблицы админа и счетчик уведомлений"""
+    admin = bench.client(bench.dataset['admin_id'])
+    for _ in range(actions):
+        roll = bench.rng.random()
+        if roll < 0.25:
+            bench.request('GET /dashboard (seller)', bench.client(bench.user('seller')), '/dashboard')
+        elif roll < 0.4:
+            bench.request('GET /dashboard (buyer)', bench.client(bench.user('buyer')), '/dashboard')
+        elif roll < 0.55:
+            bench.request('GET /profile', bench.client(bench.user('seller')), '/profile')
+        elif roll < 0.7:
+            bench.request('GET /api/admin/products', admin, '/api/admin/products?status=pending')
+        elif roll < 0.8:
+            bench.request('GET /api/admin/orders', admin, '/api/admin/orders?status=paid')
+        elif roll < 0.85:
+            bench.request('GET /api/admin/users', admin, '/api/admin/users?role=seller')
+        else:
+            bench.request('GET /api/notifications/unread', bench.client(bench.user('seller')),
+                          '/api/notifications/unread')
+
+
+WORKLOADS = {
+    'browse': browse,
+    'search': search,
+    'checkout': checkout,
+    'chat': chat,
+    'dashboard': dashboard,
+}
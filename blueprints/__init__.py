@@ -0,0 +1,3 @@
+"""
+ResaleX - Маршруты приложения, по blueprint на раздел; регистрируются в create_app
+"""
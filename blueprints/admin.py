@@ -0,0 +1,213 @@
+"""
+ResaleX - Управление пользователями и таблицы дашбордов админа
+"""
+
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
+from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
+from extensions import db
+from forms import UserForm
+from models import User, Product, Order, UserStats
+from pagination import keyset_paginate
+from uploads import release_image, image_ready, image_variant, preload_images
+
+bp = Blueprint('admin', __name__)
+
+@bp.route('/create_user', methods=['GET', 'POST'])
+@login_required
+def create_user():
+    if current_user.role not in ['root', 'admin']:
+        flash('У вас нет прав для создания пользователей', 'error')
+        return redirect(url_for('auth.dashboard'))
+    
+    form = UserForm()
+    if form.validate_on_submit():
+        if User.query.filter_by(username=form.username.data).first():
+            flash('Username already exists', 'error')
+            return render_template('create_user.html', form=form)
+        
+        if User.query.filter_by(email=form.email.data).first():
+            flash('Email already exists', 'error')
+            return render_template('create_user.html', form=form)
+        
+        user = User(
+            username=form.username.data,
+            email=form.email.data,
+            role=form.role.data
+        )
+        user.set_password(form.password.data)
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(UserStats(user_id=user.id))
+        db.session.commit()
+        flash('User created successfully', 'success')
+        return redirect(url_for('auth.dashboard'))
+    
+    return render_template('create_user.html', form=form)
+
+@bp.route('/admin/user/<int:user_id>/toggle_status', methods=['POST'])
+@login_required
+def toggle_user_status(user_id):
+    if current_user.role not in ['admin', 'moderator']:
+        flash('У вас нет прав для выполнения этого действия', 'error')
+        return redirect(url_for('auth.dashboard'))
+    
+    user = User.query.get_or_404(user_id)
+    user.is_active = not user.is_active
+    db.session.commit()
+    
+    status = 'активирован' if user.is_active else 'заблокирован'
+    flash(f'Пользователь {user.username} {status}', 'success')
+    return redirect(url_for('auth.dashboard'))
+
+@bp.route('/admin/user/<int:user_id>/delete', methods=['POST'])
+@login_required
+def delete_user(user_id):
+    if current_user.role not in ['admin', 'moderator']:
+        flash('У вас нет прав для выполнения этого действия', 'error')
+        return redirect(url_for('auth.dashboard'))
+    
+    user = User.query.get_or_404(user_id)
+    
+    # Нельзя удалить root пользователя
+    if user.role == 'root':
+        flash('Нельзя удалить root пользователя', 'error')
+        return redirect(url_for('auth.dashboard'))
+    
+    # Нельзя удалить самого себя
+    if user.id == current_user.id:
+        flash('Нельзя удалить самого себя', 'error')
+        return redirect(url_for('auth.dashboard'))
+    
+    release_image(user.avatar_url)
+    db.session.delete(user)
+    db.session.commit()
+    flash(f'Пользователь {user.username} удален', 'success')
+    return redirect(url_for('auth.dashboard'))
+
+# API для таблиц дашбордов админа и модератора
+def dashboard_page(query, id_column, sort_columns, default_sort='created_at'):
+    """Страница таблицы дашборда: сортировка по белому списку колонок и курсорная пагинация"""
+    sort_column = sort_columns.get(request.args.get('sort'), sort_columns[default_sort])
+    descending = request.args.get('direction', 'desc') != 'asc'
+    per_page = max(1, min(request.args.get('per_page', 25, type=int), 100))
+    return keyset_paginate(query, [(sort_column, descending), (id_column, descending)],
+                           after=request.args.get('after'), before=request.args.get('before'),
+                           per_page=per_page)
+
+def dashboard_json(page, serialize):
+    return jsonify({
+        'items': [serialize(item) for item in page.items],
+        'next': page.next_cursor,
+        'prev': page.prev_cursor,
+    })
+
+def user_to_dict(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'role': user.role,
+        'is_active': user.is_active,
+        'created_at': user.created_at.isoformat(),
+        'can_delete': user.role != 'root' and user.id != current_user.id,
+        'toggle_url': url_for('admin.toggle_user_status', user_id=user.id),
+        'delete_url': url_for('admin.delete_user', user_id=user.id),
+    }
+
+def product_to_dict(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'brand': product.brand,
+        'category': product.category,
+        'price': product.price,
+        'status': product.status,
+        'image_url': product.image_url,
+        'thumb_url': image_variant(product.image_url, 'thumb') if image_ready(product.image_url) else None,
+        'seller': product.seller.username,
+        'created_at': product.created_at.isoformat(),
+        'detail_url': url_for('catalog.product_detail', product_id=product.id),
+        'status_url': url_for('catalog.update_product_status', product_id=product.id),
+    }
+
+def order_to_dict(order):
+    return {
+        'id': order.id,
+        'buyer': order.buyer.username,
+        'product': order.product.name,
+        'seller': order.product.seller.username,
+        'total_amount': order.total_amount,
+        'status': order.status,
+        'tracking_number': order.tracking_number,
+        'created_at': order.created_at.isoformat(),
+        'chat_url': url_for('chat.chat', order_id=order.id),
+        'status_url': url_for('orders.update_order_status', order_id=order.id),
+    }
+
+@bp.route('/api/admin/users')
+@login_required
+def api_admin_users():
+    if current_user.role not in ['root', 'admin']:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    query = User.query
+    if request.args.get('role'):
+        query = query.filter(User.role == request.args['role'])
+    if request.args.get('state') in ['active', 'blocked']:
+        query = query.filter(User.is_active == (request.args['state'] == 'active'))
+    if request.args.get('q'):
+        term = request.args['q'] + '%'
+        query = query.filter(User.username.like(term) | User.email.like(term))
+    
+    page = dashboard_page(query, User.id, {
+        'created_at': User.created_at,
+        'username': User.username,
+        'email': User.email,
+    })
+    return dashboard_json(page, user_to_dict)
+
+@bp.route('/api/admin/products')
+@login_required
+def api_admin_products():
+    if current_user.role not in ['root', 'admin', 'moderator']:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    query = Product.query.options(joinedload(Product.seller))
+    if request.args.get('status'):
+        query = query.filter(Product.status == request.args['status'])
+    if request.args.get('category'):
+        query = query.filter(Product.category == request.args['category'])
+    if request.args.get('seller_id', type=int):
+        query = query.filter(Product.seller_id == request.args.get('seller_id', type=int))
+    if request.args.get('q'):
+        query = query.filter(Product.name.like(request.args['q'] + '%'))
+    
+    page = dashboard_page(query, Product.id, {
+        'created_at': Product.created_at,
+        'price': Product.price,
+        'name': Product.name,
+    })
+    preload_images(product.image_url for product in page.items)
+    return dashboard_json(page, product_to_dict)
+
+@bp.route('/api/admin/orders')
+@login_required
+def api_admin_orders():
+    if current_user.role not in ['root', 'admin', 'moderator']:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    query = Order.query.options(
+        joinedload(Order.buyer),
+        joinedload(Order.product).joinedload(Product.seller)
+    )
+    if request.args.get('status'):
+        query = query.filter(Order.status == request.args['status'])
+    if request.args.get('buyer_id', type=int):
+        query = query.filter(Order.buyer_id == request.args.get('buyer_id', type=int))
+    
+    page = dashboard_page(query, Order.id, {
+        'created_at': Order.created_at,
+        'total_amount': Order.total_amount,
+    })
+    return dashboard_json(page, order_to_dict)
@@ -0,0 +1,154 @@
+"""
+ResaleX - Уведомления и push-потоки (SSE)
+"""
+
+from flask import Blueprint, Response, jsonify, current_app
+from flask_login import login_required, current_user
+from collections import Counter
+from datetime import datetime, timedelta
+import threading
+import time
+from events import user_channel, format_sse
+from extensions import event_bus, replica_reads
+from models import Order, get_user_stats
+
+bp = Blueprint('api', __name__)
+
+# API для уведомлений
+@bp.route('/api/notifications')
+@login_required
+@replica_reads
+def get_notifications():
+    # Получаем последние 10 уведомлений для пользователя
+    notifications = []
+    
+    # Уведомления о новых заказах (для продавцов)
+    if current_user.role in ['seller', 'admin']:
+        recent_orders = Order.query.filter(
+            Order.product.has(seller_id=current_user.id),
+            Order.created_at >= datetime.utcnow() - timedelta(days=7)
+        ).order_by(Order.created_at.desc()).limit(5).all()
+        
+        for order in recent_orders:
+            notifications.append({
+                'id': order.id,
+                'title': 'Новый заказ',
+                'message': f'Заказ #{order.id} на {order.product.name}',
+                'created_at': order.created_at.isoformat(),
+                'is_read': False
+            })
+    
+    # Уведомления о статусе заказов (для покупателей)
+    if current_user.role == 'user':
+        recent_orders = Order.query.filter(
+            Order.buyer_id == current_user.id,
+            Order.created_at >= datetime.utcnow() - timedelta(days=7)
+        ).order_by(Order.created_at.desc()).limit(5).all()
+        
+        for order in recent_orders:
+            if order.status in ['shipped', 'delivered']:
+                notifications.append({
+                    'id': order.id,
+                    'title': 'Обновление заказа',
+                    'message': f'Заказ #{order.id} - статус: {order.status}',
+                    'created_at': order.created_at.isoformat(),
+                    'is_read': False
+                })
+    
+    return jsonify({'notifications': notifications})
+
+@bp.route('/api/notifications/unread')
+@login_required
+@replica_reads
+def get_unread_notifications_count():
+    # Счетчик читается из user_stats по первичному ключу: непрочитанные сообщения
+    # и заказы, которые продавцу нужно обработать
+    stats = get_user_stats(current_user.id)
+    return jsonify({
+        'count': stats.unread_messages + stats.pending_orders,
+        'unread_messages': stats.unread_messages,
+        'pending_orders': stats.pending_orders,
+    })
+
+# Выставляется при остановке процесса сервера (см. gunicorn.conf.py): открытые SSE-потоки
+# завершаются на ближайшем пинге, и браузеры переподключаются к другим процессам
+shutting_down = threading.Event()
+
+class StreamSlots:
+    """Счетчик открытых SSE-потоков процесса: всего и по пользователям"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open = Counter()
+    
+    def acquire(self, user_id, limit, per_user):
+        with self._lock:
+            if sum(self._open.values()) >= limit or self._open[user_id] >= per_user:
+                return False
+            self._open[user_id] += 1
+            return True
+    
+    def release(self, user_id):
+        with self._lock:
+            self._open[user_id] -= 1
+            if self._open[user_id] <= 0:
+                del self._open[user_id]
+    
+    def count(self, user_id=None):
+        with self._lock:
+            return sum(self._open.values()) if user_id is None else self._open[user_id]
+
+stream_slots = StreamSlots()
+
+def event_stream(channel, first_event=None):
+    """
+    SSE-ответ с событиями канала шины. Поток закрывается через SSE_MAX_STREAM_SECONDS
+    или при остановке сервера, браузер переподключается сам. Сверх SSE_MAX_STREAMS
+    и SSE_MAX_STREAMS_PER_USER отвечает 503: браузер переходит на опрос.
+    """
+    config = current_app.config
+    user_id = current_user.id
+    heartbeat = config['SSE_HEARTBEAT_SECONDS']
+    if not stream_slots.acquire(user_id, config['SSE_MAX_STREAMS'], config['SSE_MAX_STREAMS_PER_USER']):
+        return Response('Too many open streams', status=503, mimetype='text/plain',
+                        headers={'Retry-After': str(config['SSE_MAX_STREAM_SECONDS'])})
+    # Подписка оформляется до ответа, чтобы не потерять события между загрузкой данных и началом потока
+    subscription = event_bus.subscribe(channel)
+    deadline = time.monotonic() + config['SSE_MAX_STREAM_SECONDS']
+    closed = False
+    
+    def close():
+        # Вызывается из генератора и при закрытии ответа: клиент мог уйти до первого чанка
+        nonlocal closed
+        if not closed:
+            closed = True
+            subscription.close()
+            stream_slots.release(user_id)
+    
+    def generate():
+        try:
+            yield f'retry: {heartbeat * 1000}\n\n'
+            if first_event:
+                yield format_sse(*first_event)
+            while time.monotonic() < deadline and not shutting_down.is_set():
+                message = subscription.get(timeout=heartbeat)
+                if message is None:
+                    yield ': ping\n\n'
+                else:
+                    yield format_sse(message['event'], message['data'])
+        finally:
+            close()
+    
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(close)
+    return response
+
+@bp.route('/api/notifications/stream')
+@login_required
+@replica_reads
+def notifications_stream():
+    """SSE-поток уведомлений: снимок счетчиков, затем изменения счетчиков и заказов"""
+    stats = get_user_stats(current_user.id)
+    snapshot = {'unread_messages': stats.unread_messages, 'pending_orders': stats.pending_orders}
+    return event_stream(user_channel(current_user.id), first_event=('stats', snapshot))
@@ -0,0 +1,238 @@
+"""
+ResaleX - Вход, регистрация, дашборды и профиль
+"""
+
+import math
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy import func, literal
+from sqlalchemy.orm import joinedload, contains_eager
+from extensions import db, password_hasher, rate_limiter
+from forms import LoginForm, RegisterForm
+from models import User, Product, Order, UserStats, get_user_stats
+from passwords import PasswordHasherBusy
+from uploads import store_upload, release_image, preload_images
+
+bp = Blueprint('auth', __name__)
+
+def rate_limit(key, limit_option, amount=1):
+    """
+    Засчитывает amount попыток по ключу (amount=0 — только проверка) и, если лимит
+    <limit_option>_LIMIT за <limit_option>_WINDOW секунд исчерпан, возвращает, через сколько секунд повторить.
+    """
+    config = current_app.config
+    if not config['RATE_LIMIT_ENABLED']:
+        return None
+    count, retry_after = rate_limiter.hit(key, config[f'{limit_option}_WINDOW'], amount)
+    limit = config[f'{limit_option}_LIMIT']
+    exceeded = count > limit if amount else count >= limit
+    return max(1, math.ceil(retry_after)) if exceeded else None
+
+def throttled(template, form, retry_after):
+    flash(f'Слишком много попыток. Повторите через {retry_after} с', 'error')
+    return render_template(template, form=form), 429, {'Retry-After': str(retry_after)}
+
+def hashing_busy(template, form):
+    # Пул хэширования перегружен: клиенту лучше повторить, чем ждать в очереди
+    flash('Сервер перегружен, повторите попытку через несколько секунд', 'error')
+    return render_template(template, form=form), 503, {'Retry-After': '5'}
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('auth.dashboard'))
+    
+    form = LoginForm()
+    if form.validate_on_submit():
+        # Лимиты проверяются до хэширования: перебор не тратит CPU на дорогие хэши.
+        # Аккаунт блокируют только неудачные попытки, поэтому amount=0 лишь проверяет счетчик
+        account_key = f'login:account:{form.username.data.lower()}'
+        retry_after = (rate_limit(f'login:ip:{request.remote_addr}', 'LOGIN_IP')
+                       or rate_limit(account_key, 'LOGIN_ACCOUNT', amount=0))
+        if retry_after:
+            return throttled('login.html', form, retry_after)
+        
+        user = User.query.filter_by(username=form.username.data).first()
+        try:
+            # Для несуществующего пользователя тоже считается хэш: время ответа не выдает, есть ли аккаунт
+            valid = user.check_password(form.password.data) if user else password_hasher.verify(None, form.password.data)
+        except PasswordHasherBusy:
+            return hashing_busy('login.html', form)
+        if valid and user.is_active:
+            # Хэш, пересчитанный с новыми параметрами, сохраняется вместе со входом
+            db.session.commit()
+            rate_limiter.reset(account_key)
+            login_user(user)
+            next_page = request.args.get('next')
+            return redirect(next_page) if next_page else redirect(url_for('auth.dashboard'))
+        else:
+            db.session.rollback()
+            rate_limit(account_key, 'LOGIN_ACCOUNT')
+            flash('Неверное имя пользователя или пароль', 'error')
+    
+    return render_template('login.html', form=form)
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for('auth.dashboard'))
+    
+    form = RegisterForm()
+    if form.validate_on_submit():
+        retry_after = rate_limit(f'register:ip:{request.remote_addr}', 'REGISTER_IP')
+        if retry_after:
+            return throttled('register.html', form, retry_after)
+        
+        if User.query.filter_by(username=form.username.data).first():
+            flash('Пользователь с таким именем уже существует', 'error')
+            return render_template('register.html', form=form)
+        
+        if User.query.filter_by(email=form.email.data).first():
+            flash('Пользователь с таким email уже существует', 'error')
+            return render_template('register.html', form=form)
+        
+        user = User(
+            username=form.username.data,
+            email=form.email.data,
+            role='user'  # Все регистрирующиеся пользователи - покупатели
+        )
+        try:
+            user.set_password(form.password.data)
+        except PasswordHasherBusy:
+            return hashing_busy('register.html', form)
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(UserStats(user_id=user.id))
+        db.session.commit()
+        flash('Регистрация прошла успешно! Теперь вы можете войти в систему', 'success')
+        return redirect(url_for('auth.login'))
+    
+    return render_template('register.html', form=form)
+
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for('catalog.index'))
+
+@bp.route('/dashboard')
+@login_required
+def dashboard():
+    # Связанные продавцы, покупатели и товары подгружаются теми же запросами,
+    # чтобы шаблоны не делали ленивых запросов на каждую строку
+    # Таблицы админа и модератора подгружаются постранично через /api/admin/*
+    if current_user.role == 'admin':
+        return render_template('admin_dashboard.html', stats=marketplace_stats())
+    elif current_user.role == 'moderator':
+        return render_template('moderator_dashboard.html', stats=marketplace_stats())
+    elif current_user.role == 'seller':
+        products = Product.query.filter_by(seller_id=current_user.id).all()
+        orders = Order.query.join(Product).filter(Product.seller_id == current_user.id).options(
+            contains_eager(Order.product),
+            joinedload(Order.buyer)
+        ).all()
+        preload_images(product.image_url for product in products)
+        return render_template('seller_dashboard.html', products=products, orders=orders,
+                               user_stats=get_user_stats(current_user.id))
+    else:
+        orders = Order.query.filter_by(buyer_id=current_user.id).options(
+            joinedload(Order.product).joinedload(Product.seller)
+        ).all()
+        preload_images(order.product.image_url for order in orders)
+        return render_template('user_dashboard.html', orders=orders)
+
+def marketplace_stats():
+    """Сводка для админа и модератора, посчитанная агрегатами в базе"""
+    product_counts = dict(db.session.query(Product.status, func.count(Product.id)).group_by(Product.status).all())
+    order_count, turnover = db.session.query(func.count(Order.id), func.coalesce(func.sum(Order.total_amount), 0)).one()
+    return {
+        'users': db.session.query(func.count(User.id)).scalar(),
+        'products': sum(product_counts.values()),
+        'products_by_status': product_counts,
+        'orders': order_count,
+        'turnover': turnover,
+    }
+
+PROFILE_RECENT_LIMIT = 10
+
+def user_profile_stats(user_id, include_sales):
+    """
+    Статистика профиля одним запросом: UNION ALL трех агрегатов по индексам
+    (покупки, продажи и товары пользователя), сгруппированных по статусу.
+    """
+    parts = [
+        db.session.query(literal('bought').label('kind'), Order.status, func.count(Order.id), func.sum(Order.total_amount))
+        .filter(Order.buyer_id == user_id).group_by(Order.status)
+    ]
+    if include_sales:
+        parts.append(
+            db.session.query(literal('sold').label('kind'), Order.status, func.count(Order.id), func.sum(Order.total_amount))
+            .join(Product).filter(Product.seller_id == user_id).group_by(Order.status)
+        )
+        parts.append(
+            db.session.query(literal('listed').label('kind'), Product.status, func.count(Product.id), literal(0))
+            .filter(Product.seller_id == user_id).group_by(Product.status)
+        )
+    
+    stats = {kind: {'count': 0, 'amount': 0, 'by_status': {}} for kind in ['bought', 'sold', 'listed']}
+    for kind, status, count, amount in parts[0].union_all(*parts[1:]).all():
+        stats[kind]['count'] += count
+        stats[kind]['amount'] += amount or 0
+        stats[kind]['by_status'][status] = count
+    return stats
+
+@bp.route('/profile')
+@login_required
+def profile():
+    # Статистика считается в базе, а в шаблон попадают только последние записи
+    is_seller = current_user.role in ['seller', 'admin', 'moderator']
+    stats = user_profile_stats(current_user.id, is_seller)
+    orders = Order.query.filter_by(buyer_id=current_user.id).options(joinedload(Order.product)) \
+        .order_by(Order.created_at.desc()).limit(PROFILE_RECENT_LIMIT).all()
+    products = Product.query.filter_by(seller_id=current_user.id) \
+        .order_by(Product.created_at.desc()).limit(PROFILE_RECENT_LIMIT).all() if is_seller else []
+    preload_images([current_user.avatar_url] + [order.product.image_url for order in orders] +
+                   [product.image_url for product in products])
+    
+    return render_template('profile.html', 
+                         orders=orders, 
+                         products=products,
+                         stats=stats,
+                         total_spent=stats['bought']['amount'],
+                         total_earned=stats['sold']['amount'])
+
+@bp.route('/edit_profile', methods=['GET', 'POST'])
+@login_required
+def edit_profile():
+    if request.method == 'POST':
+        # Обновляем данные пользователя
+        current_user.username = request.form.get('username', current_user.username)
+        current_user.email = request.form.get('email', current_user.email)
+        
+        # Обновляем пароль если указан новый
+        new_password = request.form.get('password')
+        if new_password:
+            try:
+                current_user.set_password(new_password)
+            except PasswordHasherBusy:
+                db.session.rollback()
+                flash('Сервер перегружен, повторите попытку через несколько секунд', 'error')
+                return redirect(url_for('auth.edit_profile'))
+        
+        # Обработка загрузки аватара
+        if 'avatar' in request.files:
+            file = request.files['avatar']
+            if file and file.filename:
+                avatar_url = store_upload(file)
+                if not avatar_url:
+                    db.session.rollback()
+                    return redirect(url_for('auth.edit_profile'))
+                release_image(current_user.avatar_url)
+                current_user.avatar_url = avatar_url
+        
+        db.session.commit()
+        flash('Профиль успешно обновлен', 'success')
+        return redirect(url_for('auth.profile'))
+    
+    return render_template('edit_profile.html')
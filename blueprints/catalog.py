@@ -0,0 +1,263 @@
+"""
+ResaleX - Каталог, карточка товара и управление товарами
+"""
+
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, session, make_response, current_app
+from flask_login import login_required, current_user
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from datetime import timezone
+import hashlib
+from database import primary_reads
+from extensions import db, search_backend, catalog_cache, replica_reads
+from forms import ProductForm
+from models import Product, bump_user_stats, listing_status_changed, catalog_tags, catalog_changed, product_row
+from pagination import keyset_paginate, KeysetPage
+from uploads import store_upload, release_image, preload_images
+
+bp = Blueprint('catalog', __name__)
+
+def cached(key, load, tags):
+    """
+    Значение из кэша каталога. Промах вычисляется по основной базе: обычно его вызвал сброс
+    кэша после записи, а отстающая реплика вернула бы в кэш данные до этой записи.
+    """
+    def load_from_primary():
+        with primary_reads(db):
+            return load()
+    return catalog_cache.get_or_set(key, load_from_primary, tags)
+
+def render_cached_page(key, tags, render):
+    """
+    Анонимным посетителям отдает готовую страницу из кэша без обращения к базе.
+    Страницы с flash-сообщениями и страницы авторизованных пользователей рендерятся заново.
+    """
+    if current_user.is_authenticated or session.get('_flashes'):
+        return render()
+    return cached(('page',) + key, render, tags)
+
+def catalog_validator(category):
+    """Последнее изменение и число одобренных товаров выдачи: от них зависят ETag и Last-Modified"""
+    def load():
+        query = db.session.query(func.max(Product.updated_at), func.count(Product.id)) \
+            .filter(Product.status == 'approved')
+        if category:
+            query = query.filter(Product.category == category)
+        return tuple(query.one())
+    return cached(('validator', category), load, catalog_tags(category))
+
+def conditional_page(validator, last_modified, render):
+    """
+    Публичная страница с поддержкой условных запросов. Анонимным посетителям отвечает 304,
+    если ETag (или Last-Modified) совпал, и разрешает прокси кэшировать ответ на HTTP_CACHE_MAX_AGE.
+    Авторизованным пользователям и страницам с flash-сообщениями отдается свежая страница без кэша.
+    """
+    if current_user.is_authenticated or session.get('_flashes'):
+        response = make_response(render())
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response
+    
+    etag = hashlib.sha1(repr((current_app.config['APP_VERSION'],) + validator).encode()).hexdigest()
+    if last_modified:
+        last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since
+                            and last_modified <= request.if_modified_since)
+    
+    response = Response(status=304) if not_modified else make_response(render())
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['HTTP_CACHE_MAX_AGE']
+    response.vary.add('Cookie')
+    return response
+
+@bp.route('/')
+@replica_reads
+def index():
+    def load():
+        products = Product.query.filter_by(status='approved').order_by(Product.created_at.desc()).limit(12).all()
+        return [product_row(product) for product in products]
+    
+    def render():
+        products = cached(('index',), load, catalog_tags(''))
+        preload_images(product['image_url'] for product in products)
+        return render_template('index.html', products=products)
+    
+    validator = catalog_validator('')
+    return conditional_page(('index',) + validator, validator[0],
+                            lambda: render_cached_page(('index',), catalog_tags(''), render))
+
+@bp.route('/add_product', methods=['GET', 'POST'])
+@login_required
+def add_product():
+    if current_user.role not in ['seller', 'admin']:
+        flash('Access denied', 'error')
+        return redirect(url_for('auth.dashboard'))
+    
+    form = ProductForm()
+    if form.validate_on_submit():
+        product = Product(
+            name=form.name.data,
+            description=form.description.data,
+            brand=form.brand.data,
+            category=form.category.data,
+            size=form.size.data,
+            condition=form.condition.data,
+            price=form.price.data,
+            seller_id=current_user.id
+        )
+        
+        if form.image.data:
+            image_url = store_upload(form.image.data)
+            if not image_url:
+                return render_template('add_product.html', form=form)
+            product.image_url = image_url
+        
+        db.session.add(product)
+        db.session.flush()
+        search_backend.sync_product(product)
+        db.session.commit()
+        flash('Product added successfully', 'success')
+        return redirect(url_for('auth.dashboard'))
+    
+    return render_template('add_product.html', form=form)
+
+@bp.route('/products')
+@replica_reads
+def products():
+    after = request.args.get('after')
+    before = request.args.get('before')
+    category = request.args.get('category', '')
+    search = request.args.get('search', '')
+    key = ('products', category, search, after, before)
+    tags = catalog_tags(category)
+    
+    def load():
+        query = Product.query.filter_by(status='approved')
+        
+        if category:
+            query = query.filter_by(category=category)
+        
+        # Курсорная пагинация по (created_at, id), для поиска — по релевантности
+        keys = [(Product.created_at, True), (Product.id, True)]
+        if search:
+            query, rank = search_backend.search(query, search, Product)
+            if rank is not None:
+                keys = [(rank, False), (Product.id, True)]
+        
+        # Итог считается один раз на фильтр и переиспользуется всеми страницами выдачи
+        total = cached(('count', category, search), query.order_by(None).count, tags)
+        page = keyset_paginate(query, keys, after=after, before=before, per_page=12, total=total)
+        return {'items': [product_row(product) for product in page.items], 'next_cursor': page.next_cursor,
+                'prev_cursor': page.prev_cursor, 'total': page.total}
+    
+    def render():
+        products = KeysetPage(**cached(key, load, tags))
+        preload_images(product['image_url'] for product in products.items)
+        return render_template('products.html', products=products, category=category, search=search)
+    
+    validator = catalog_validator(category)
+    return conditional_page(key + validator, validator[0], lambda: render_cached_page(key, tags, render))
+
+@bp.route('/product/<int:product_id>')
+@replica_reads
+def product_detail(product_id):
+    product = Product.query.options(joinedload(Product.seller)).filter_by(id=product_id).first_or_404()
+    validator = ('product', product.id, product.updated_at, product.status, product.seller.username)
+    return conditional_page(validator, product.updated_at,
+                            lambda: render_template('product_detail.html', product=product))
+
+@bp.route('/update_product_status/<int:product_id>', methods=['POST'])
+@login_required
+def update_product_status(product_id):
+    if current_user.role not in ['admin', 'moderator']:
+        flash('Access denied', 'error')
+        return redirect(url_for('auth.dashboard'))
+    
+    product = Product.query.get_or_404(product_id)
+    new_status = request.form.get('status')
+    
+    if new_status in ['approved', 'rejected']:
+        old_status = product.status
+        product.status = new_status
+        listing_status_changed(product, old_status)
+        catalog_changed(product, old_status)
+        search_backend.sync_product(product)
+        db.session.commit()
+        flash('Product status updated successfully', 'success')
+    
+    return redirect(url_for('auth.dashboard'))
+
+@bp.route('/edit_product/<int:product_id>', methods=['GET', 'POST'])
+@login_required
+def edit_product(product_id):
+    product = Product.query.get_or_404(product_id)
+    
+    # Проверяем права доступа
+    if current_user.role not in ['admin', 'moderator'] and product.seller_id != current_user.id:
+        flash('У вас нет прав для редактирования этого товара', 'error')
+        return redirect(url_for('auth.dashboard'))
+    
+    if request.method == 'POST':
+        old_status, old_category = product.status, product.category
+        product.name = request.form.get('name')
+        product.description = request.form.get('description')
+        product.price = float(request.form.get('price'))
+        product.brand = request.form.get('brand')
+        product.category = request.form.get('category')
+        product.condition = request.form.get('condition')
+        product.size = request.form.get('size')
+        
+        # Обработка загрузки нового изображения
+        if 'image' in request.files:
+            file = request.files['image']
+            if file and file.filename:
+                image_url = store_upload(file)
+                if not image_url:
+                    db.session.rollback()
+                    return redirect(url_for('catalog.edit_product', product_id=product_id))
+                release_image(product.image_url)
+                product.image_url = image_url
+        
+        # Если редактирует продавец, товар требует повторного одобрения
+        if current_user.role not in ['admin', 'moderator']:
+            product.status = 'pending'
+            flash('Товар обновлен и отправлен на модерацию', 'success')
+        else:
+            flash('Товар успешно обновлен', 'success')
+        
+        listing_status_changed(product, old_status)
+        catalog_changed(product, old_status, old_category)
+        search_backend.sync_product(product)
+        db.session.commit()
+        return redirect(url_for('auth.dashboard'))
+    
+    return render_template('edit_product.html', product=product)
+
+@bp.route('/delete_product/<int:product_id>', methods=['POST'])
+@login_required
+def delete_product(product_id):
+    product = Product.query.get_or_404(product_id)
+    
+    # Проверяем права доступа
+    if current_user.role not in ['admin', 'moderator'] and product.seller_id != current_user.id:
+        flash('У вас нет прав для удаления этого товара', 'error')
+        return redirect(url_for('auth.dashboard'))
+    
+    image_url = product.image_url
+    search_backend.remove_product(product.id)
+    if product.status == 'approved':
+        bump_user_stats(product.seller_id, active_listings=-1)
+    catalog_changed(product, product.status)
+    # Файлы удалит воркер, если на изображение больше никто не ссылается
+    release_image(image_url)
+    db.session.delete(product)
+    db.session.commit()
+    flash('Товар успешно удален', 'success')
+    return redirect(url_for('auth.dashboard'))
@@ -0,0 +1,207 @@
+"""
+ResaleX - Чат покупателя и продавца по заказу
+"""
+
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
+from flask_login import login_required, current_user
+from datetime import datetime
+from sqlalchemy import func
+from database import insert_or_ignore
+from events import chat_channel
+from extensions import db
+from models import Order, ChatMessage, ChatReadState, bump_user_stats, publish_after_commit
+from blueprints.api import event_stream
+
+bp = Blueprint('chat', __name__)
+
+# Сообщений на странице чата; более ранние подгружаются по запросу
+CHAT_PAGE_SIZE = 50
+
+def can_access_chat(order):
+    return current_user.id in [order.buyer_id, order.product.seller_id] or current_user.role in ['admin', 'moderator']
+
+def message_to_dict(message):
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'receiver_id': message.receiver_id,
+        'message': message.message,
+        'created_at': message.created_at.isoformat(),
+        'is_read': message.is_read,
+    }
+
+def chat_messages(order_id, since=None, before=None, limit=CHAT_PAGE_SIZE):
+    """
+    Окно переписки по id сообщений: новее since или последние limit до before.
+    Возвращает сообщения по возрастанию id и признак того, что есть еще.
+    """
+    query = ChatMessage.query.filter(ChatMessage.order_id == order_id)
+    if since is not None:
+        rows = query.filter(ChatMessage.id > since).order_by(ChatMessage.id.asc()).limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit
+    if before is not None:
+        query = query.filter(ChatMessage.id < before)
+    rows = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+    return list(reversed(rows[:limit])), len(rows) > limit
+
+def mark_chat_read(order_id, reader_id, up_to_id):
+    """
+    Помечает прочитанными входящие сообщения чата до up_to_id включительно.
+    Состояние прочтения — одна строка на участника; если она уже не меньше up_to_id,
+    все обойдется чтением по первичному ключу, иначе — одним UPDATE по новым сообщениям.
+    up_to_id от клиента ограничивается последним настоящим входящим сообщением:
+    отметка «впрок» скрыла бы от непрочитанных все будущие сообщения.
+    """
+    state = db.session.get(ChatReadState, (order_id, reader_id))
+    last_read = state.last_read_message_id if state else 0
+    if up_to_id <= last_read:
+        return 0
+    latest = db.session.query(func.max(ChatMessage.id)).filter(
+        ChatMessage.order_id == order_id,
+        ChatMessage.receiver_id == reader_id
+    ).scalar() or 0
+    up_to_id = min(up_to_id, latest)
+    if up_to_id <= last_read:
+        return 0
+    
+    newly_read = ChatMessage.query.filter(
+        ChatMessage.order_id == order_id,
+        ChatMessage.id > last_read,
+        ChatMessage.id <= up_to_id,
+        ChatMessage.receiver_id == reader_id,
+        ChatMessage.is_read == False
+    ).update({ChatMessage.is_read: True}, synchronize_session=False)
+    
+    # Первую отметку могут одновременно ставить несколько вкладок: строку вставит одна из них,
+    # остальные продвинут ее обычным UPDATE
+    inserted = state is None and insert_or_ignore(db, ChatReadState, ['order_id', 'user_id'], order_id=order_id,
+                                                  user_id=reader_id, last_read_message_id=up_to_id)
+    if not inserted:
+        # Условие не дает откатить отметку назад, если параллельный запрос уже продвинул ее дальше
+        ChatReadState.query.filter(
+            ChatReadState.order_id == order_id,
+            ChatReadState.user_id == reader_id,
+            ChatReadState.last_read_message_id < up_to_id
+        ).update({ChatReadState.last_read_message_id: up_to_id, ChatReadState.updated_at: datetime.utcnow()},
+                 synchronize_session=False)
+    
+    if newly_read:
+        bump_user_stats(reader_id, unread_messages=-newly_read)
+        publish_after_commit(chat_channel(order_id), 'read', {'reader_id': reader_id, 'up_to': up_to_id})
+    return newly_read
+
+def post_chat_message(order, text):
+    """Добавляет сообщение в чат заказа; получатель — другой участник сделки"""
+    receiver_id = order.buyer_id if current_user.id == order.product.seller_id else order.product.seller_id
+    message = ChatMessage(
+        sender_id=current_user.id,
+        receiver_id=receiver_id,
+        order_id=order.id,
+        message=text
+    )
+    db.session.add(message)
+    db.session.flush()
+    bump_user_stats(receiver_id, unread_messages=1)
+    publish_after_commit(chat_channel(order.id), 'message', message_to_dict(message))
+    return message
+
+@bp.route('/chat/<int:order_id>')
+@login_required
+def chat(order_id):
+    order = Order.query.get_or_404(order_id)
+    
+    # Проверяем права доступа к чату
+    if not can_access_chat(order):
+        flash('У вас нет прав для просмотра этого чата', 'error')
+        return redirect(url_for('auth.dashboard'))
+    
+    # Показываем только последние сообщения: открыть длинный чат стоит столько же, сколько короткий
+    messages, has_older = chat_messages(order_id)
+    
+    # Помечаем сообщения как прочитанные
+    if messages:
+        mark_chat_read(order_id, current_user.id, messages[-1].id)
+    
+    # Шаблон рендерится до commit: после него все загруженные сообщения перечитывались бы по одному
+    html = render_template('chat.html', order=order, messages=messages, has_older=has_older)
+    db.session.commit()
+    return html
+
+@bp.route('/chat/<int:order_id>/send', methods=['POST'])
+@login_required
+def send_message(order_id):
+    order = Order.query.get_or_404(order_id)
+    
+    # Проверяем права доступа к чату
+    if not can_access_chat(order):
+        flash('У вас нет прав для отправки сообщений в этот чат', 'error')
+        return redirect(url_for('auth.dashboard'))
+    
+    message_text = request.form.get('message')
+    if not message_text:
+        flash('Сообщение не может быть пустым', 'error')
+        return redirect(url_for('chat.chat', order_id=order_id))
+    
+    post_chat_message(order, message_text)
+    db.session.commit()
+    
+    flash('Сообщение отправлено', 'success')
+    return redirect(url_for('chat.chat', order_id=order_id))
+
+# API чата: страница чата догружает и отправляет сообщения без перезагрузки
+@bp.route('/api/chat/<int:order_id>')
+@login_required
+def api_chat_messages(order_id):
+    """Сообщения новее since (или раньше before) в JSON"""
+    order = Order.query.get_or_404(order_id)
+    if not can_access_chat(order):
+        return jsonify({'error': 'forbidden'}), 403
+    
+    messages, has_more = chat_messages(order_id, since=request.args.get('since', type=int),
+                                       before=request.args.get('before', type=int))
+    return jsonify({'messages': [message_to_dict(message) for message in messages], 'has_more': has_more})
+
+@bp.route('/api/chat/<int:order_id>', methods=['POST'])
+@login_required
+def api_chat_send(order_id):
+    order = Order.query.get_or_404(order_id)
+    if not can_access_chat(order):
+        return jsonify({'error': 'forbidden'}), 403
+    
+    payload = request.get_json(silent=True) or request.form
+    # Тело JSON может оказаться списком или строкой, а message — числом или объектом
+    message_text = payload.get('message', '') if isinstance(payload, dict) else None
+    if not isinstance(message_text, str):
+        return jsonify({'error': 'message must be a string'}), 400
+    message_text = message_text.strip()
+    if not message_text:
+        return jsonify({'error': 'Сообщение не может быть пустым'}), 400
+    
+    message = post_chat_message(order, message_text)
+    db.session.commit()
+    return jsonify(message_to_dict(message)), 201
+
+@bp.route('/api/chat/<int:order_id>/read', methods=['POST'])
+@login_required
+def api_chat_read(order_id):
+    """Отмечает прочитанными входящие сообщения до up_to (те, что пришли в открытый чат)"""
+    order = Order.query.get_or_404(order_id)
+    if not can_access_chat(order):
+        return jsonify({'error': 'forbidden'}), 403
+    
+    up_to = (request.get_json(silent=True) or {}).get('up_to')
+    if not isinstance(up_to, int):
+        return jsonify({'error': 'up_to is required'}), 400
+    
+    newly_read = mark_chat_read(order_id, current_user.id, up_to)
+    db.session.commit()
+    return jsonify({'read': newly_read})
+
+@bp.route('/api/chat/<int:order_id>/stream')
+@login_required
+def chat_stream(order_id):
+    """SSE-поток чата: новые сообщения и отметки о прочтении"""
+    order = Order.query.get_or_404(order_id)
+    if not can_access_chat(order):
+        return jsonify({'error': 'forbidden'}), 403
+    return event_stream(chat_channel(order_id))
@@ -0,0 +1,44 @@
+"""
+ResaleX - Выгрузки для продавцов и админов
+/export/<вид>.<формат> отдает товары, заказы или пользователей потоком в CSV или JSONL.
+Фильтры: status (через запятую), from и to (YYYY-MM-DD, по дате создания), для админа
+еще seller_id и role. Продавец видит только свои товары и заказы на них.
+"""
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from flask_login import login_required, current_user
+from exporter import (FORMATS, MIMETYPES, EXPORT_ROLES, export_statement, export_filename,
+                      parse_date, parse_statuses, stream_export)
+from extensions import replica_reads
+
+bp = Blueprint('exports', __name__)
+
+@bp.route('/export/<any(products, orders, users):kind>.<fmt>')
+@login_required
+@replica_reads
+def export(kind, fmt):
+    if fmt not in FORMATS:
+        return jsonify({'error': f'format: одно из {", ".join(FORMATS)}'}), 404
+    if current_user.role not in EXPORT_ROLES[kind]:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    seller_id = request.args.get('seller_id', type=int)
+    if current_user.role == 'seller':
+        seller_id = current_user.id
+    try:
+        headers, statement = export_statement(
+            kind,
+            statuses=parse_statuses(kind, request.args.get('status')),
+            date_from=parse_date(request.args.get('from')),
+            date_to=parse_date(request.args.get('to'), end=True),
+            seller_id=seller_id,
+            role=request.args.get('role'),
+        )
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    
+    # Генератор работает после выхода из представления: stream_with_context сохраняет
+    # контекст запроса, а с ним сессию базы и выбранную реплику
+    return Response(stream_with_context(stream_export(headers, statement, fmt)), mimetype=MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{export_filename(kind, fmt)}"',
+                             'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
@@ -0,0 +1,226 @@
+"""
+ResaleX - Покупка, оплата и статусы заказов
+"""
+
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, current_app
+from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from datetime import timedelta
+from events import user_channel
+from extensions import db, search_backend, payment_gateway
+from models import (job_queue, Product, Order, WebhookEvent, order_status_changed, listing_status_changed,
+                    catalog_changed, publish_after_commit)
+from payments import WebhookError
+
+bp = Blueprint('orders', __name__)
+
+# Оформление заказа: товар бронируется условным UPDATE, поэтому из одновременных покупателей
+# выигрывает ровно один. Неоплаченная бронь снимается задачей expire_reservation
+def move_product(product, from_status, to_status):
+    """Атомарно переводит товар из from_status в to_status; False, если статус уже другой"""
+    moved = Product.query.filter_by(id=product.id, status=from_status).update(
+        {Product.status: to_status}, synchronize_session=False
+    )
+    if not moved:
+        return False
+    db.session.expire(product, ['status', 'updated_at'])
+    listing_status_changed(product, from_status)
+    catalog_changed(product, from_status)
+    search_backend.sync_product(product)
+    return True
+
+def settle_order(order, new_status):
+    """Переводит ожидающий оплаты заказ в paid или cancelled и двигает товар следом"""
+    settled = Order.query.filter_by(id=order.id, status='pending').update(
+        {Order.status: new_status}, synchronize_session=False
+    )
+    if not settled:
+        return False
+    db.session.expire(order, ['status', 'updated_at'])
+    order_status_changed(order, order.product.seller_id, 'pending')
+    if new_status == 'paid':
+        move_product(order.product, 'reserved', 'sold')
+    else:
+        move_product(order.product, 'reserved', 'approved')
+    return True
+
+@bp.route('/buy/<int:product_id>', methods=['POST'])
+@login_required
+def buy_product(product_id):
+    product = Product.query.get_or_404(product_id)
+    
+    if product.seller_id == current_user.id:
+        flash('You cannot buy your own product', 'error')
+        return redirect(url_for('catalog.product_detail', product_id=product_id))
+    
+    if not move_product(product, 'approved', 'reserved'):
+        db.session.rollback()
+        flash('Product is not available for purchase', 'error')
+        return redirect(url_for('catalog.product_detail', product_id=product_id))
+    
+    # Create order
+    order = Order(
+        buyer_id=current_user.id,
+        product_id=product.id,
+        total_amount=product.price,
+        status='pending'
+    )
+    
+    db.session.add(order)
+    db.session.flush()
+    order_status_changed(order, product.seller_id, old_status=None)
+    # Намерение оплаты создает воркер: запрос не ждет ответа шлюза
+    job_queue.enqueue('payment_intent', order_id=order.id)
+    job_queue.enqueue('expire_reservation', delay=current_app.config['RESERVATION_SECONDS'], order_id=order.id)
+    db.session.commit()
+    
+    return redirect(url_for('orders.payment', order_id=order.id))
+
+def cancel_pending_order(order_id):
+    """Отменяет неоплаченный заказ: сначала намерение оплаты, затем заказ и бронь товара"""
+    order = db.session.get(Order, order_id)
+    if order is None or order.status != 'pending':
+        return
+    # Сначала отменяем намерение, чтобы оплата не прошла после снятия брони;
+    # если шлюз уже провел платеж, ошибка отложит задачу, а вебхук переведет заказ в paid
+    if order.payment_intent_id:
+        payment_gateway.cancel_intent(order.payment_intent_id)
+    settle_order(order, 'cancelled')
+
+@job_queue.handler('expire_reservation')
+def expire_reservation(order_id):
+    cancel_pending_order(order_id)
+
+@job_queue.handler('cancel_order')
+def cancel_order(order_id):
+    cancel_pending_order(order_id)
+
+@bp.route('/payment/<int:order_id>')
+@login_required
+def payment(order_id):
+    order = Order.query.options(joinedload(Order.product)).filter_by(id=order_id).first_or_404()
+    if order.buyer_id != current_user.id:
+        flash('Access denied', 'error')
+        return redirect(url_for('auth.dashboard'))
+    if order.status != 'pending':
+        flash('Заказ уже оплачен или отменен', 'info')
+        return redirect(url_for('auth.dashboard'))
+    reserved_until = order.created_at + timedelta(seconds=current_app.config['RESERVATION_SECONDS'])
+    return render_template('payment.html', order=order, client_secret=order.payment_client_secret,
+                           reserved_until=reserved_until)
+
+@bp.route('/api/orders/<int:order_id>/payment')
+@login_required
+def api_order_payment(order_id):
+    """Состояние оплаты заказа; страница оплаты опрашивает его, пока воркер создает намерение"""
+    order = Order.query.get_or_404(order_id)
+    if order.buyer_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    # Секрет нужен только для оплаты: у отмененного или оплаченного заказа его не отдаем
+    return jsonify({
+        'status': order.status,
+        'client_secret': order.payment_client_secret if order.status == 'pending' else None,
+    })
+
+@job_queue.handler('payment_intent')
+def create_payment_intent(order_id):
+    order = db.session.get(Order, order_id)
+    if order is None or order.payment_intent_id or order.status != 'pending':
+        return
+    # Ключ идемпотентности один на заказ: повтор задачи после таймаута не создаст второе намерение
+    intent = payment_gateway.create_intent(round(order.total_amount * 100), current_app.config['PAYMENT_CURRENCY'],
+                                           order.id, idempotency_key=f'order-{order.id}')
+    order.payment_intent_id = intent.id
+    order.payment_client_secret = intent.client_secret
+    publish_after_commit(user_channel(order.buyer_id), 'payment_ready', {'order_id': order.id})
+
+# Статус заказа после события намерения оплаты
+PAYMENT_EVENT_STATUSES = {
+    'payment_intent.succeeded': 'paid',
+    'payment_intent.canceled': 'cancelled',
+}
+
+def apply_payment_event(event):
+    new_status = PAYMENT_EVENT_STATUSES.get(event.type)
+    if not new_status:
+        return
+    order = Order.query.filter_by(payment_intent_id=event.object['id']).first()
+    # События могут прийти в любом порядке: settle_order меняет только заказ, еще ожидающий оплаты
+    if order is not None:
+        settle_order(order, new_status)
+
+@bp.route('/stripe/webhook', methods=['POST'])
+def stripe_webhook():
+    try:
+        event = payment_gateway.parse_event(request.get_data(), request.headers.get('Stripe-Signature'))
+    except WebhookError as exc:
+        return jsonify({'error': str(exc)}), 400
+    
+    # Шлюз повторяет доставку, пока не получит 2xx: id события записывается в той же транзакции,
+    # что и изменения заказа, поэтому событие применяется ровно один раз.
+    # Дубликатом считается только конфликт при записи id: кроме нее в транзакции еще ничего нет.
+    # Ошибка при применении события откатывает все и дает 500, чтобы шлюз доставил его снова
+    db.session.add(WebhookEvent(id=event.id, type=event.type))
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'status': 'duplicate'})
+    try:
+        apply_payment_event(event)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Не удалось применить событие %s', event.id)
+        return jsonify({'error': 'event not applied'}), 500
+    return jsonify({'status': 'ok'})
+
+# Куда продавец или модератор может перевести заказ. Оплату подтверждает только вебхук,
+# а неоплаченный заказ можно лишь отменить: товар в брони, пока заказ не оплачен или не отменен
+ORDER_TRANSITIONS = {
+    'pending': ('cancelled',),
+    'paid': ('shipped', 'delivered', 'cancelled'),
+    'shipped': ('delivered', 'cancelled'),
+}
+
+@bp.route('/update_order_status/<int:order_id>', methods=['POST'])
+@login_required
+def update_order_status(order_id):
+    order = Order.query.get_or_404(order_id)
+    
+    # Check permissions
+    can_update = (
+        current_user.role in ['admin', 'moderator'] or
+        (current_user.role == 'seller' and order.product.seller_id == current_user.id)
+    )
+    
+    if not can_update:
+        flash('Access denied', 'error')
+        return redirect(url_for('auth.dashboard'))
+    
+    new_status = request.form.get('status')
+    tracking_number = request.form.get('tracking_number', '')
+    
+    if new_status == order.status and tracking_number:
+        order.tracking_number = tracking_number
+        db.session.commit()
+        flash('Order status updated successfully', 'success')
+    elif new_status not in ORDER_TRANSITIONS.get(order.status, ()):
+        flash(f'Нельзя перевести заказ из статуса {order.status} в {new_status}', 'error')
+    elif order.status == 'pending':
+        # Неоплаченный заказ отменяет воркер: намерение оплаты отменяется в шлюзе раньше заказа,
+        # иначе покупатель успел бы оплатить отмененный заказ
+        job_queue.enqueue('cancel_order', order_id=order.id)
+        db.session.commit()
+        flash('Заказ будет отменен, как только шлюз отменит платеж', 'info')
+    else:
+        old_status = order.status
+        order.status = new_status
+        if tracking_number:
+            order.tracking_number = tracking_number
+        order_status_changed(order, order.product.seller_id, old_status)
+        db.session.commit()
+        flash('Order status updated successfully', 'success')
+    
+    return redirect(url_for('auth.dashboard'))
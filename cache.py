@@ -0,0 +1,128 @@
+"""
+ResaleX - Кэш страниц и выборок каталога
+Записи живут не дольше ttl и вытесняются по LRU. Инвалидация точечная, через теги:
+у каждого тега есть версия, запись помнит версии своих тегов на момент сохранения,
+и invalidate(tag) просто увеличивает версию — устаревшие записи перестают совпадать.
+По умолчанию кэш в памяти процесса; CACHE_URL=redis://... включает общий кэш в Redis.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCacheBackend:
+    """Кэш в памяти процесса с TTL и вытеснением давно не использованных записей"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # Версии тегов хранятся отдельно: их нельзя вытеснять, иначе версия начнется заново
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_versions(self, tags):
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump_version(self, tag):
+        with self._lock:
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Общий кэш в Redis: вытеснение по LRU настраивается в самом Redis (maxmemory-policy)"""
+
+    def __init__(self, url, prefix='resalex:cache:'):
+        # redis нужен только при включенном общем кэше, поэтому импортируется здесь
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, key):
+        return self.prefix + repr(key)
+
+    def get(self, key):
+        raw = self.client.get(self._key(key))
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self._key(key), pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def get_versions(self, tags):
+        if not tags:
+            return []
+        return [int(version or 0) for version in self.client.mget([self._key(('tag', tag)) for tag in tags])]
+
+    def bump_version(self, tag):
+        self.client.incr(self._key(('tag', tag)))
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class TaggedCache:
+    """Кэш с точечной инвалидацией по тегам поверх одного из бэкендов"""
+
+    def __init__(self, backend, default_ttl=300):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_set(self, key, compute, tags=(), ttl=None):
+        """Значение из кэша или результат compute(), сохраненный под ключом с тегами"""
+        versions = self.backend.get_versions(tags)
+        entry = self.backend.get(key)
+        if entry is not None and entry[0] == versions:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = compute()
+        # Сохраняем с версиями, прочитанными до вычисления: если за это время тег
+        # инвалидировали, запись сразу окажется устаревшей
+        self.backend.set(key, (versions, value), ttl or self.default_ttl)
+        return value
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.bump_version(tag)
+
+    def clear(self):
+        self.backend.clear()
+
+
+def get_cache(url=None, default_ttl=300, max_entries=1024):
+    """Выбирает бэкенд по CACHE_URL: redis:// и rediss:// — Redis, иначе память процесса"""
+    if url and url.startswith(('redis://', 'rediss://')):
+        return TaggedCache(RedisCacheBackend(url), default_ttl)
+    return TaggedCache(MemoryCacheBackend(max_entries), default_ttl)
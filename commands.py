@@ -0,0 +1,119 @@
+"""
+ResaleX - Команды flask CLI
+"""
+
+import time
+
+import click
+
+from extensions import db, search_backend
+from jobs import WorkerPool
+from models import job_queue, rebuild_user_stats
+
+def register_commands(app):
+    @app.cli.command('rebuild-stats')
+    def rebuild_stats():
+        """Пересчитывает счетчики user_stats по исходным таблицам"""
+        count = rebuild_user_stats()
+        db.session.commit()
+        print(f"✅ Счетчики пересчитаны: {count} пользователей")
+    
+    @app.cli.command('jobs-worker')
+    def jobs_worker():
+        """Запускает пул процессов, выполняющих фоновые задачи (Ctrl+C — остановка)"""
+        processes = app.config['JOB_WORKERS']
+        print(f"✅ Воркеры фоновых задач запущены: {processes} процесс(а)")
+        WorkerPool(app, job_queue, processes=processes).serve_forever()
+    
+    @app.cli.command('jobs-run')
+    def jobs_run():
+        """Выполняет накопившиеся фоновые задачи в текущем процессе и завершается"""
+        count = job_queue.run_pending()
+        print(f"✅ Выполнено задач: {count}")
+    
+    @app.cli.command('search-reindex')
+    def search_reindex():
+        """Перестраивает поисковый индекс по одобренным товарам"""
+        count = search_backend.rebuild()
+        db.session.commit()
+        print(f"✅ Поисковый индекс перестроен: {count} товаров")
+    
+    def import_command(kind, path, fmt, errors_path, batch_size, **options):
+        # importer загружается только для импорта: запуск приложения не платит за его зависимости
+        from importer import import_file
+        last_report = [time.monotonic()]
+        
+        def progress(report):
+            if time.monotonic() - last_report[0] >= 2:
+                last_report[0] = time.monotonic()
+                print(f"  {report['rows']} строк, {report['rows_per_second']:.0f} строк/с")
+        
+        try:
+            report, rejected_path = import_file(kind, path, fmt, errors_path, batch_size, progress, **options)
+        except ValueError as exc:
+            raise click.UsageError(str(exc))
+        print(f"✅ Импортировано {report['imported']} из {report['rows']} строк за {report['seconds']:.1f} с "
+              f"({report['rows_per_second']:.0f} строк/с)")
+        if rejected_path:
+            print(f"⚠️  Отклонено {report['rejected']} строк: {rejected_path}")
+    
+    format_option = click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+                                 help='Формат файла (по умолчанию по расширению)')
+    errors_option = click.option('--errors', 'errors_path',
+                                 help='Файл отклоненных строк (по умолчанию <файл>.rejected.<формат>)')
+    batch_option = click.option('--batch-size', default=1000, show_default=True, type=click.IntRange(1),
+                                help='Строк в одной пачке и транзакции')
+    
+    @app.cli.command('import-products')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @format_option
+    @errors_option
+    @batch_option
+    @click.option('--seller', help='Продавец (username или email) для строк без колонки seller')
+    @click.option('--status', type=click.Choice(['pending', 'approved']), default='pending', show_default=True,
+                  help='approved публикует товары без модерации')
+    def import_products(path, fmt, errors_path, batch_size, seller, status):
+        """Импортирует каталог из CSV/JSONL: name, brand, category, condition, size, price, description, seller"""
+        import_command('products', path, fmt, errors_path, batch_size, seller=seller, status=status)
+    
+    @app.cli.command('import-users')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @format_option
+    @errors_option
+    @batch_option
+    @click.option('--role', 'default_role', type=click.Choice(['user', 'seller', 'moderator', 'admin']),
+                  default='user', show_default=True, help='Роль для строк без колонки role')
+    def import_users(path, fmt, errors_path, batch_size, default_role):
+        """Импортирует пользователей из CSV/JSONL: username, email, role, password или password_hash"""
+        import_command('users', path, fmt, errors_path, batch_size, default_role=default_role)
+    
+    @app.cli.command('export')
+    @click.argument('kind', type=click.Choice(['products', 'orders', 'users']))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv', show_default=True)
+    @click.option('--status', help='Статусы через запятую (для пользователей — active или blocked)')
+    @click.option('--from', 'date_from', help='С даты создания, YYYY-MM-DD включительно')
+    @click.option('--to', 'date_to', help='По дату создания, YYYY-MM-DD включительно')
+    @click.option('--seller', help='Только товары и заказы продавца (username или email)')
+    @click.option('--role', help='Только пользователи с этой ролью')
+    @click.option('--output', '-o', type=click.File('wb'), default='-', help='Файл (по умолчанию stdout)')
+    def export(kind, fmt, status, date_from, date_to, seller, role, output):
+        """Выгружает товары, заказы или пользователей в CSV/JSONL потоком, пачками из базы"""
+        from exporter import export_statement, parse_date, parse_statuses, stream_export
+        from models import User
+        seller_id = None
+        if seller:
+            seller_id = db.session.query(User.id).filter(
+                (User.username == seller) | (User.email == seller)).scalar()
+            if seller_id is None:
+                raise click.UsageError(f'Продавец {seller} не найден')
+        try:
+            headers, statement = export_statement(kind, parse_statuses(kind, status), parse_date(date_from),
+                                                  parse_date(date_to, end=True), seller_id, role)
+        except ValueError as exc:
+            raise click.UsageError(str(exc))
+        started, size = time.perf_counter(), 0
+        for chunk in stream_export(headers, statement, fmt):
+            output.write(chunk)
+            size += len(chunk)
+        # Итог в stderr: stdout может быть самой выгрузкой
+        click.echo(f"✅ Выгружено {size / 1024 / 1024:.1f} МБ за {time.perf_counter() - started:.1f} с", err=True)
@@ -7,14 +7,39 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///resale.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Пул соединений (для SQLite в памяти не применяется)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))  # секунд ожидания свободного соединения
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # пересоздавать соединения старше N секунд
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'True').lower() == 'true'
+    # SQLite: журнал WAL и ожидание блокировки вместо ошибки «database is locked»
+    SQLITE_WAL = os.getenv('SQLITE_WAL', 'True').lower() == 'true'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    # Реплики только для чтения через запятую; пусто — все запросы в основную базу
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
     
     # Stripe Configuration
     STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY', 'pk_test_your_stripe_key')
     STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', 'sk_test_your_stripe_key')
     STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', 'whsec_your_webhook_secret')
+    # Платежный шлюз: stripe или fake (локальный, без сети — для разработки и нагрузочных тестов)
+    PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'stripe')
+    PAYMENT_CURRENCY = os.getenv('PAYMENT_CURRENCY', 'usd')
+    PAYMENT_TIMEOUT = int(os.getenv('PAYMENT_TIMEOUT', 10))  # секунд на запрос к шлюзу
+    PAYMENT_MAX_RETRIES = int(os.getenv('PAYMENT_MAX_RETRIES', 2))  # повторы сетевых ошибок
+    # Сколько секунд товар забронирован за покупателем до оплаты
+    RESERVATION_SECONDS = int(os.getenv('RESERVATION_SECONDS', 15 * 60))
     
     # File Upload
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'static/uploads')
+    UPLOAD_URL = os.getenv('UPLOAD_URL', '/static/uploads')
+    # Оригиналы ждут обработки вне static, чтобы их (вместе с EXIF) нельзя было скачать
+    UPLOAD_STAGING_FOLDER = os.getenv('UPLOAD_STAGING_FOLDER', 'instance/upload-staging')
+    # Хранилище файлов: пусто — папки выше, s3://bucket/prefix?endpoint_url=... — S3-совместимое
+    # (для публичных вариантов UPLOAD_URL указывает на бакет или CDN)
+    STORAGE_URL = os.getenv('STORAGE_URL', '')
+    STAGING_STORAGE_URL = os.getenv('STAGING_STORAGE_URL', '')
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16MB
     
     # Email Configuration
@@ -24,7 +49,53 @@ class Config:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     
+    # Push-уведомления (SSE): пусто — шина в памяти процесса, redis://... — общая шина Redis
+    EVENT_BUS_URL = os.getenv('EVENT_BUS_URL', '')
+    SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+    SSE_MAX_STREAM_SECONDS = int(os.getenv('SSE_MAX_STREAM_SECONDS', 300))
+    # Открытый поток занимает поток gunicorn: на процесс не больше SSE_MAX_STREAMS потоков
+    # (по умолчанию на два меньше GUNICORN_THREADS, чтобы обычным запросам оставались потоки)
+    # и не больше SSE_MAX_STREAMS_PER_USER у одного пользователя; сверх лимита — 503 и опрос
+    SSE_MAX_STREAMS = int(os.getenv('SSE_MAX_STREAMS', max(1, int(os.getenv('GUNICORN_THREADS', 8)) - 2)))
+    SSE_MAX_STREAMS_PER_USER = int(os.getenv('SSE_MAX_STREAMS_PER_USER', 3))
+    
+    # Кэш каталога: пусто — кэш в памяти процесса, redis://... — общий кэш Redis
+    CACHE_URL = os.getenv('CACHE_URL', '')
+    CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', 300))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1024))
+    # Сколько секунд браузер и прокси могут отдавать публичные страницы без перепроверки
+    HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 60))
+    
+    # Метрики запросов на /metrics (формат Prometheus) и журнал медленных SQL-запросов
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # если задан, /metrics требует Authorization: Bearer <токен>
+    METRICS_REQUIRE_TOKEN = False  # без токена /metrics не подключается (включено в продакшене)
+    METRICS_DIR = os.getenv('METRICS_DIR', '')  # общая папка для счетчиков нескольких процессов gunicorn
+    SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 200))
+    SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', '')  # файл журнала; пусто — общий лог приложения
+    
+    # Фоновые задачи: число процессов в пуле flask jobs-worker
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    
     # Security
+    # Хэш паролей: scrypt[:N:r:p], pbkdf2[:sha256:итерации] или bcrypt[:раунды]; старые хэши
+    # проверяются как раньше и пересчитываются с новыми параметрами при входе
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))  # хэшей одновременно на процесс
+    PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 16))  # сколько запросов ждут свободного воркера
+    PASSWORD_HASH_WAIT_SECONDS = float(os.getenv('PASSWORD_HASH_WAIT_SECONDS', 2))  # дальше — ответ 503
+    # Ограничение попыток входа и регистрации: пусто — счетчики в памяти процесса, redis://... — общие
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+    RATE_LIMIT_URL = os.getenv('RATE_LIMIT_URL', '')
+    LOGIN_IP_LIMIT = int(os.getenv('LOGIN_IP_LIMIT', 20))  # попыток входа с одного IP за окно
+    LOGIN_IP_WINDOW = int(os.getenv('LOGIN_IP_WINDOW', 60))
+    LOGIN_ACCOUNT_LIMIT = int(os.getenv('LOGIN_ACCOUNT_LIMIT', 10))  # неудачных входов в один аккаунт за окно
+    LOGIN_ACCOUNT_WINDOW = int(os.getenv('LOGIN_ACCOUNT_WINDOW', 15 * 60))
+    REGISTER_IP_LIMIT = int(os.getenv('REGISTER_IP_LIMIT', 10))  # регистраций с одного IP за окно
+    REGISTER_IP_WINDOW = int(os.getenv('REGISTER_IP_WINDOW', 60 * 60))
+    # Сколько прокси перед приложением добавляют X-Forwarded-For; без этого все клиенты
+    # за балансировщиком выглядят одним IP
+    TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', 0))
     WTF_CSRF_ENABLED = os.getenv('WTF_CSRF_ENABLED', 'True').lower() == 'true'
     WTF_CSRF_TIME_LIMIT = int(os.getenv('WTF_CSRF_TIME_LIMIT', 3600))
     
@@ -41,9 +112,35 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
     FLASK_ENV = 'production'
+    METRICS_REQUIRE_TOKEN = True
+
+class TestingConfig(Config):
+    # Каждое приложение получает свою базу в памяти, шлюз без сети и хранилища в памяти,
+    # поэтому тестовые приложения не делят состояние и могут работать параллельно
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    WTF_CSRF_ENABLED = False
+    PAYMENT_GATEWAY = 'fake'
+    STORAGE_URL = 'memory-s3://uploads'
+    STAGING_STORAGE_URL = 'memory-s3://staging'
+    CACHE_URL = ''
+    EVENT_BUS_URL = ''
+    DATABASE_REPLICA_URLS = []
+    METRICS_DIR = ''
+    # Дешевый хэш: тесты создают и проверяют много паролей
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    RATE_LIMIT_URL = ''
 
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
+
+def get_config(name=None):
+    """Класс настроек по имени или переменной FLASK_ENV (development по умолчанию)"""
+    name = name or os.getenv('FLASK_ENV') or 'default'
+    if name not in config:
+        raise ValueError(f'Неизвестное окружение FLASK_ENV={name!r}, ожидается одно из: {", ".join(config)}')
+    return config[name]
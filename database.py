@@ -0,0 +1,138 @@
+"""
+ResaleX - Подключения к базе
+Параметры пула соединений берутся из DB_* настроек; SQLite работает в режиме WAL
+с busy_timeout, чтобы чтения не блокировали запись, а запись ждала, а не падала.
+Если заданы реплики (DATABASE_REPLICA_URLS), представления с декоратором read_replica
+читают с реплики, а все записи по-прежнему уходят в основную базу.
+"""
+
+import random
+import sqlite3
+from contextlib import contextmanager
+from functools import wraps
+from importlib import import_module
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, insert as sa_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+# Ключи привязок Flask-SQLAlchemy для реплик: replica_0, replica_1, ...
+REPLICA_PREFIX = 'replica_'
+
+
+def _is_sqlite_memory(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def _engine_options(url, config):
+    if _is_sqlite_memory(url):
+        # База в памяти живет в одном соединении (StaticPool): размеры пула к ней не применимы
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+def configure_engines(app, db):
+    """Заполняет SQLALCHEMY_ENGINE_OPTIONS и привязки реплик, подключает db и настраивает SQLite"""
+    config = app.config
+    options = _engine_options(config['SQLALCHEMY_DATABASE_URI'], config)
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    for index, url in enumerate(config['DATABASE_REPLICA_URLS']):
+        binds[f'{REPLICA_PREFIX}{index}'] = {'url': url, **_engine_options(url, config)}
+    config['SQLALCHEMY_BINDS'] = binds
+    db.init_app(app)
+
+    busy_timeout, wal = config['SQLITE_BUSY_TIMEOUT_MS'], config['SQLITE_WAL']
+
+    def _configure_sqlite(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+        if wal:
+            # WAL: читатели не блокируют писателя; synchronous=NORMAL в WAL не теряет целостность
+            cursor.execute('PRAGMA journal_mode = WAL')
+            cursor.execute('PRAGMA synchronous = NORMAL')
+        cursor.close()
+
+    # Слушатель вешается на движки этого приложения, а не на все Engine процесса:
+    # у приложений в одном процессе могут быть разные настройки
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'connect', _configure_sqlite)
+
+
+class RoutingSession(Session):
+    """
+    Сессия, которая после use_replica() отправляет SELECT на выбранную реплику.
+    Flush и явные INSERT/UPDATE/DELETE всегда идут в основную базу.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if bind is None and replica and not self._flushing and not isinstance(clause, UpdateBase):
+            return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_keys(db):
+    return sorted(key for key in db.engines if key and key.startswith(REPLICA_PREFIX))
+
+
+def use_replica(db):
+    """Направляет чтения текущей сессии на случайную реплику (если они есть) до конца запроса"""
+    keys = replica_keys(db)
+    if keys:
+        db.session.info['replica'] = random.choice(keys)
+
+
+@contextmanager
+def primary_reads(db):
+    """Внутри блока чтения текущей сессии идут в основную базу, даже если представление читает с реплики"""
+    replica = db.session.info.pop('replica', None)
+    try:
+        yield
+    finally:
+        if replica:
+            db.session.info['replica'] = replica
+
+
+def read_replica(db):
+    """Декоратор представления, которое только читает: его запросы идут на реплику"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            use_replica(db)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def insert_or_ignore(db, model, index_elements, **values):
+    """
+    Вставляет строку, если строки с тем же ключом index_elements еще нет; True, если вставила.
+    INSERT ... ON CONFLICT DO NOTHING вместо «проверить и вставить»: два одновременных запроса
+    иначе вставили бы один ключ дважды, и проигравший получил бы IntegrityError.
+    """
+    dialect = db.session.get_bind(model.__mapper__).dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = import_module(f'sqlalchemy.dialects.{dialect}').insert
+        return bool(db.session.execute(insert(model).values(**values)
+                                       .on_conflict_do_nothing(index_elements=index_elements)).rowcount)
+    try:
+        with db.session.begin_nested():
+            db.session.execute(sa_insert(model).values(**values))
+        return True
+    except IntegrityError:
+        return False
@@ -4,7 +4,10 @@ ResaleX - Демонстрационные данные
 Создает тестовые данные для демонстрации функционала
 """
 
-from app import app, db, User, Product, Order
+from app import create_app
+from extensions import db, password_hasher
+from importer import import_users, import_products, records
+from models import User, Product, Order, order_status_changed
 from datetime import datetime, timedelta
 import random
 
@@ -19,22 +22,15 @@ def create_demo_users():
         {'username': 'buyer2', 'email': 'buyer2@resalex.com', 'role': 'user'},
     ]
     
-    for user_data in users_data:
-        if not User.query.filter_by(username=user_data['username']).first():
-            user = User(
-                username=user_data['username'],
-                email=user_data['email'],
-                role=user_data['role']
-            )
-            user.set_password('password123')
-            db.session.add(user)
-    
-    db.session.commit()
-    print("✅ Демонстрационные пользователи созданы")
+    # Пароль у всех одинаковый: медленный хэш считается один раз.
+    # Уже существующих пользователей импорт пропускает одной проверкой на всю пачку
+    password_hash = password_hasher.hash('password123')
+    report = import_users(records({**user, 'password_hash': password_hash} for user in users_data))
+    print(f"✅ Демонстрационные пользователи созданы: {report['imported']}")
 
 def create_demo_products():
     """Создает демонстрационные товары"""
-    sellers = User.query.filter_by(role='seller').all()
+    sellers = [username for (username,) in db.session.query(User.username).filter_by(role='seller')]
     if not sellers:
         print("❌ Нет продавцов для создания товаров")
         return
@@ -114,23 +110,13 @@ def create_demo_products():
         }
     ]
     
-    for product_data in products_data:
-        if not Product.query.filter_by(name=product_data['name']).first():
-            product = Product(
-                name=product_data['name'],
-                brand=product_data['brand'],
-                category=product_data['category'],
-                condition=product_data['condition'],
-                size=product_data['size'],
-                price=product_data['price'],
-                description=product_data['description'],
-                seller_id=random.choice(sellers).id,
-                status='approved'  # Автоматически одобряем для демо
-            )
-            db.session.add(product)
-    
-    db.session.commit()
-    print("✅ Демонстрационные товары созданы")
+    existing = {name for (name,) in db.session.query(Product.name).filter(
+        Product.name.in_([product['name'] for product in products_data]))}
+    report = import_products(records(
+        {**product_data, 'seller': random.choice(sellers)}
+        for product_data in products_data if product_data['name'] not in existing
+    ), status='approved')  # Автоматически одобряем для демо
+    print(f"✅ Демонстрационные товары созданы: {report['imported']}")
 
 def create_demo_orders():
     """Создает демонстрационные заказы"""
@@ -166,6 +152,9 @@ def create_demo_orders():
                 order.tracking_number = f"TR{random.randint(100000, 999999)}"
             
             db.session.add(order)
+            db.session.flush()
+            # Счетчики продавца (заказы в работе, оборот) обновляются так же, как при покупке
+            order_status_changed(order, product.seller_id, old_status=None)
     
     db.session.commit()
     print("✅ Демонстрационные заказы созданы")
@@ -174,7 +163,7 @@ def main():
     """Основная функция создания демо данных"""
     print("🎭 Создание демонстрационных данных для ResaleX...")
     
-    with app.app_context():
+    with create_app().app_context():
         # Создаем пользователей
         create_demo_users()
         
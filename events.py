@@ -0,0 +1,127 @@
+"""
+ResaleX - Шина событий для push-уведомлений
+Вкладки подписываются через SSE на каналы пользователя (user:<id>) и чата заказа
+(chat:<order_id>) вместо опроса API.
+По умолчанию шина живет в памяти процесса; при нескольких процессах или серверах
+задается EVENT_BUS_URL=redis://... и события идут через Redis pub/sub.
+"""
+
+import json
+import queue
+import threading
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def chat_channel(order_id):
+    return f'chat:{order_id}'
+
+
+def format_sse(event, data, event_id=None):
+    """Сериализует событие в формат text/event-stream"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """Подписка на каналы шины в памяти: очередь событий одного подписчика"""
+
+    def __init__(self, bus, channels, max_pending):
+        self.bus = bus
+        self.channels = channels
+        self.queue = queue.Queue(maxsize=max_pending)
+
+    def get(self, timeout=None):
+        """Следующее событие {'event', 'data'} или None, если за timeout ничего не пришло"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus._unsubscribe(self)
+
+
+class InProcessEventBus:
+    """Шина в памяти процесса: подходит для одного процесса с потоками (dev-сервер, gthread)"""
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait({'event': event, 'data': data})
+            except queue.Full:
+                # Медленный клиент теряет события; при переподключении он получит актуальный снимок
+                pass
+
+    def subscribe(self, *channels):
+        subscription = Subscription(self, channels, self.max_pending)
+        with self._lock:
+            for channel in channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscriptions.get(channel, ()))
+
+
+class RedisSubscription:
+    """Подписка через Redis pub/sub с тем же интерфейсом, что и Subscription"""
+
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    def get(self, timeout=None):
+        message = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout or 0)
+        if message is None or message.get('type') != 'message':
+            return None
+        return json.loads(message['data'])
+
+    def close(self):
+        self.pubsub.close()
+
+
+class RedisEventBus:
+    """Шина через Redis (или совместимый сервер): события видны всем процессам приложения"""
+
+    def __init__(self, url):
+        # redis нужен только при включенной шине Redis, поэтому импортируется здесь
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, event, data):
+        self.client.publish(channel, json.dumps({'event': event, 'data': data}))
+
+    def subscribe(self, *channels):
+        pubsub = self.client.pubsub()
+        pubsub.subscribe(*channels)
+        return RedisSubscription(pubsub)
+
+
+def get_event_bus(url=None):
+    """Выбирает шину по EVENT_BUS_URL: redis:// и rediss:// — Redis, иначе шина в памяти"""
+    if url and url.startswith(('redis://', 'rediss://')):
+        return RedisEventBus(url)
+    return InProcessEventBus()
@@ -0,0 +1,164 @@
+"""
+ResaleX - Потоковая выгрузка заказов, товаров и пользователей в CSV/JSONL
+Строки читаются из базы пачками (yield_per) и сразу отдаются клиенту или пишутся в файл,
+поэтому память процесса не зависит от размера таблицы, а первый байт уходит сразу.
+Выбираются только нужные колонки (не ORM-объекты): строки не копятся в сессии.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import User, Product, Order, UserStats
+
+EXPORT_BATCH_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+STATUSES = {
+    'products': ('pending', 'approved', 'rejected', 'reserved', 'sold'),
+    'orders': ('pending', 'paid', 'shipped', 'delivered', 'cancelled'),
+    'users': ('active', 'blocked'),
+}
+# Кто что выгружает: продавец — только свои товары и заказы на них
+EXPORT_ROLES = {
+    'products': ('root', 'admin', 'moderator', 'seller'),
+    'orders': ('root', 'admin', 'moderator', 'seller'),
+    'users': ('root', 'admin'),
+}
+# Ячейки, которые Excel принял бы за формулу
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+Seller = aliased(User, name='seller')
+Buyer = aliased(User, name='buyer')
+
+
+def _columns(kind):
+    """Заголовки и колонки выгрузки"""
+    if kind == 'products':
+        return [
+            ('id', Product.id), ('created_at', Product.created_at), ('updated_at', Product.updated_at),
+            ('status', Product.status), ('name', Product.name), ('brand', Product.brand),
+            ('category', Product.category), ('condition', Product.condition), ('size', Product.size),
+            ('price', Product.price), ('seller_id', Product.seller_id), ('seller', Seller.username),
+        ]
+    if kind == 'orders':
+        return [
+            ('id', Order.id), ('created_at', Order.created_at), ('updated_at', Order.updated_at),
+            ('status', Order.status), ('total_amount', Order.total_amount),
+            ('payment_intent_id', Order.payment_intent_id), ('tracking_number', Order.tracking_number),
+            ('product_id', Order.product_id), ('product', Product.name),
+            ('seller_id', Product.seller_id), ('seller', Seller.username),
+            ('buyer_id', Order.buyer_id), ('buyer', Buyer.username),
+        ]
+    return [
+        ('id', User.id), ('created_at', User.created_at), ('username', User.username), ('email', User.email),
+        ('role', User.role), ('is_active', User.is_active),
+        ('active_listings', UserStats.active_listings), ('lifetime_gmv', UserStats.lifetime_gmv),
+    ]
+
+
+def parse_date(value, end=False):
+    """Дата YYYY-MM-DD или дата со временем в ISO; для end дата без времени включает весь день"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Неверная дата {value}: нужен формат YYYY-MM-DD')
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def parse_statuses(kind, value):
+    """Статусы через запятую; пустое значение — все"""
+    statuses = [status.strip() for status in (value or '').split(',') if status.strip()]
+    unknown = set(statuses) - set(STATUSES[kind])
+    if unknown:
+        raise ValueError(f'Неизвестный статус: {", ".join(sorted(unknown))}')
+    return statuses
+
+
+def export_statement(kind, statuses=(), date_from=None, date_to=None, seller_id=None, role=None):
+    """
+    SELECT выгрузки с фильтрами. Даты фильтруют created_at: date_from включительно,
+    date_to — исключительно (parse_date(end=True) уже сдвинул его на конец дня).
+    seller_id ограничивает товары и заказы одним продавцом, role — пользователей одной ролью.
+    """
+    headers, columns = zip(*_columns(kind))
+    model = {'products': Product, 'orders': Order, 'users': User}[kind]
+    statement = select(*columns)
+    if kind == 'products':
+        statement = statement.join(Seller, Product.seller_id == Seller.id)
+    elif kind == 'orders':
+        statement = statement.join(Product, Order.product_id == Product.id) \
+            .join(Seller, Product.seller_id == Seller.id).join(Buyer, Order.buyer_id == Buyer.id)
+    else:
+        statement = statement.outerjoin(UserStats, UserStats.user_id == User.id)
+
+    if statuses and kind == 'users':
+        if len(statuses) == 1:
+            statement = statement.where(User.is_active == (statuses[0] == 'active'))
+    elif statuses:
+        statement = statement.where(model.status.in_(statuses))
+    if date_from:
+        statement = statement.where(model.created_at >= date_from)
+    if date_to:
+        statement = statement.where(model.created_at < date_to)
+    if seller_id is not None and kind != 'users':
+        statement = statement.where(Product.seller_id == seller_id)
+    if role and kind == 'users':
+        statement = statement.where(User.role == role)
+    # Порядок по первичному ключу: выгрузка стабильна и идет по индексу
+    return headers, statement.order_by(model.id)
+
+
+def _cell(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_cell(value):
+    value = _cell(value)
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_export(headers, statement, fmt, batch_size=None):
+    """
+    Генератор строк выгрузки в UTF-8: одна порция на пачку из batch_size записей.
+    Вызывается в контексте приложения (для ответа — через stream_with_context).
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        # BOM: Excel иначе откроет кириллицу не в той кодировке; importer.py его понимает
+        buffer.write('\ufeff')
+        writer.writerow(headers)
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        for row in rows:
+            if writer:
+                writer.writerow([_csv_cell(value) for value in row])
+            else:
+                buffer.write(json.dumps({header: _cell(value) for header, value in zip(headers, row)},
+                                        ensure_ascii=False) + '\n')
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def export_filename(kind, fmt):
+    return f'{kind}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}'
@@ -0,0 +1,64 @@
+"""
+ResaleX - Расширения и сервисы приложения
+Расширения создаются без приложения и подключаются в create_app, поэтому в одном процессе
+могут жить несколько независимых приложений (например, в тестах).
+Кэш, шина событий, платежный шлюз, хранилища и пул хэширования паролей создаются для каждого приложения
+при первом обращении: запуск процесса не платит за импорт stripe или подключение к Redis,
+пока они не понадобились.
+"""
+
+import os
+import threading
+
+from flask import current_app
+from flask_login import LoginManager
+from flask_migrate import Migrate
+from flask_sqlalchemy import SQLAlchemy
+from werkzeug.local import LocalProxy
+
+from cache import get_cache
+from database import RoutingSession, read_replica
+from events import get_event_bus
+from passwords import get_password_hasher
+from payments import get_payment_gateway
+from ratelimit import get_rate_limiter
+from search import get_search_backend, include_object
+from storage import get_storage
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+migrate = Migrate(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'),
+                  render_as_batch=True, include_object=include_object)
+login_manager = LoginManager()
+replica_reads = read_replica(db)
+
+_services_lock = threading.Lock()
+
+
+def service(name, factory):
+    """Объект текущего приложения, который factory(app) создает при первом обращении"""
+    def get():
+        services = current_app.extensions['resalex']
+        if name not in services:
+            with _services_lock:
+                if name not in services:
+                    services[name] = factory(current_app)
+        return services[name]
+    return LocalProxy(get)
+
+
+search_backend = service('search_backend', lambda app: get_search_backend(db, app.config['SQLALCHEMY_DATABASE_URI']))
+catalog_cache = service('catalog_cache', lambda app: get_cache(
+    app.config['CACHE_URL'], app.config['CACHE_DEFAULT_TTL'], app.config['CACHE_MAX_ENTRIES']))
+event_bus = service('event_bus', lambda app: get_event_bus(app.config['EVENT_BUS_URL']))
+# Платежный шлюз: Stripe (для тестирования, в продакшене заменить на СБП) или локальный fake
+payment_gateway = service('payment_gateway', lambda app: get_payment_gateway(app.config))
+# Варианты изображений (публичные) и оригиналы, ждущие обработки (закрытые)
+image_storage = service('image_storage', lambda app: get_storage(
+    app.config['STORAGE_URL'], app.config['UPLOAD_FOLDER'], app.config['UPLOAD_URL']))
+upload_staging = service('upload_staging', lambda app: get_storage(
+    app.config['STAGING_STORAGE_URL'], app.config['UPLOAD_STAGING_FOLDER']))
+# Ключи изображений, варианты которых уже собраны: готовность не меняется, поэтому запоминается
+ready_images = service('ready_images', lambda app: set())
+# Хэширование паролей в ограниченном пуле потоков и счетчики попыток входа
+password_hasher = service('password_hasher', lambda app: get_password_hasher(app.config))
+rate_limiter = service('rate_limiter', lambda app: get_rate_limiter(app.config['RATE_LIMIT_URL']))
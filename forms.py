@@ -0,0 +1,59 @@
+"""
+ResaleX - Формы
+"""
+
+from flask_wtf import FlaskForm
+from wtforms import StringField, PasswordField, SelectField, TextAreaField, DecimalField, FileField, SubmitField
+from wtforms.validators import DataRequired, Length, Email, NumberRange, EqualTo
+
+# Списки значений общие для форм и массового импорта (importer.py)
+CATEGORY_CHOICES = [
+    ('sneakers', 'Sneakers'),
+    ('clothing', 'Clothing'),
+    ('accessories', 'Accessories'),
+    ('electronics', 'Electronics'),
+    ('collectibles', 'Collectibles')
+]
+CONDITION_CHOICES = [
+    ('new', 'New'),
+    ('like_new', 'Like New'),
+    ('good', 'Good'),
+    ('fair', 'Fair'),
+    ('poor', 'Poor')
+]
+ROLE_CHOICES = [
+    ('user', 'User'),
+    ('seller', 'Seller'),
+    ('moderator', 'Moderator'),
+    ('admin', 'Admin')
+]
+
+class LoginForm(FlaskForm):
+    username = StringField('Username', validators=[DataRequired()])
+    password = PasswordField('Password', validators=[DataRequired()])
+    submit = SubmitField('Sign In')
+
+class ProductForm(FlaskForm):
+    name = StringField('Product Name', validators=[DataRequired(), Length(min=1, max=200)])
+    description = TextAreaField('Description')
+    brand = StringField('Brand', validators=[DataRequired()])
+    category = SelectField('Category', choices=CATEGORY_CHOICES)
+    size = StringField('Size')
+    condition = SelectField('Condition', choices=CONDITION_CHOICES)
+    price = DecimalField('Price', validators=[DataRequired(), NumberRange(min=0.01)])
+    image = FileField('Product Image')
+    submit = SubmitField('Add Product')
+
+class UserForm(FlaskForm):
+    username = StringField('Username', validators=[DataRequired(), Length(min=3, max=80)])
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
+    role = SelectField('Role', choices=ROLE_CHOICES)
+    submit = SubmitField('Create User')
+
+class RegisterForm(FlaskForm):
+    username = StringField('Username', validators=[DataRequired(), Length(min=3, max=80)])
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
+    confirm_password = PasswordField('Confirm Password', validators=[DataRequired(), EqualTo('password', message='Passwords must match')])
+    submit = SubmitField('Register')
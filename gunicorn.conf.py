@@ -0,0 +1,71 @@
+"""
+ResaleX - Настройки gunicorn
+Несколько процессов (pre-fork) используют все ядра, потоки внутри процесса держат
+долгие SSE-потоки и ожидание базы. Все значения задаются переменными окружения.
+"""
+
+import multiprocessing
+import os
+import signal
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Процессы: по умолчанию 2 × ядра + 1
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# gthread: открытый SSE-поток занимает поток, а не весь процесс. Потоков SSE на процесс не больше
+# SSE_MAX_STREAMS (по умолчанию GUNICORN_THREADS - 2), у одного пользователя — SSE_MAX_STREAMS_PER_USER;
+# остальные клиенты переходят на опрос. Всего на сервер примерно WEB_CONCURRENCY × SSE_MAX_STREAMS
+# потоков: при большем числе открытых вкладок увеличивайте GUNICORN_THREADS
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+# Сколько секунд при остановке дается на завершение текущих запросов
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Периодический перезапуск процессов страхует от утечек памяти
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Приложение загружается один раз в мастере, процессы получают его через fork
+preload_app = True
+forwarded_allow_ips = os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1')
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def on_starting(server):
+    # Счетчики прошлого запуска сервера не должны попасть в новые метрики
+    directory = os.getenv('METRICS_DIR')
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith(('.json', '.tmp')):
+                os.remove(os.path.join(directory, name))
+
+
+def child_exit(server, worker):
+    # Счетчики завершившегося процесса переносятся в общий архив, чтобы суммы в /metrics не падали
+    directory = os.getenv('METRICS_DIR')
+    if directory:
+        from metrics import archive_process
+        archive_process(directory, worker.pid)
+
+
+def post_fork(server, worker):
+    # Соединения с базой и репликами, открытые мастером при загрузке, нельзя делить между процессами
+    from wsgi import app
+    from extensions import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # При SIGTERM сначала завершаем SSE-потоки, иначе они держали бы процесс до graceful_timeout
+    from blueprints.api import shutting_down
+    stop_worker = signal.getsignal(signal.SIGTERM)
+
+    def graceful_stop(signum, frame):
+        shutting_down.set()
+        stop_worker(signum, frame)
+
+    signal.signal(signal.SIGTERM, graceful_stop)
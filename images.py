@@ -0,0 +1,158 @@
+"""
+ResaleX - Обработка загруженных изображений
+Из оригинала делаются варианты thumb/card/detail в WebP и JPEG без метаданных (EXIF, GPS).
+Файлы называются по SHA-256 оригинала: <ключ>-<вариант>.<формат>, поэтому одинаковые
+загрузки не дублируются, а имена можно кэшировать навсегда.
+В базе хранится URL варианта card в JPEG; остальные URL выводятся из него.
+Запрос только проверяет заголовок файла, а варианты кодирует фоновая задача
+и кладет в хранилище из storage.py.
+"""
+
+import io
+import re
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Вариант: (максимальная сторона в пикселях, обрезать ли до квадрата)
+VARIANTS = {
+    'thumb': (160, True),
+    'card': (480, False),
+    'detail': (1200, False),
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+CONTENT_TYPES = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+DEFAULT_VARIANT, DEFAULT_FORMAT = 'card', 'jpg'
+# Содержимое по такому имени никогда не меняется
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Ограничение на распакованный размер: защищает от «бомб» с огромным разрешением
+MAX_PIXELS = 40_000_000
+KEY_LENGTH = 32
+
+_VARIANT_RE = re.compile(rf'^(?P<prefix>.*/)(?P<key>[0-9a-f]{{{KEY_LENGTH}}})-(?:{"|".join(VARIANTS)})\.(?:{"|".join(FORMATS)})$')
+
+
+class ImageError(ValueError):
+    """Файл не является изображением, которое можно обработать"""
+
+
+def variant_name(key, variant, fmt):
+    return f'{key}-{variant}.{fmt}'
+
+
+def _as_file(source):
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+def _open(source):
+    try:
+        image = Image.open(_as_file(source))
+        if image.width * image.height > MAX_PIXELS:
+            raise ImageError('Изображение слишком большое')
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise ImageError('Не удалось прочитать изображение') from exc
+    # Поворачиваем по EXIF до того, как метаданные будут отброшены
+    return ImageOps.exif_transpose(image)
+
+
+def inspect_image(source):
+    """
+    Быстрая проверка в запросе: читается только заголовок файла (bytes или файловый объект),
+    пиксели не декодируются. Бросает ImageError, если это не изображение или оно слишком большое.
+    """
+    try:
+        with Image.open(_as_file(source)) as image:
+            if image.width * image.height > MAX_PIXELS:
+                raise ImageError('Изображение слишком большое')
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise ImageError('Не удалось прочитать изображение') from exc
+
+
+def content_key(digest):
+    """Ключ изображения в именах файлов: начало hex-дайджеста SHA-256 оригинала"""
+    return digest[:KEY_LENGTH]
+
+
+def _resize(image, size, square):
+    if square:
+        return ImageOps.fit(image, (size, size), Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail((size, size), Image.LANCZOS)
+    return image
+
+
+def _flatten(image, fmt):
+    """JPEG не поддерживает прозрачность: подкладываем белый фон"""
+    if fmt == 'JPEG' and image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    if image.mode not in ('RGB', 'RGBA'):
+        return image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    return image
+
+
+def render_variants(source):
+    """
+    Кодирует все варианты изображения. Возвращает {(вариант, формат): bytes};
+    метаданные не переносятся, потому что сохраняются только пиксели.
+    """
+    image = _open(source)
+    rendered = {}
+    for variant, (size, square) in VARIANTS.items():
+        resized = _resize(image, size, square)
+        for fmt, (pil_format, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            _flatten(resized, pil_format).save(buffer, pil_format, **options)
+            rendered[(variant, fmt)] = buffer.getvalue()
+    return rendered
+
+
+def variant_names(key):
+    return [variant_name(key, variant, fmt) for variant in VARIANTS for fmt in FORMATS]
+
+
+def write_variants(source, key, storage):
+    """Кодирует варианты и кладет их в хранилище с долгим кэшированием"""
+    for (variant, fmt), content in render_variants(source).items():
+        storage.put(variant_name(key, variant, fmt), io.BytesIO(content),
+                    content_type=CONTENT_TYPES[fmt], cache_control=IMMUTABLE)
+
+
+def key_url(key, storage):
+    """URL основного варианта: именно он хранится в базе"""
+    return storage.url(variant_name(key, DEFAULT_VARIANT, DEFAULT_FORMAT))
+
+
+def image_key(url):
+    """Ключ изображения из URL варианта или None для старых загрузок без вариантов"""
+    match = _VARIANT_RE.match(url or '')
+    return match.group('key') if match else None
+
+
+def variant_url(url, variant, fmt=DEFAULT_FORMAT):
+    """URL нужного варианта; старые загрузки отдаются как есть"""
+    match = _VARIANT_RE.match(url or '')
+    if not match:
+        return url
+    return match.group('prefix') + variant_name(match.group('key'), variant, fmt)
+
+
+def srcset(url, fmt=DEFAULT_FORMAT, variants=('card', 'detail')):
+    """Значение srcset с шириной каждого варианта, например «...-card.webp 480w, ...-detail.webp 1200w»"""
+    if not image_key(url):
+        return ''
+    return ', '.join(f'{variant_url(url, variant, fmt)} {VARIANTS[variant][0]}w' for variant in variants)
+
+
+def delete_image(url, storage):
+    """Удаляет все варианты изображения (или сам файл старой загрузки)"""
+    key = image_key(url)
+    names = variant_names(key) if key else [(url or '').rsplit('/', 1)[-1]]
+    for name in filter(None, names):
+        storage.delete(name)
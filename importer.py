@@ -0,0 +1,351 @@
+"""
+ResaleX - Массовый импорт товаров и пользователей
+Файл CSV или JSONL (один JSON-объект в строке) читается потоком и обрабатывается пачками:
+строки пачки проверяются, продавцы и занятые логины находятся одним запросом на пачку,
+а допустимые строки вставляются одним INSERT. Каждая пачка — своя транзакция: ошибка
+в одной не откатывает уже загруженные. Отклоненные строки пишутся в файл ошибок
+в формате входного файла с номером строки и причиной.
+"""
+
+import csv
+import json
+import math
+import os
+import time
+from collections import Counter
+from datetime import datetime
+
+from email_validator import validate_email, EmailNotValidError
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db, search_backend, password_hasher
+from forms import CATEGORY_CHOICES, CONDITION_CHOICES, ROLE_CHOICES
+from models import User, Product, bump_user_stats, invalidate_after_commit
+from passwords import is_password_hash
+
+BATCH_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+CATEGORIES = {value for value, _ in CATEGORY_CHOICES}
+CONDITIONS = {value for value, _ in CONDITION_CHOICES}
+ROLES = {value for value, _ in ROLE_CHOICES}
+PRODUCT_STATUSES = ('pending', 'approved')
+SELLER_ROLES = ('seller', 'admin')
+# Хэш, с которым не совпадает ни один пароль: пользователь войдет, когда пароль ему зададут
+UNUSABLE_PASSWORD = '!'
+
+
+def detect_format(path):
+    """Формат по расширению файла: .csv или .jsonl/.ndjson"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f'Не удалось определить формат {path}: укажите csv или jsonl')
+
+
+def read_rows(source, fmt):
+    """
+    Потоково читает открытый файл и выдает тройки (номер строки, словарь, ошибка);
+    для нечитаемой строки словарь — {'raw': текст}, а ошибка описывает проблему.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(source)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, {key: value for key, value in row.items() if key is not None}, \
+                    'лишние значения в строке'
+            else:
+                yield reader.line_num, row, None
+        return
+    for line, text in enumerate(source, 1):
+        text = text.strip()
+        if not text:
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as exc:
+            yield line, {'raw': text}, f'невалидный JSON: {exc.msg}'
+            continue
+        if isinstance(row, dict):
+            yield line, row, None
+        else:
+            yield line, {'raw': text}, 'строка должна быть JSON-объектом'
+
+
+def records(items):
+    """Тройки read_rows для словарей из памяти (демо-данные, тесты)"""
+    return ((line, item, None) for line, item in enumerate(items, 1))
+
+
+class RejectWriter:
+    """Файл отклоненных строк; создается при первой ошибке, без path строки только считаются"""
+
+    def __init__(self, path=None, fmt='csv'):
+        self.path = path
+        self.fmt = fmt
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, line, row, error):
+        self.count += 1
+        if not self.path:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+        if self.fmt == 'jsonl':
+            self._file.write(json.dumps({**row, 'line': line, 'error': error}, ensure_ascii=False, default=str) + '\n')
+            return
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._file, fieldnames=[*row, 'line', 'error'], extrasaction='ignore')
+            self._writer.writeheader()
+        self._writer.writerow({**row, 'line': line, 'error': error})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def run_import(rows, handle_batch, rejects, batch_size=BATCH_SIZE, progress=None):
+    """
+    Общий цикл импорта: набирает пачки, отдает их handle_batch и фиксирует каждую отдельно.
+    handle_batch(batch) получает [(номер, словарь)] и возвращает (вставлено, [(номер, словарь, ошибка)]).
+    """
+    report = {'rows': 0, 'imported': 0, 'rejected': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
+    started = time.perf_counter()
+
+    def flush(batch):
+        try:
+            imported, rejected = handle_batch(batch)
+            db.session.commit()
+        except SQLAlchemyError as exc:
+            # Пачка целиком откатывается, следующая начинается с чистой транзакции
+            db.session.rollback()
+            reason = f'ошибка базы: {getattr(exc, "orig", None) or exc.__class__.__name__}'
+            imported, rejected = 0, [(line, row, reason) for line, row in batch]
+        for line, row, error in rejected:
+            rejects.write(line, row, error)
+        report['imported'] += imported
+        report['rejected'] += len(rejected)
+        report['seconds'] = time.perf_counter() - started
+        report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] else 0.0
+        if progress:
+            progress(report)
+
+    batch = []
+    for line, row, error in rows:
+        report['rows'] += 1
+        if error:
+            rejects.write(line, row, error)
+            report['rejected'] += 1
+            continue
+        batch.append((line, row))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    report['seconds'] = time.perf_counter() - started
+    report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] else 0.0
+    return report
+
+
+def _text(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def product_values(row):
+    """Проверенные колонки товара из строки файла или (None, причина)"""
+    name, brand = _text(row, 'name'), _text(row, 'brand')
+    category, condition = _text(row, 'category').lower(), _text(row, 'condition').lower()
+    size = _text(row, 'size')
+    if not name or len(name) > 200:
+        return None, 'name: обязательное поле, до 200 символов'
+    if not brand or len(brand) > 100:
+        return None, 'brand: обязательное поле, до 100 символов'
+    if category not in CATEGORIES:
+        return None, f'category: одно из {", ".join(sorted(CATEGORIES))}'
+    if condition not in CONDITIONS:
+        return None, f'condition: одно из {", ".join(sorted(CONDITIONS))}'
+    if len(size) > 20:
+        return None, 'size: до 20 символов'
+    try:
+        price = float(_text(row, 'price').replace(',', '.'))
+    except ValueError:
+        return None, 'price: нужно число'
+    if not math.isfinite(price) or price < 0.01:
+        return None, 'price: не меньше 0.01'
+    return {
+        'name': name,
+        'brand': brand,
+        'category': category,
+        'condition': condition,
+        'size': size,
+        'price': round(price, 2),
+        'description': _text(row, 'description'),
+    }, None
+
+
+def import_products(rows, seller=None, status='pending', rejects=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Импортирует товары из троек read_rows. Продавец строки — колонка seller (username или email),
+    иначе seller по умолчанию. status='approved' сразу публикует товары: они попадают
+    в поисковый индекс, счетчики продавцов и сбрасывают кэш своих категорий.
+    """
+    if status not in PRODUCT_STATUSES:
+        raise ValueError(f'Недопустимый статус импорта: {status}')
+    rejects = rejects or RejectWriter()
+    sellers = {}  # username или email -> (id, role, is_active) или None, общий для всех пачек
+
+    def resolve(keys):
+        missing = {key for key in keys if key not in sellers}
+        if not missing:
+            return
+        sellers.update(dict.fromkeys(missing))
+        found = db.session.query(User.id, User.username, User.email, User.role, User.is_active).filter(
+            or_(User.username.in_(missing), User.email.in_(missing)))
+        for user_id, username, email, role, is_active in found:
+            for key in (username, email):
+                if key in missing:
+                    sellers[key] = (user_id, role, is_active)
+
+    def handle(batch):
+        rejected, valid = [], []
+        for line, row in batch:
+            values, error = product_values(row)
+            key = _text(row, 'seller') or seller or ''
+            if error is None and not key:
+                error = 'seller: не указан продавец'
+            if error:
+                rejected.append((line, row, error))
+            else:
+                valid.append((line, row, key, values))
+        resolve(key for _, _, key, _ in valid)
+
+        now = datetime.utcnow()
+        mappings = []
+        for line, row, key, values in valid:
+            found = sellers[key]
+            if found is None:
+                rejected.append((line, row, f'seller: пользователь {key} не найден'))
+            elif found[1] not in SELLER_ROLES or not found[2]:
+                rejected.append((line, row, f'seller: {key} не может продавать'))
+            else:
+                mappings.append({**values, 'seller_id': found[0], 'status': status,
+                                 'created_at': now, 'updated_at': now})
+        if mappings:
+            product_ids = db.session.scalars(insert(Product).returning(Product.id), mappings).all()
+            if status == 'approved':
+                search_backend.sync_products(product_ids)
+                for seller_id, count in Counter(mapping['seller_id'] for mapping in mappings).items():
+                    bump_user_stats(seller_id, active_listings=count)
+                invalidate_after_commit('catalog:all', *{f'catalog:{mapping["category"]}' for mapping in mappings})
+        return len(mappings), rejected
+
+    return run_import(rows, handle, rejects, batch_size, progress)
+
+
+def user_values(row, default_role='user'):
+    """Проверенные колонки пользователя из строки файла или (None, причина); пароль еще не хэширован"""
+    username, email = _text(row, 'username'), _text(row, 'email')
+    role = _text(row, 'role').lower() or default_role
+    password, password_hash = _text(row, 'password'), _text(row, 'password_hash')
+    if not 3 <= len(username) <= 80:
+        return None, 'username: от 3 до 80 символов'
+    if len(email) > 120:
+        return None, 'email: до 120 символов'
+    try:
+        validate_email(email, check_deliverability=False)
+    except EmailNotValidError as exc:
+        return None, f'email: {exc}'
+    if role not in ROLES:
+        return None, f'role: одно из {", ".join(sorted(ROLES))}'
+    if password_hash and not is_password_hash(password_hash):
+        return None, 'password_hash: нужен хэш werkzeug (scrypt:, pbkdf2:) или bcrypt ($2b$)'
+    if password and len(password) < 6:
+        return None, 'password: не короче 6 символов'
+    return {'username': username, 'email': email, 'role': role,
+            'password_hash': password_hash or None, 'password': password}, None
+
+
+def hash_passwords(passwords):
+    """
+    Хэширует пароли пачки алгоритмом из PASSWORD_HASH_METHOD в пуле хэширования:
+    не больше PASSWORD_HASH_WORKERS сразу — каждый scrypt занимает десятки мегабайт
+    """
+    return password_hasher.hash_many(passwords)
+
+
+def import_users(rows, default_role='user', rejects=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Импортирует пользователей из троек read_rows. Занятые username и email проверяются одним
+    запросом на пачку (прошлые пачки уже зафиксированы и тоже видны). Пароль берется
+    из password_hash (готовый хэш) или password; без них вход закрыт, пока пароль не зададут.
+    """
+    rejects = rejects or RejectWriter()
+
+    def handle(batch):
+        rejected, valid = [], []
+        usernames, emails = set(), set()
+        for line, row in batch:
+            values, error = user_values(row, default_role)
+            if error is None and (values['username'] in usernames or values['email'] in emails):
+                error = 'повторяет username или email из этого файла'
+            if error:
+                rejected.append((line, row, error))
+                continue
+            usernames.add(values['username'])
+            emails.add(values['email'])
+            valid.append((line, row, values))
+
+        taken_names, taken_emails = set(), set()
+        if valid:
+            for username, email in db.session.query(User.username, User.email).filter(
+                    or_(User.username.in_(usernames), User.email.in_(emails))):
+                taken_names.add(username)
+                taken_emails.add(email)
+        accepted = []
+        for line, row, values in valid:
+            if values['username'] in taken_names:
+                rejected.append((line, row, f'username {values["username"]} уже занят'))
+            elif values['email'] in taken_emails:
+                rejected.append((line, row, f'email {values["email"]} уже занят'))
+            else:
+                accepted.append(values)
+
+        plain = [values for values in accepted if not values['password_hash'] and values['password']]
+        for values, password_hash in zip(plain, hash_passwords([values['password'] for values in plain])):
+            values['password_hash'] = password_hash
+        now = datetime.utcnow()
+        mappings = [{'username': values['username'], 'email': values['email'], 'role': values['role'],
+                     'password_hash': values['password_hash'] or UNUSABLE_PASSWORD,
+                     'created_at': now, 'is_active': True} for values in accepted]
+        if mappings:
+            db.session.execute(insert(User), mappings)
+        return len(mappings), rejected
+
+    return run_import(rows, handle, rejects, batch_size, progress)
+
+
+def import_file(kind, path, fmt=None, errors_path=None, batch_size=BATCH_SIZE, progress=None, **options):
+    """
+    Импорт файла для команд flask CLI: kind — 'products' или 'users'.
+    Возвращает отчет run_import и путь файла ошибок (None, если ошибок не было).
+    """
+    fmt = fmt or detect_format(path)
+    if errors_path is None:
+        stem, _ = os.path.splitext(path)
+        errors_path = f'{stem}.rejected.{fmt}'
+    rejects = RejectWriter(errors_path, fmt)
+    importer = {'products': import_products, 'users': import_users}[kind]
+    try:
+        # utf-8-sig: CSV из Excel начинается с BOM
+        with open(path, newline='', encoding='utf-8-sig') as source:
+            report = importer(read_rows(source, fmt), rejects=rejects, batch_size=batch_size,
+                              progress=progress, **options)
+    finally:
+        rejects.close()
+    return report, errors_path if rejects.count else None
@@ -0,0 +1,192 @@
+"""
+ResaleX - Фоновые задачи
+Задачи хранятся в таблице job: запрос только добавляет строку в своей же транзакции,
+поэтому задача появляется ровно тогда, когда закоммичены данные, ради которых она создана.
+Выполняет их пул локальных процессов (flask jobs-worker) — внешний брокер не нужен.
+Упавшая задача повторяется с экспоненциальной задержкой до max_attempts раз.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import time
+import traceback
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """Очередь задач поверх модели Job; обработчики регистрируются декоратором handler"""
+
+    def __init__(self, db, model, retry_delay=10, stale_after=600):
+        self.db = db
+        self.model = model
+        self.retry_delay = retry_delay
+        self.stale_after = stale_after
+        self.handlers = {}
+
+    def handler(self, kind):
+        def register(func):
+            self.handlers[kind] = func
+            return func
+        return register
+
+    def enqueue(self, kind, max_attempts=5, delay=0, **payload):
+        """Добавляет задачу в текущую транзакцию; воркер увидит ее после commit"""
+        job = self.model(kind=kind, payload=payload, max_attempts=max_attempts,
+                         run_after=datetime.utcnow() + timedelta(seconds=delay))
+        self.db.session.add(job)
+        return job
+
+    def claim(self):
+        """
+        Забирает следующую готовую задачу. Условный UPDATE по статусу гарантирует,
+        что два воркера не возьмут одну задачу: второй получит rowcount 0 и попробует следующую.
+        """
+        Job, session = self.model, self.db.session
+        while True:
+            now = datetime.utcnow()
+            job_id = session.query(Job.id).filter(Job.status == 'queued', Job.run_after <= now) \
+                .order_by(Job.run_after, Job.id).limit(1).scalar()
+            if job_id is None:
+                session.commit()
+                return None
+            claimed = session.query(Job).filter(Job.id == job_id, Job.status == 'queued').update(
+                {Job.status: 'running', Job.locked_at: now, Job.attempts: Job.attempts + 1},
+                synchronize_session=False
+            )
+            session.commit()
+            if claimed:
+                return session.get(Job, job_id)
+
+    def run(self, job):
+        """Выполняет задачу и фиксирует результат; ошибка планирует повтор или помечает задачу failed"""
+        session = self.db.session
+        job_id = job.id
+        try:
+            handler = self.handlers[job.kind]
+            handler(**job.payload)
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            job.last_error = None
+            session.commit()
+            return True
+        except Exception:
+            session.rollback()
+            job = session.get(self.model, job_id)
+            job.last_error = traceback.format_exc()[-4000:]
+            if job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+                logger.error('Задача %s (%s) не выполнена после %s попыток', job_id, job.kind, job.attempts)
+            else:
+                job.status = 'queued'
+                job.run_after = datetime.utcnow() + timedelta(seconds=self.retry_delay * 2 ** (job.attempts - 1))
+            session.commit()
+            return False
+
+    def requeue_stale(self):
+        """Возвращает в очередь задачи, чей воркер умер посреди выполнения"""
+        Job = self.model
+        deadline = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        count = self.db.session.query(Job).filter(Job.status == 'running', Job.locked_at < deadline) \
+            .update({Job.status: 'queued'}, synchronize_session=False)
+        self.db.session.commit()
+        return count
+
+    def run_pending(self, limit=None):
+        """Выполняет готовые задачи в текущем процессе, пока очередь не опустеет; возвращает их число"""
+        done = 0
+        while limit is None or done < limit:
+            job = self.claim()
+            if job is None:
+                break
+            self.run(job)
+            done += 1
+        return done
+
+
+_stopping = False
+
+
+def _request_stop(signum, frame):
+    global _stopping
+    _stopping = True
+
+
+def _worker_main(app, queue, poll_interval):
+    """Цикл процесса-воркера: берет задачи, пока не придет SIGTERM; текущая задача дорабатывается"""
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    with app.app_context():
+        # Соединения родителя нельзя использовать после fork: забываем их, не закрывая
+        queue.db.engine.dispose(close=False)
+        while not _stopping:
+            try:
+                if not queue.run_pending(limit=100):
+                    time.sleep(poll_interval)
+            except Exception:
+                logger.exception('Ошибка воркера фоновых задач')
+                queue.db.session.rollback()
+                time.sleep(poll_interval)
+        queue.db.session.remove()
+
+
+class WorkerPool:
+    """Пул процессов-воркеров на этой машине"""
+
+    def __init__(self, app, queue, processes=2, poll_interval=1.0):
+        self.app = app
+        self.queue = queue
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.workers = []
+        # fork: дочерние процессы наследуют уже импортированное приложение
+        self.context = multiprocessing.get_context('fork')
+
+    def _spawn(self, daemon):
+        worker = self.context.Process(target=_worker_main, args=(self.app, self.queue, self.poll_interval),
+                                      name='resalex-worker', daemon=daemon)
+        worker.start()
+        return worker
+
+    def start(self, daemon=False):
+        # Перед fork закрываем соединения, чтобы дочерние процессы не делили сокеты с родителем
+        with self.app.app_context():
+            self.queue.db.engine.dispose()
+        self.workers = [self._spawn(daemon) for _ in range(self.processes)]
+        return self
+
+    def stop(self, timeout=30):
+        for worker in self.workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGTERM)
+        for worker in self.workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.kill()
+        self.workers = []
+
+    def serve_forever(self, stale_check_interval=60):
+        """Держит пул запущенным: перезапускает упавших воркеров и возвращает зависшие задачи"""
+        signal.signal(signal.SIGTERM, _request_stop)
+        self.start()
+        last_stale_check = 0
+        try:
+            while not _stopping:
+                for index, worker in enumerate(self.workers):
+                    if not worker.is_alive():
+                        logger.warning('Воркер %s завершился с кодом %s, перезапускаем', worker.pid, worker.exitcode)
+                        self.workers[index] = self._spawn(daemon=False)
+                if time.monotonic() - last_stale_check > stale_check_interval:
+                    with self.app.app_context():
+                        self.queue.requeue_stale()
+                        self.queue.db.session.remove()
+                    last_stale_check = time.monotonic()
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
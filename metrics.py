@@ -0,0 +1,294 @@
+"""
+ResaleX - Метрики запросов
+Для каждого запроса считаются время ответа, число SQL-запросов и время в базе,
+время рендеринга шаблонов и размер ответа; все в гистограммах по endpoint.
+/metrics отдает их в текстовом формате Prometheus, а запросы к базе дольше SLOW_QUERY_MS
+пишутся в журнал медленных запросов вместе с маршрутом.
+Учет стоит несколько вызовов perf_counter и одну короткую блокировку на запрос.
+Под gunicorn у каждого процесса свои счетчики: с METRICS_DIR процессы раз в секунду
+сбрасывают их в файлы, и /metrics суммирует все процессы.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request, abort, before_render_template, template_rendered
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('resalex.slow_queries')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Сколько символов SQL попадает в журнал медленных запросов; параметры не пишутся (там бывают личные данные)
+SLOW_QUERY_MAX_SQL = 2000
+
+
+class MetricsRegistry:
+    """
+    Счетчики и гистограммы с метками. Гистограмма хранит по серии меток счетчики корзин
+    (не накопительные), счетчик попаданий выше последней корзины и сумму значений.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._last_flush = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def counter(self, name, documentation, labels):
+        self.metrics[name] = {'type': 'counter', 'help': documentation, 'labels': labels, 'series': {}}
+
+    def histogram(self, name, documentation, labels, buckets):
+        self.metrics[name] = {'type': 'histogram', 'help': documentation, 'labels': labels,
+                              'buckets': tuple(buckets), 'series': {}}
+
+    def inc(self, name, labels, amount=1):
+        series = self.metrics[name]['series']
+        with self.lock:
+            series[labels] = series.get(labels, 0) + amount
+
+    def observe(self, name, labels, value):
+        metric = self.metrics[name]
+        buckets = metric['buckets']
+        with self.lock:
+            values = metric['series'].get(labels)
+            if values is None:
+                values = metric['series'][labels] = [0] * (len(buckets) + 1) + [0.0]
+            values[bisect_left(buckets, value)] += 1
+            values[-1] += value
+
+    def snapshot(self):
+        """Копия значений, пригодная для JSON: {метрика: [[метки, значение], ...]}"""
+        with self.lock:
+            return {name: [[list(labels), list(value) if isinstance(value, list) else value]
+                           for labels, value in metric['series'].items()]
+                    for name, metric in self.metrics.items()}
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def flush(self, force=False):
+        """Сбрасывает счетчики процесса в METRICS_DIR, но не чаще flush_interval"""
+        if not self.directory or (not force and time.monotonic() - self._last_flush < self.flush_interval):
+            return
+        self._last_flush = time.monotonic()
+        path = self._path(os.getpid())
+        with open(f'{path}.tmp', 'w') as out:
+            json.dump(self.snapshot(), out)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self):
+        """Снимки всех процессов (или только этого, если METRICS_DIR не задан)"""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush(force=True)
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as source:
+                    snapshots.append(json.load(source))
+            except (OSError, ValueError):
+                # Файл процесса, который как раз завершился или пишется
+                continue
+        return snapshots
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        merged = merge_snapshots(self.collect())
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric["help"]}')
+            lines.append(f'# TYPE {name} {metric["type"]}')
+            for labels, value in sorted(merged.get(name, {}).items()):
+                pairs = list(zip(metric['labels'], labels))
+                if metric['type'] == 'counter':
+                    lines.append(f'{name}{_labels(pairs)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric['buckets'] + ('+Inf',), value[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(pairs + [("le", _number(bound))])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(pairs)} {_number(value[-1])}')
+                lines.append(f'{name}_count{_labels(pairs)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def merge_snapshots(snapshots):
+    """Складывает снимки процессов: {метрика: {метки: значение}}"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, series in snapshot.items():
+            target = merged.setdefault(name, {})
+            for labels, value in series:
+                labels = tuple(labels)
+                current = target.get(labels)
+                if current is None:
+                    target[labels] = value
+                elif isinstance(value, list):
+                    target[labels] = [a + b for a, b in zip(current, value)]
+                else:
+                    target[labels] = current + value
+    return merged
+
+
+def archive_process(directory, pid):
+    """
+    Переносит счетчики завершившегося процесса в общий archive.json, чтобы суммы не падали,
+    а файлы не копились при перезапусках воркеров. Вызывается мастером gunicorn (child_exit).
+    """
+    path = os.path.join(directory, f'{pid}.json')
+    archive = os.path.join(directory, 'archive.json')
+    if not os.path.exists(path):
+        return
+    snapshots = []
+    for source in (archive, path):
+        try:
+            with open(source) as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+    merged = merge_snapshots(snapshots)
+    with open(f'{archive}.tmp', 'w') as out:
+        json.dump({name: [[list(labels), value] for labels, value in series.items()]
+                   for name, series in merged.items()}, out)
+    os.replace(f'{archive}.tmp', archive)
+    os.remove(path)
+
+
+def _number(value):
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+class RequestMetrics:
+    """Учет запросов приложения: хуки Flask, события курсора SQLAlchemy и сигналы шаблонов"""
+
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        config = app.config
+        self.slow_query_seconds = config['SLOW_QUERY_MS'] / 1000
+        self.token = config['METRICS_TOKEN']
+        self.registry = registry = MetricsRegistry(config['METRICS_DIR'] or None)
+        registry.counter('resalex_requests_total', 'Запросы по endpoint, методу и коду ответа',
+                         ('endpoint', 'method', 'status'))
+        registry.histogram('resalex_request_duration_seconds', 'Время обработки запроса',
+                           ('endpoint',), LATENCY_BUCKETS)
+        registry.histogram('resalex_request_db_queries', 'SQL-запросов за один запрос',
+                           ('endpoint',), QUERY_COUNT_BUCKETS)
+        registry.histogram('resalex_request_db_seconds', 'Суммарное время SQL-запросов за один запрос',
+                           ('endpoint',), LATENCY_BUCKETS)
+        registry.histogram('resalex_request_template_seconds', 'Время рендеринга шаблонов за один запрос',
+                           ('endpoint',), LATENCY_BUCKETS)
+        registry.histogram('resalex_response_size_bytes', 'Размер тела ответа (потоковые ответы не учитываются)',
+                           ('endpoint',), SIZE_BUCKETS)
+        registry.counter('resalex_slow_queries_total', 'SQL-запросы дольше SLOW_QUERY_MS',
+                         ('endpoint',))
+
+        log_path = config['SLOW_QUERY_LOG'] and os.path.abspath(config['SLOW_QUERY_LOG'])
+        if log_path and not any(getattr(handler, 'baseFilename', None) == log_path
+                                for handler in slow_query_logger.handlers):
+            handler = logging.FileHandler(log_path)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(process)d %(message)s'))
+            slow_query_logger.addHandler(handler)
+            slow_query_logger.setLevel(logging.WARNING)
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._template_started, app, weak=False)
+        template_rendered.connect(self._template_finished, app, weak=False)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._query_started)
+                event.listen(engine, 'after_cursor_execute', self._query_finished)
+                event.listen(engine, 'handle_error', self._query_failed)
+        if self.token or not config['METRICS_REQUIRE_TOKEN']:
+            app.add_url_rule('/metrics', 'metrics', self.view)
+        else:
+            # Трафик по маршрутам и журнал медленных запросов не должны быть публичными
+            logger.warning('/metrics отключен: в этом окружении нужен METRICS_TOKEN')
+        app.extensions['metrics'] = self
+
+    def _start(self):
+        g.metrics = {'started': time.perf_counter(), 'queries': 0, 'db': 0.0, 'template': 0.0}
+
+    def _query_started(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+    def _query_finished(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('metrics_query_started')
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        in_request = has_request_context() and 'metrics' in g
+        if in_request:
+            g.metrics['queries'] += 1
+            g.metrics['db'] += elapsed
+        if elapsed >= self.slow_query_seconds:
+            route = f'{request.method} {request.path} ({_endpoint()})' if in_request else 'вне запроса'
+            self.registry.inc('resalex_slow_queries_total', (_endpoint() if in_request else 'none',))
+            slow_query_logger.warning('Медленный SQL-запрос %.1f мс, %s: %s',
+                                      elapsed * 1000, route, ' '.join(statement.split())[:SLOW_QUERY_MAX_SQL])
+
+    def _query_failed(self, context):
+        # after_cursor_execute для упавшего запроса не вызывается: время его начала снимается здесь
+        started = context.connection.info.get('metrics_query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    def _template_started(self, sender, template, context, **extra):
+        if has_request_context() and 'metrics' in g:
+            g.metrics['template_started'] = time.perf_counter()
+
+    def _template_finished(self, sender, template, context, **extra):
+        if has_request_context() and 'template_started' in g.get('metrics', {}):
+            g.metrics['template'] += time.perf_counter() - g.metrics.pop('template_started')
+
+    def _finish(self, response):
+        state = g.pop('metrics', None)
+        if state is None:
+            return response
+        endpoint = (_endpoint(),)
+        registry = self.registry
+        registry.inc('resalex_requests_total', (endpoint[0], request.method, str(response.status_code)))
+        registry.observe('resalex_request_duration_seconds', endpoint, time.perf_counter() - state['started'])
+        registry.observe('resalex_request_db_queries', endpoint, state['queries'])
+        registry.observe('resalex_request_db_seconds', endpoint, state['db'])
+        registry.observe('resalex_request_template_seconds', endpoint, state['template'])
+        if not response.is_streamed:
+            registry.observe('resalex_response_size_bytes', endpoint, response.calculate_content_length() or 0)
+        try:
+            registry.flush()
+        except OSError:
+            logger.exception('Не удалось сохранить метрики в %s', registry.directory)
+        return response
+
+    def view(self):
+        if self.token and request.headers.get('Authorization') != f'Bearer {self.token}':
+            abort(401)
+        return Response(self.registry.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,96 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 14:54:30.938999
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Существующие базы (resale.db, Postgres) создавались через db.create_all(),
+    # поэтому создаем только недостающие таблицы, чтобы их можно было обновить на месте
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'user' not in existing:
+        op.create_table('user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=80), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password_hash', sa.String(length=120), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('avatar_url', sa.String(length=120), nullable=True),
+        sa.Column('email_verified', sa.Boolean(), nullable=True),
+        sa.Column('verification_token', sa.String(length=120), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username')
+        )
+
+    if 'product' not in existing:
+        op.create_table('product',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('brand', sa.String(length=100), nullable=True),
+        sa.Column('category', sa.String(length=50), nullable=True),
+        sa.Column('size', sa.String(length=20), nullable=True),
+        sa.Column('condition', sa.String(length=50), nullable=True),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('seller_id', sa.Integer(), nullable=False),
+        sa.Column('image_url', sa.String(length=200), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['seller_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'order' not in existing:
+        op.create_table('order',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('buyer_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('payment_intent_id', sa.String(length=200), nullable=True),
+        sa.Column('tracking_number', sa.String(length=100), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['buyer_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'chat_message' not in existing:
+        op.create_table('chat_message',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sender_id', sa.Integer(), nullable=False),
+        sa.Column('receiver_id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=True),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('is_read', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['order_id'], ['order.id'], ),
+        sa.ForeignKeyConstraint(['receiver_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['sender_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('chat_message')
+    op.drop_table('order')
+    op.drop_table('product')
+    op.drop_table('user')
@@ -0,0 +1,43 @@
+"""catalog indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 14:54:41.266250
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_message_order_id_created_at', ['order_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.create_index('ix_order_buyer_id_created_at', ['buyer_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_order_product_id', ['product_id'], unique=False)
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index('ix_product_seller_id_created_at', ['seller_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_product_status_category_created_at', ['status', 'category', 'created_at'], unique=False)
+        batch_op.create_index('ix_product_status_created_at', ['status', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_status_created_at')
+        batch_op.drop_index('ix_product_status_category_created_at')
+        batch_op.drop_index('ix_product_seller_id_created_at')
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_product_id')
+        batch_op.drop_index('ix_order_buyer_id_created_at')
+
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_message_order_id_created_at')
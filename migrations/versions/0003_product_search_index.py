@@ -0,0 +1,57 @@
+"""product search index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 14:58:12.402113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE product_fts USING fts5("
+            "name, brand, description, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        op.execute(
+            "INSERT INTO product_fts (rowid, name, brand, description) "
+            "SELECT id, coalesce(name, ''), coalesce(brand, ''), coalesce(description, '') "
+            "FROM product WHERE status = 'approved'"
+        )
+    elif dialect == 'postgresql':
+        op.create_table('product_search',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('document', postgresql.TSVECTOR(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('product_id')
+        )
+        op.create_index('ix_product_search_document', 'product_search', ['document'], postgresql_using='gin')
+        op.execute(
+            "INSERT INTO product_search (product_id, document) "
+            "SELECT id, "
+            "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(brand, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'C') "
+            "FROM product WHERE status = 'approved'"
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TABLE product_fts')
+    elif dialect == 'postgresql':
+        op.drop_index('ix_product_search_document', table_name='product_search')
+        op.drop_table('product_search')
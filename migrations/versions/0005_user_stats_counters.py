@@ -0,0 +1,45 @@
+"""user stats counters
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 15:04:03.168344
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('unread_messages', sa.Integer(), nullable=False),
+    sa.Column('pending_orders', sa.Integer(), nullable=False),
+    sa.Column('active_listings', sa.Integer(), nullable=False),
+    sa.Column('lifetime_gmv', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Заполняем счетчики для существующих пользователей; дальше их поддерживает приложение
+    op.execute('''
+        INSERT INTO user_stats (user_id, unread_messages, pending_orders, active_listings, lifetime_gmv)
+        SELECT u.id,
+            (SELECT count(*) FROM chat_message m WHERE m.receiver_id = u.id AND m.is_read = false),
+            (SELECT count(*) FROM "order" o JOIN product p ON p.id = o.product_id
+             WHERE p.seller_id = u.id AND o.status IN ('pending', 'paid')),
+            (SELECT count(*) FROM product p WHERE p.seller_id = u.id AND p.status = 'approved'),
+            (SELECT coalesce(sum(o.total_amount), 0) FROM "order" o JOIN product p ON p.id = o.product_id
+             WHERE p.seller_id = u.id AND o.status != 'cancelled')
+        FROM "user" u
+    ''')
+
+
+def downgrade():
+    op.drop_table('user_stats')
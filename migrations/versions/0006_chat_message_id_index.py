@@ -0,0 +1,27 @@
+"""chat message id index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 15:08:31.999219
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_message_order_id_created_at')
+        batch_op.create_index('ix_chat_message_order_id_id', ['order_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_message_order_id_id')
+        batch_op.create_index('ix_chat_message_order_id_created_at', ['order_id', 'created_at'], unique=False)
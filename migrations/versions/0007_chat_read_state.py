@@ -0,0 +1,40 @@
+"""chat read state
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 15:10:10.974671
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('chat_read_state',
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('last_read_message_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['order_id'], ['order.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('order_id', 'user_id')
+    )
+    # Отметка ставится перед первым непрочитанным входящим сообщением (или на последнее прочитанное)
+    op.execute('''
+        INSERT INTO chat_read_state (order_id, user_id, last_read_message_id)
+        SELECT order_id, receiver_id,
+            coalesce(min(CASE WHEN is_read = false THEN id END) - 1, max(id))
+        FROM chat_message
+        GROUP BY order_id, receiver_id
+    ''')
+
+
+def downgrade():
+    op.drop_table('chat_read_state')
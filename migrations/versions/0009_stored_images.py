@@ -0,0 +1,43 @@
+"""stored images
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 15:22:16.056983
+
+"""
+from collections import Counter
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stored_image',
+    sa.Column('key', sa.String(length=32), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('ready', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+    # Ссылки на уже загруженные варианты (<ключ>-<вариант>.<формат>) считаем по товарам и профилям
+    variant_re = re.compile(r'/([0-9a-f]{32})-(?:thumb|card|detail)\.(?:webp|jpg)$')
+    bind = op.get_bind()
+    urls = [row[0] for row in bind.execute(sa.text('SELECT image_url FROM product WHERE image_url IS NOT NULL'))]
+    urls += [row[0] for row in bind.execute(sa.text('SELECT avatar_url FROM "user" WHERE avatar_url IS NOT NULL'))]
+    counts = Counter(match.group(1) for match in map(variant_re.search, urls) if match)
+    if counts:
+        stored_image = sa.table('stored_image', sa.column('key'), sa.column('ref_count'), sa.column('ready'))
+        op.bulk_insert(stored_image, [{'key': key, 'ref_count': count, 'ready': True}
+                                      for key, count in counts.items()])
+
+
+def downgrade():
+    op.drop_table('stored_image')
@@ -0,0 +1,36 @@
+"""payment webhooks
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 15:25:00.365474
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('webhook_event',
+    sa.Column('id', sa.String(length=255), nullable=False),
+    sa.Column('type', sa.String(length=100), nullable=False),
+    sa.Column('received_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('payment_client_secret', sa.String(length=200), nullable=True))
+        batch_op.create_index('ix_order_payment_intent_id', ['payment_intent_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_payment_intent_id')
+        batch_op.drop_column('payment_client_secret')
+
+    op.drop_table('webhook_event')
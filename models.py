@@ -0,0 +1,276 @@
+"""
+ResaleX - Модели базы данных
+Кроме моделей здесь счетчики user_stats и очереди действий после commit:
+события шины и сброс кэша каталога уходят только после успешной транзакции.
+"""
+
+from flask_login import UserMixin
+from sqlalchemy import func, event
+from datetime import datetime
+from events import user_channel
+from extensions import db, login_manager, catalog_cache, event_bus, password_hasher
+from jobs import JobQueue
+
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    # scrypt-хэш werkzeug длиннее 120 символов
+    password_hash = db.Column(db.String(255), nullable=False)
+    role = db.Column(db.String(20), default='user')  # user, seller, moderator, admin
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_active = db.Column(db.Boolean, default=True)
+    avatar_url = db.Column(db.String(120), nullable=True)
+    email_verified = db.Column(db.Boolean, default=False)
+    verification_token = db.Column(db.String(120), nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_user_created_at', 'created_at'),
+    )
+    
+    def set_password(self, password):
+        self.password_hash = password_hasher.hash(password)
+    
+    def check_password(self, password):
+        """
+        Проверка в пуле хэширования (PasswordHasherBusy, если он перегружен).
+        Хэш со старым алгоритмом или стоимостью пересчитывается; сохранит его commit вызывающего.
+        """
+        if not password_hasher.verify(self.password_hash, password):
+            return False
+        if password_hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
+
+class Product(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text)
+    brand = db.Column(db.String(100))
+    category = db.Column(db.String(50))
+    size = db.Column(db.String(20))
+    condition = db.Column(db.String(50))  # New, Like New, Good, Fair, Poor
+    price = db.Column(db.Float, nullable=False)
+    seller_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    image_url = db.Column(db.String(200))
+    status = db.Column(db.String(20), default='pending')  # pending, approved, rejected, reserved, sold
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    seller = db.relationship('User', backref='products')
+    
+    # Каталог, модерация и дашборд продавца фильтруют по этим колонкам и сортируют по дате
+    __table_args__ = (
+        db.Index('ix_product_status_created_at', 'status', 'created_at'),
+        db.Index('ix_product_status_category_created_at', 'status', 'category', 'created_at'),
+        db.Index('ix_product_seller_id_created_at', 'seller_id', 'created_at'),
+        db.Index('ix_product_created_at', 'created_at'),
+    )
+
+class Order(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    buyer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    total_amount = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, paid, shipped, delivered, cancelled
+    payment_intent_id = db.Column(db.String(200))
+    payment_client_secret = db.Column(db.String(200))  # для формы оплаты; появляется после создания намерения
+    tracking_number = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    buyer = db.relationship('User', foreign_keys=[buyer_id], backref='orders')
+    product = db.relationship('Product', backref='orders')
+    
+    __table_args__ = (
+        db.Index('ix_order_buyer_id_created_at', 'buyer_id', 'created_at'),
+        db.Index('ix_order_product_id', 'product_id'),
+        db.Index('ix_order_created_at', 'created_at'),
+        db.Index('ix_order_status_created_at', 'status', 'created_at'),
+        db.Index('ix_order_payment_intent_id', 'payment_intent_id'),
+    )
+
+class ChatMessage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=True)
+    message = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_read = db.Column(db.Boolean, default=False)
+    
+    sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
+    receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_messages')
+    order = db.relationship('Order', backref='messages')
+    
+    __table_args__ = (
+        db.Index('ix_chat_message_order_id_id', 'order_id', 'id'),
+    )
+
+class ChatReadState(db.Model):
+    """Докуда участник прочитал чат заказа: все сообщения с id <= last_read_message_id прочитаны"""
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    last_read_message_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Job(db.Model):
+    """Фоновая задача; выполняется воркером flask jobs-worker"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
+
+job_queue = JobQueue(db, Job)
+
+class WebhookEvent(db.Model):
+    """Обработанное событие вебхука платежного шлюза: повторная доставка того же id пропускается"""
+    id = db.Column(db.String(255), primary_key=True)
+    type = db.Column(db.String(100), nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class StoredImage(db.Model):
+    """Загруженное изображение и число ссылок на него из товаров и профилей"""
+    key = db.Column(db.String(32), primary_key=True)  # начало SHA-256 оригинала, как в именах файлов
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    ready = db.Column(db.Boolean, nullable=False, default=False)  # варианты собраны
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UserStats(db.Model):
+    """Денормализованные счетчики пользователя, обновляются в тех же транзакциях, что и данные"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    unread_messages = db.Column(db.Integer, nullable=False, default=0)
+    pending_orders = db.Column(db.Integer, nullable=False, default=0)  # заказы на товары продавца в статусе pending/paid
+    active_listings = db.Column(db.Integer, nullable=False, default=0)  # одобренные товары продавца
+    lifetime_gmv = db.Column(db.Float, nullable=False, default=0)  # сумма неотмененных заказов продавца
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Статусы заказа, в которых продавец еще должен его обработать
+OPEN_ORDER_STATUSES = ('pending', 'paid')
+
+def compute_user_stats(user_ids=None):
+    """Считает счетчики по исходным таблицам; используется при пересборке и для новых строк"""
+    def scoped(query, column):
+        return query.filter(column.in_(user_ids)) if user_ids is not None else query
+    
+    unread = scoped(db.session.query(ChatMessage.receiver_id, func.count(ChatMessage.id))
+                    .filter(ChatMessage.is_read == False), ChatMessage.receiver_id) \
+        .group_by(ChatMessage.receiver_id).all()
+    pending = scoped(db.session.query(Product.seller_id, func.count(Order.id)).join(Order.product)
+                     .filter(Order.status.in_(OPEN_ORDER_STATUSES)), Product.seller_id) \
+        .group_by(Product.seller_id).all()
+    listings = scoped(db.session.query(Product.seller_id, func.count(Product.id))
+                      .filter(Product.status == 'approved'), Product.seller_id) \
+        .group_by(Product.seller_id).all()
+    gmv = scoped(db.session.query(Product.seller_id, func.sum(Order.total_amount)).join(Order.product)
+                 .filter(Order.status != 'cancelled'), Product.seller_id) \
+        .group_by(Product.seller_id).all()
+    
+    ids = user_ids if user_ids is not None else [user_id for (user_id,) in db.session.query(User.id)]
+    stats = {user_id: {'user_id': user_id, 'unread_messages': 0, 'pending_orders': 0,
+                       'active_listings': 0, 'lifetime_gmv': 0} for user_id in ids}
+    for column, rows in [('unread_messages', unread), ('pending_orders', pending),
+                         ('active_listings', listings), ('lifetime_gmv', gmv)]:
+        for user_id, value in rows:
+            if user_id in stats:
+                stats[user_id][column] = value or 0
+    return list(stats.values())
+
+def rebuild_user_stats():
+    """Пересобирает все счетчики с нуля (исправление расхождений)"""
+    rows = compute_user_stats()
+    UserStats.query.delete()
+    db.session.bulk_insert_mappings(UserStats, rows)
+    return len(rows)
+
+def get_user_stats(user_id):
+    """Счетчики пользователя по первичному ключу; если строки нет, они считаются из таблиц"""
+    return db.session.get(UserStats, user_id) or UserStats(**compute_user_stats([user_id])[0])
+
+def bump_user_stats(user_id, **deltas):
+    """
+    Атомарно прибавляет дельты к счетчикам в текущей транзакции (UPDATE ... SET x = x + d).
+    Вызывается после изменения данных: если строки счетчиков нет, она создается
+    пересчетом из таблиц, где изменение уже учтено.
+    """
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = UserStats.query.filter_by(user_id=user_id).update(
+        {getattr(UserStats, column): getattr(UserStats, column) + delta for column, delta in deltas.items()},
+        synchronize_session=False
+    )
+    if not updated:
+        db.session.flush()
+        db.session.add(UserStats(**compute_user_stats([user_id])[0]))
+    publish_after_commit(user_channel(user_id), 'stats_delta', deltas)
+
+def order_status_changed(order, seller_id, old_status):
+    """Обновляет счетчики продавца и уведомляет участников при создании заказа (old_status=None) и смене статуса"""
+    was_open, is_open = old_status in OPEN_ORDER_STATUSES, order.status in OPEN_ORDER_STATUSES
+    was_counted, is_counted = old_status not in (None, 'cancelled'), order.status != 'cancelled'
+    bump_user_stats(seller_id,
+                    pending_orders=int(is_open) - int(was_open),
+                    lifetime_gmv=(int(is_counted) - int(was_counted)) * order.total_amount)
+    payload = {'order_id': order.id, 'status': order.status, 'created': old_status is None}
+    publish_after_commit(user_channel(seller_id), 'order', payload)
+    publish_after_commit(user_channel(order.buyer_id), 'order', payload)
+
+def listing_status_changed(product, old_status):
+    """Обновляет счетчик активных товаров продавца при смене статуса товара"""
+    bump_user_stats(product.seller_id,
+                    active_listings=int(product.status == 'approved') - int(old_status == 'approved'))
+
+# Push-уведомления: события копятся в сессии и уходят в шину только после commit,
+# чтобы откаченная транзакция ничего не разослала
+def publish_after_commit(channel, event_name, data):
+    db.session.info.setdefault('pending_events', []).append((channel, event_name, data))
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_pending_events(session):
+    for channel, event_name, data in session.info.pop('pending_events', []):
+        event_bus.publish(channel, event_name, data)
+
+def invalidate_after_commit(*tags):
+    db.session.info.setdefault('pending_invalidations', set()).update(tags)
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_pending_tags(session):
+    catalog_cache.invalidate(*session.info.pop('pending_invalidations', ()))
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _drop_pending_events(session, previous_transaction):
+    session.info.pop('pending_events', None)
+    session.info.pop('pending_invalidations', None)
+
+# Кэш каталога: выборки и страницы помечаются тегом категории (catalog:<категория>)
+# или catalog:all для выдачи без фильтра и главной
+def catalog_tags(category):
+    return (f'catalog:{category}',) if category else ('catalog:all',)
+
+def catalog_changed(product, old_status, old_category=None):
+    """Сбрасывает кэш только тех выдач, где товар был или будет виден"""
+    if 'approved' not in (old_status, product.status):
+        return
+    invalidate_after_commit('catalog:all', f'catalog:{product.category}')
+    if old_category and old_category != product.category:
+        invalidate_after_commit(f'catalog:{old_category}')
+
+def product_row(product):
+    """Колонки товара в виде словаря: такой объект можно хранить в кэше и отдавать шаблонам"""
+    return {column.key: getattr(product, column.key) for column in Product.__table__.columns}
+
+@login_manager.user_loader
+def load_user(user_id):
+    return User.query.get(int(user_id))
@@ -0,0 +1,122 @@
+"""
+ResaleX - Курсорная (keyset) пагинация
+Страница выбирается условием по ключу сортировки последней показанной записи, а не OFFSET,
+поэтому глубокие страницы стоят столько же, сколько первая.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_, tuple_
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа сортировки в непрозрачный токен для URL"""
+    payload = [{'dt': value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; на испорченный токен возвращает None"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list):
+            return None
+        return [datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value for value in payload]
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def _matches_column(value, column):
+    """Значение курсора — скаляр типа колонки: списки, словари и чужие типы в SQL не попадают"""
+    try:
+        expected = column.type.python_type
+    except NotImplementedError:
+        expected = None
+    if isinstance(value, bool) or value is None:
+        return False
+    if expected is datetime:
+        return isinstance(value, datetime)
+    if expected is float:
+        return isinstance(value, (int, float))
+    if expected in (int, str):
+        return isinstance(value, expected)
+    return isinstance(value, (int, float, str, datetime))
+
+
+def _valid_cursor(cursor, keys):
+    return cursor is not None and len(cursor) == len(keys) and \
+        all(_matches_column(value, column) for value, (column, _) in zip(cursor, keys))
+
+
+def _seek_condition(keys, values, forward):
+    """Условие «строго после (или до) данной записи» для ключей с направлениями сортировки"""
+    directions = {descending for _, descending in keys}
+    if len(directions) == 1:
+        # Все ключи в одном направлении: сравнение кортежей использует составной индекс
+        descending = directions.pop() == forward
+        columns = tuple_(*[column for column, _ in keys])
+        return columns < tuple_(*values) if descending else columns > tuple_(*values)
+
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        equal = [keys[j][0] == values[j] for j in range(i)]
+        beyond = column < values[i] if descending == forward else column > values[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+
+class KeysetPage:
+    """Страница выдачи с токенами соседних страниц"""
+
+    def __init__(self, items, next_cursor, prev_cursor, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def keyset_paginate(query, keys, after=None, before=None, per_page=12, total=None):
+    """
+    Возвращает страницу query, упорядоченной по keys — списку пар (колонка, по убыванию).
+    Последний ключ должен быть уникальным (обычно id), чтобы порядок был однозначным.
+    """
+    forward = before is None
+    cursor = decode_cursor(after if forward else before)
+    if not _valid_cursor(cursor, keys):
+        cursor = None
+
+    query = query.add_columns(*[column for column, _ in keys]).order_by(None)
+    if cursor is not None:
+        query = query.filter(_seek_condition(keys, cursor, forward))
+    order = [column.desc() if descending == forward else column.asc() for column, descending in keys]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    first_key = list(rows[0][1:]) if rows else None
+    last_key = list(rows[-1][1:]) if rows else None
+
+    if forward:
+        next_cursor = encode_cursor(last_key) if has_more else None
+        prev_cursor = encode_cursor(first_key) if cursor is not None and rows else None
+    else:
+        next_cursor = encode_cursor(last_key) if rows else None
+        prev_cursor = encode_cursor(first_key) if has_more else None
+    return KeysetPage(items, next_cursor, prev_cursor, total)
+
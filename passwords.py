@@ -0,0 +1,153 @@
+"""
+ResaleX - Хэширование паролей
+Алгоритм и стоимость задаются PASSWORD_HASH_METHOD в формате werkzeug: scrypt:N:r:p,
+pbkdf2:sha256:итерации или bcrypt:раунды. Проверка понимает хэши любого из алгоритмов,
+поэтому после смены настройки старые пароли продолжают работать, а needs_rehash()
+подсказывает пересчитать хэш при следующем входе.
+Хэширование намеренно дорогое, поэтому идет в ограниченном пуле потоков (hashlib и bcrypt
+отпускают GIL): одновременно считается не больше PASSWORD_HASH_WORKERS хэшей на процесс,
+а запросы сверх очереди быстро получают PasswordHasherBusy вместо того, чтобы занимать CPU.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+# Параметры scrypt по умолчанию у werkzeug: N, r, p
+DEFAULT_SCRYPT = (32768, 8, 1)
+DEFAULT_BCRYPT_ROUNDS = 12
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+WERKZEUG_PREFIXES = ('scrypt:', 'pbkdf2:')
+
+
+class PasswordHasherBusy(Exception):
+    """Все воркеры хэширования заняты и очередь полна: запрос стоит повторить позже"""
+
+
+def normalize_method(method):
+    """Полная строка метода с параметрами по умолчанию, как ее записывает werkzeug в хэш"""
+    name, _, params = (method or 'scrypt').partition(':')
+    if name == 'scrypt':
+        # werkzeug записывает в хэш все три параметра: scrypt:16384 становится scrypt:16384:8:1
+        parts = [int(part) for part in params.split(':')] if params else []
+        if len(parts) > 3:
+            raise ValueError(f'scrypt: ожидается scrypt:N:r:p, получено {method!r}')
+        return 'scrypt:' + ':'.join(str(part) for part in parts + list(DEFAULT_SCRYPT[len(parts):]))
+    if name == 'pbkdf2':
+        parts = params.split(':') if params else []
+        hash_name = parts[0] if parts else 'sha256'
+        iterations = int(parts[1]) if len(parts) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    if name == 'bcrypt':
+        rounds = int(params) if params else DEFAULT_BCRYPT_ROUNDS
+        if not 4 <= rounds <= 31:
+            raise ValueError(f'bcrypt: число раундов от 4 до 31, получено {rounds}')
+        return f'bcrypt:{rounds}'
+    raise ValueError(f'Неизвестный алгоритм хэширования паролей: {method!r} (scrypt, pbkdf2 или bcrypt)')
+
+
+def is_password_hash(value):
+    """Похоже ли значение на хэш, который умеет проверять PasswordHasher"""
+    return bool(value) and value.startswith(WERKZEUG_PREFIXES + BCRYPT_PREFIXES)
+
+
+def _bcrypt_hash(password, rounds):
+    # bcrypt нужен только при выбранном bcrypt или старых bcrypt-хэшах
+    import bcrypt
+    # bcrypt учитывает только первые 72 байта пароля
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('ascii')
+
+
+def _bcrypt_check(password_hash, password):
+    import bcrypt
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('ascii'))
+    except ValueError:
+        return False
+
+
+class PasswordHasher:
+    """Хэширование и проверка паролей в пуле потоков с ограниченной очередью"""
+
+    def __init__(self, method='scrypt', workers=2, queue=16, wait=2.0):
+        self.method = normalize_method(method)
+        self.workers = max(1, workers)
+        self.wait = wait
+        # Слоты на выполняемые и ожидающие задачи: остальные ждут не дольше wait и получают отказ
+        self._slots = threading.BoundedSemaphore(self.workers + max(0, queue))
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._dummy_hash = None
+
+    def _executor(self):
+        # Пул создается при первом хэше и заново после fork: потоки родителя в дочерний процесс не переходят
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(timeout=self.wait):
+            raise PasswordHasherBusy()
+        try:
+            return self._executor().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def _hash(self, password):
+        if self.method.startswith('bcrypt:'):
+            return _bcrypt_hash(password, int(self.method.split(':')[1]))
+        return generate_password_hash(password, self.method)
+
+    def _check(self, password_hash, password):
+        known = is_password_hash(password_hash)
+        if not known:
+            # Нет пользователя или пароль не задан: проверка против подставного хэша,
+            # чтобы по времени ответа нельзя было узнать, есть ли такой аккаунт
+            if self._dummy_hash is None:
+                self._dummy_hash = self._hash('')
+            password_hash = self._dummy_hash
+        if password_hash.startswith(BCRYPT_PREFIXES):
+            matches = _bcrypt_check(password_hash, password)
+        else:
+            matches = check_password_hash(password_hash, password)
+        return known and matches
+
+    def hash(self, password):
+        return self._run(self._hash, password)
+
+    def verify(self, password_hash, password):
+        """Пароль совпадает с хэшем любого поддерживаемого алгоритма; None — всегда False"""
+        return self._run(self._check, password_hash, password)
+
+    def hash_many(self, passwords):
+        """Хэши пачки паролей (массовый импорт): все воркеры пула, без лимита очереди"""
+        return list(self._executor().map(self._hash, passwords))
+
+    def needs_rehash(self, password_hash):
+        """Хэш посчитан другим алгоритмом или с другой стоимостью, чем в настройках"""
+        if not is_password_hash(password_hash):
+            return False
+        if self.method.startswith('bcrypt:'):
+            return not (password_hash.startswith(BCRYPT_PREFIXES) and
+                        password_hash[4:6] == f'{int(self.method.split(":")[1]):02d}')
+        if password_hash.startswith(BCRYPT_PREFIXES):
+            return True
+        prefix = password_hash.split('$', 1)[0]
+        # Пустой или неизвестный префикс не подменяется методом по умолчанию: такой хэш пересчитывается
+        if not prefix.startswith(WERKZEUG_PREFIXES):
+            return True
+        try:
+            return normalize_method(prefix) != self.method
+        except ValueError:
+            return True
+
+
+def get_password_hasher(config):
+    return PasswordHasher(config['PASSWORD_HASH_METHOD'], config['PASSWORD_HASH_WORKERS'],
+                          config['PASSWORD_HASH_QUEUE'], config['PASSWORD_HASH_WAIT_SECONDS'])
@@ -0,0 +1,157 @@
+"""
+ResaleX - Платежные шлюзы
+Намерение оплаты создается фоновой задачей, а заказ становится оплаченным по вебхуку шлюза.
+StripeGateway работает с Stripe с ограниченным таймаутом и повторами сетевых ошибок.
+FakeGateway ничего не вызывает по сети: он выдает намерения и подписывает события тем же
+способом, что Stripe, поэтому весь сценарий оплаты можно прогнать и нагрузить офлайн.
+"""
+
+import hashlib
+import hmac
+import itertools
+import json
+import secrets
+import time
+
+
+class PaymentError(Exception):
+    """Шлюз не смог выполнить операцию; задача повторит попытку"""
+
+
+class WebhookError(ValueError):
+    """Подпись вебхука не прошла проверку или тело не разбирается"""
+
+
+class PaymentIntent:
+    """Намерение оплаты: id у шлюза и секрет для формы оплаты на клиенте"""
+
+    def __init__(self, id, client_secret, status='requires_payment_method'):
+        self.id = id
+        self.client_secret = client_secret
+        self.status = status
+
+
+class PaymentEvent:
+    """Событие вебхука: id для идемпотентности, тип и объект намерения"""
+
+    def __init__(self, id, type, object):
+        self.id = id
+        self.type = type
+        self.object = object
+
+
+def _signature(secret, timestamp, payload):
+    signed = f'{timestamp}.'.encode() + payload
+    return hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+
+
+class StripeGateway:
+    """Stripe: таймаут на запрос и повторы сетевых ошибок с одним ключом идемпотентности"""
+
+    def __init__(self, secret_key, webhook_secret, timeout=10, max_retries=2):
+        # stripe нужен только при работе с настоящим шлюзом, поэтому импортируется здесь
+        import stripe
+        self.stripe = stripe
+        self.secret_key = secret_key
+        self.webhook_secret = webhook_secret
+        stripe.api_key = secret_key
+        stripe.max_network_retries = max_retries
+        stripe.default_http_client = stripe.http_client.new_default_http_client(timeout=timeout)
+
+    def create_intent(self, amount, currency, order_id, idempotency_key):
+        try:
+            intent = self.stripe.PaymentIntent.create(
+                amount=amount,
+                currency=currency,
+                metadata={'order_id': order_id},
+                idempotency_key=idempotency_key,
+            )
+        except self.stripe.error.StripeError as exc:
+            raise PaymentError(str(exc)) from exc
+        return PaymentIntent(intent.id, intent.client_secret, intent.status)
+
+    def cancel_intent(self, intent_id):
+        try:
+            self.stripe.PaymentIntent.cancel(intent_id)
+        except self.stripe.error.InvalidRequestError as exc:
+            # Повторная отмена уже отмененного намерения — не ошибка
+            if self.stripe.PaymentIntent.retrieve(intent_id).status != 'canceled':
+                raise PaymentError(str(exc)) from exc
+        except self.stripe.error.StripeError as exc:
+            raise PaymentError(str(exc)) from exc
+
+    def parse_event(self, payload, signature_header):
+        try:
+            event = self.stripe.Webhook.construct_event(payload, signature_header, self.webhook_secret)
+        except (ValueError, self.stripe.error.SignatureVerificationError) as exc:
+            raise WebhookError(str(exc)) from exc
+        return PaymentEvent(event['id'], event['type'], event['data']['object'])
+
+
+class FakeGateway:
+    """Локальный шлюз для разработки и нагрузочных тестов; формат подписи как у Stripe"""
+
+    def __init__(self, webhook_secret='whsec_fake', tolerance=300):
+        self.webhook_secret = webhook_secret
+        self.tolerance = tolerance
+        self._ids = itertools.count(1)
+        self.intents = {}
+        self.succeeded = set()
+        self.canceled = set()
+
+    def create_intent(self, amount, currency, order_id, idempotency_key):
+        # Повтор с тем же ключом возвращает то же намерение, как у Stripe
+        if idempotency_key not in self.intents:
+            intent_id = f'pi_fake_{next(self._ids)}'
+            self.intents[idempotency_key] = {
+                'id': intent_id, 'amount': amount, 'currency': currency,
+                'metadata': {'order_id': str(order_id)},
+                'client_secret': f'{intent_id}_secret_{secrets.token_hex(8)}',
+            }
+        intent = self.intents[idempotency_key]
+        return PaymentIntent(intent['id'], intent['client_secret'])
+
+    def cancel_intent(self, intent_id):
+        if intent_id in self.succeeded:
+            raise PaymentError(f'Намерение {intent_id} уже оплачено')
+        self.canceled.add(intent_id)
+
+    def event_payload(self, event_type, intent_id, order_id, event_id=None):
+        """Тело вебхука о намерении в формате Stripe; событие succeeded означает, что платеж прошел"""
+        if event_type == 'payment_intent.succeeded':
+            self.succeeded.add(intent_id)
+        return json.dumps({
+            'id': event_id or f'evt_fake_{secrets.token_hex(8)}',
+            'type': event_type,
+            'data': {'object': {'id': intent_id, 'object': 'payment_intent',
+                                'metadata': {'order_id': str(order_id)}}},
+        }).encode()
+
+    def sign(self, payload, timestamp=None):
+        """Заголовок Stripe-Signature для тела вебхука"""
+        timestamp = int(timestamp or time.time())
+        return f't={timestamp},v1={_signature(self.webhook_secret, timestamp, payload)}'
+
+    def parse_event(self, payload, signature_header):
+        try:
+            fields = dict(item.split('=', 1) for item in (signature_header or '').split(','))
+            timestamp = int(fields['t'])
+        except (ValueError, KeyError) as exc:
+            raise WebhookError('Некорректный заголовок подписи') from exc
+        if abs(time.time() - timestamp) > self.tolerance:
+            raise WebhookError('Подпись устарела')
+        if not hmac.compare_digest(fields.get('v1', ''), _signature(self.webhook_secret, timestamp, payload)):
+            raise WebhookError('Подпись не совпадает')
+        try:
+            event = json.loads(payload)
+            return PaymentEvent(event['id'], event['type'], event['data']['object'])
+        except (ValueError, KeyError) as exc:
+            raise WebhookError('Некорректное тело вебхука') from exc
+
+
+def get_payment_gateway(config):
+    """Выбирает шлюз по PAYMENT_GATEWAY: stripe (по умолчанию) или fake"""
+    if config['PAYMENT_GATEWAY'] == 'fake':
+        return FakeGateway(config['STRIPE_WEBHOOK_SECRET'])
+    return StripeGateway(config['STRIPE_SECRET_KEY'], config['STRIPE_WEBHOOK_SECRET'],
+                         timeout=config['PAYMENT_TIMEOUT'], max_retries=config['PAYMENT_MAX_RETRIES'])
@@ -0,0 +1,76 @@
+"""
+ResaleX - Ограничение частоты запросов
+Счетчики с фиксированным окном: hit(key, window) прибавляет попытку и возвращает их число
+в текущем окне и секунды до его конца. По умолчанию счетчики в памяти процесса;
+RATE_LIMIT_URL=redis://... делает их общими для всех процессов и серверов.
+"""
+
+import threading
+import time
+
+
+class MemoryRateLimiter:
+    """Счетчики в памяти процесса; истекшие окна удаляются, когда ключей становится много"""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, window, amount=1):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or entry[0] <= now:
+                if len(self._windows) >= self.max_keys:
+                    self._purge(now)
+                entry = self._windows[key] = [now + window, 0]
+            entry[1] += amount
+            return entry[1], max(0, entry[0] - now)
+
+    def reset(self, key):
+        with self._lock:
+            self._windows.pop(key, None)
+
+    def _purge(self, now):
+        for key in [key for key, (expires_at, _) in self._windows.items() if expires_at <= now]:
+            del self._windows[key]
+        # Если все окна еще живы, уступаем место самым старым, а не растем без предела
+        while len(self._windows) >= self.max_keys:
+            del self._windows[next(iter(self._windows))]
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+
+class RedisRateLimiter:
+    """Общие счетчики в Redis: INCRBY и EXPIRE NX одной транзакцией"""
+
+    def __init__(self, url, prefix='resalex:ratelimit:'):
+        # redis нужен только при общих счетчиках, поэтому импортируется здесь
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def hit(self, key, window, amount=1):
+        pipeline = self.client.pipeline()
+        pipeline.incrby(self.prefix + key, amount)
+        pipeline.expire(self.prefix + key, int(window), nx=True)
+        pipeline.ttl(self.prefix + key)
+        count, _, ttl = pipeline.execute()
+        return count, max(0, ttl)
+
+    def reset(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+def get_rate_limiter(url=None):
+    """Выбирает хранилище счетчиков по RATE_LIMIT_URL: redis:// и rediss:// — Redis, иначе память процесса"""
+    if url and url.startswith(('redis://', 'rediss://')):
+        return RedisRateLimiter(url)
+    return MemoryRateLimiter()
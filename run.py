@@ -1,23 +1,27 @@
 #!/usr/bin/env python3
 """
 ResaleX - Premium Marketplace
-Запуск приложения
+Запуск приложения (сервер разработки); в продакшене — gunicorn -c gunicorn.conf.py wsgi:app
+python run.py init — только миграции и root пользователь (release-шаг деплоя)
 """
 
 import os
 import sys
-from app import app, db
+from flask_migrate import upgrade
+from app import create_app
+from extensions import db
+from models import User
+
+app = create_app()
 
 def create_tables():
-    """Создает таблицы базы данных"""
+    """Создает таблицы базы данных и применяет миграции"""
     with app.app_context():
-        db.create_all()
+        upgrade()
         print("✅ Таблицы базы данных созданы")
 
 def create_root_user():
     """Создает root пользователя если его нет"""
-    from app import User
-    
     with app.app_context():
         if not User.query.filter_by(username='root').first():
             root_user = User(
@@ -49,6 +53,9 @@ def main():
     # Создаем root пользователя
     create_root_user()
     
+    if sys.argv[1:] == ['init']:
+        return
+    
     print("\n🌐 Приложение запущено!")
     print("📍 URL: http://localhost:8000")
     print("\nНажмите Ctrl+C для остановки")
@@ -56,6 +63,14 @@ def main():
     # Запускаем приложение
     port = int(os.environ.get('PORT', 8000))
     debug = os.environ.get('FLASK_ENV') == 'development'
+    if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        # Фоновые задачи (варианты изображений, платежи, снятие брони) выполняются здесь же,
+        # иначе без отдельного worker они бы молча копились; gunicorn запускают вместе с flask jobs-worker.
+        # При перезагрузчике (debug) пул живет в родительском процессе и не дублируется
+        from models import job_queue
+        from jobs import WorkerPool
+        WorkerPool(app, job_queue, processes=app.config['JOB_WORKERS']).start(daemon=True)
+        print(f"⚙️  Фоновые задачи: {app.config['JOB_WORKERS']} процесса(ов)")
     app.run(debug=debug, host='0.0.0.0', port=port)
 
 if __name__ == '__main__':
@@ -0,0 +1,183 @@
+"""
+ResaleX - Полнотекстовый поиск по каталогу
+Бэкенд выбирается по SQLALCHEMY_DATABASE_URI: FTS5 для SQLite, tsvector + GIN для Postgres.
+search() возвращает отфильтрованный запрос и колонку rank: чем она меньше, тем релевантнее товар.
+В индексе лежат только одобренные товары, поэтому его синхронизируют при каждой смене
+содержимого или статуса товара.
+"""
+
+import re
+
+from sqlalchemy import select, text, literal_column, func, bindparam
+
+# Веса полей при ранжировании: название важнее бренда, бренд важнее описания
+NAME_WEIGHT, BRAND_WEIGHT, DESCRIPTION_WEIGHT = 10.0, 5.0, 1.0
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Таблицы индекса создаются миграцией 0003 и не описаны моделями
+SEARCH_TABLES = ('product_fts', 'product_search')
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Не дает autogenerate удалять таблицы поискового индекса (включая служебные таблицы FTS5)"""
+    return not (type_ == 'table' and name.startswith(SEARCH_TABLES))
+
+
+def tokenize(term):
+    """Разбивает поисковую строку на слова, отбрасывая операторы и кавычки"""
+    return _TOKEN_RE.findall(term.lower())[:10]
+
+
+class LikeSearchBackend:
+    """Запасной вариант для СУБД без полнотекстового поиска: LIKE по всем полям"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def search(self, query, term, model):
+        for token in tokenize(term):
+            query = query.filter(model.name.contains(token) |
+                                 model.brand.contains(token) |
+                                 model.description.contains(token))
+        return query, None
+
+    def sync_product(self, product):
+        pass
+
+    def remove_product(self, product_id):
+        pass
+
+    def sync_products(self, product_ids):
+        return 0
+
+    def rebuild(self):
+        return 0
+
+
+class SQLiteSearchBackend:
+    """FTS5-таблица product_fts, rowid совпадает с product.id, ранжирование по BM25"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _match_expression(self, term):
+        # Каждое слово ищется как префикс: "jord"* найдет Jordan
+        return ' '.join(f'"{token}"*' for token in tokenize(term))
+
+    def search(self, query, term, model):
+        expression = self._match_expression(term)
+        if not expression:
+            return query, None
+        matches = select(
+            literal_column('rowid').label('product_id'),
+            literal_column(f'bm25(product_fts, {NAME_WEIGHT}, {BRAND_WEIGHT}, {DESCRIPTION_WEIGHT})').label('rank')
+        ).select_from(text('product_fts')).where(
+            text('product_fts MATCH :match').bindparams(match=expression)
+        ).subquery()
+        # bm25 возвращает отрицательные значения: чем меньше, тем релевантнее
+        return query.join(matches, model.id == matches.c.product_id), matches.c.rank
+
+    def sync_product(self, product):
+        self.remove_product(product.id)
+        if product.status == 'approved':
+            self.db.session.execute(
+                text('INSERT INTO product_fts (rowid, name, brand, description) '
+                     'VALUES (:id, :name, :brand, :description)'),
+                {'id': product.id, 'name': product.name or '', 'brand': product.brand or '',
+                 'description': product.description or ''}
+            )
+
+    def remove_product(self, product_id):
+        self.db.session.execute(text('DELETE FROM product_fts WHERE rowid = :id'), {'id': product_id})
+
+    def sync_products(self, product_ids):
+        """Переиндексирует пачку товаров двумя запросами (массовый импорт)"""
+        ids = bindparam('ids', expanding=True)
+        self.db.session.execute(text('DELETE FROM product_fts WHERE rowid IN :ids').bindparams(ids),
+                                {'ids': list(product_ids)})
+        result = self.db.session.execute(text(
+            "INSERT INTO product_fts (rowid, name, brand, description) "
+            "SELECT id, coalesce(name, ''), coalesce(brand, ''), coalesce(description, '') "
+            "FROM product WHERE status = 'approved' AND id IN :ids"
+        ).bindparams(ids), {'ids': list(product_ids)})
+        return result.rowcount
+
+    def rebuild(self):
+        self.db.session.execute(text('DELETE FROM product_fts'))
+        result = self.db.session.execute(text(
+            "INSERT INTO product_fts (rowid, name, brand, description) "
+            "SELECT id, coalesce(name, ''), coalesce(brand, ''), coalesce(description, '') "
+            "FROM product WHERE status = 'approved'"
+        ))
+        return result.rowcount
+
+
+class PostgresSearchBackend:
+    """Таблица product_search с колонкой tsvector под GIN-индексом, ранжирование по ts_rank"""
+
+    DOCUMENT = ("setweight(to_tsvector('simple', coalesce({name}, '')), 'A') || "
+                "setweight(to_tsvector('simple', coalesce({brand}, '')), 'B') || "
+                "setweight(to_tsvector('simple', coalesce({description}, '')), 'C')")
+
+    def __init__(self, db):
+        self.db = db
+
+    def search(self, query, term, model):
+        tokens = tokenize(term)
+        if not tokens:
+            return query, None
+        # Каждое слово ищется как префикс: jord:* найдет Jordan
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        document = literal_column('document')
+        ts_query = func.to_tsquery('simple', tsquery)
+        matches = select(
+            literal_column('product_id'),
+            (-func.ts_rank(document, ts_query)).label('rank')
+        ).select_from(text('product_search')).where(document.op('@@')(ts_query)).subquery()
+        return query.join(matches, model.id == matches.c.product_id), matches.c.rank
+
+    def sync_product(self, product):
+        if product.status != 'approved':
+            self.remove_product(product.id)
+            return
+        document = self.DOCUMENT.format(name=':name', brand=':brand', description=':description')
+        self.db.session.execute(
+            text(f'INSERT INTO product_search (product_id, document) VALUES (:id, {document}) '
+                 'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document'),
+            {'id': product.id, 'name': product.name, 'brand': product.brand,
+             'description': product.description}
+        )
+
+    def remove_product(self, product_id):
+        self.db.session.execute(text('DELETE FROM product_search WHERE product_id = :id'), {'id': product_id})
+
+    def sync_products(self, product_ids):
+        """Переиндексирует пачку товаров двумя запросами (массовый импорт)"""
+        ids = bindparam('ids', expanding=True)
+        self.db.session.execute(text('DELETE FROM product_search WHERE product_id IN :ids').bindparams(ids),
+                                {'ids': list(product_ids)})
+        document = self.DOCUMENT.format(name='name', brand='brand', description='description')
+        result = self.db.session.execute(text(
+            f"INSERT INTO product_search (product_id, document) "
+            f"SELECT id, {document} FROM product WHERE status = 'approved' AND id IN :ids"
+        ).bindparams(ids), {'ids': list(product_ids)})
+        return result.rowcount
+
+    def rebuild(self):
+        self.db.session.execute(text('DELETE FROM product_search'))
+        document = self.DOCUMENT.format(name='name', brand='brand', description='description')
+        result = self.db.session.execute(text(
+            f"INSERT INTO product_search (product_id, document) "
+            f"SELECT id, {document} FROM product WHERE status = 'approved'"
+        ))
+        return result.rowcount
+
+
+def get_search_backend(db, database_uri):
+    """Выбирает бэкенд поиска по строке подключения к базе"""
+    if database_uri.startswith('sqlite'):
+        return SQLiteSearchBackend(db)
+    if database_uri.startswith(('postgres', 'postgresql')):
+        return PostgresSearchBackend(db)
+    return LikeSearchBackend(db)
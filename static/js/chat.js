@@ -0,0 +1,177 @@
+// ResaleX - чат заказа: новые сообщения приходят через SSE, отправка без перезагрузки страницы
+
+(function () {
+    const container = document.getElementById('chatMessages');
+    if (!container) {
+        return;
+    }
+
+    const orderId = container.dataset.orderId;
+    const userId = Number(container.dataset.userId);
+    const apiUrl = `/api/chat/${orderId}`;
+    const form = document.getElementById('chatForm');
+    const ids = Array.from(container.querySelectorAll('[data-message-id]'), el => Number(el.dataset.messageId));
+    const shown = new Set(ids);
+    let lastId = ids.length ? Math.max(...ids) : 0;
+    let firstId = ids.length ? Math.min(...ids) : null;
+    let pollTimer = null;
+
+    function escapeHtml(value) {
+        return String(value ?? '').replace(/[&<>"']/g, ch => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[ch]);
+    }
+
+    // Та же разметка, что у сообщений в шаблоне chat.html
+    function renderMessage(message) {
+        const own = message.sender_id === userId;
+        const mark = own ? `<i class="fas fa-check${message.is_read ? '-double' : ''} ms-1" data-read-mark></i>` : '';
+        return `<div class="message mb-3 ${own ? 'text-end' : ''}" data-message-id="${message.id}">
+            <div class="d-flex ${own ? 'justify-content-end' : 'justify-content-start'}">
+                <div class="message-bubble ${own ? 'bg-primary text-white' : 'bg-light text-dark'}"
+                     style="max-width: 70%; padding: 10px 15px; border-radius: 18px; word-wrap: break-word;">
+                    <div class="message-text">${escapeHtml(message.message)}</div>
+                    <small class="message-time d-block mt-1" style="opacity: 0.7;">
+                        ${message.created_at.slice(11, 16)} ${mark}
+                    </small>
+                </div>
+            </div>
+        </div>`;
+    }
+
+    function scrollToBottom() {
+        container.scrollTop = container.scrollHeight;
+    }
+
+    // Добавляет сообщения в конец; уже показанные (например, пришедшие и по SSE, и в ответе API) пропускаются
+    function appendMessages(messages) {
+        const fresh = messages.filter(message => !shown.has(message.id));
+        if (!fresh.length) {
+            return;
+        }
+        fresh.forEach(message => shown.add(message.id));
+        const empty = document.getElementById('chatEmpty');
+        if (empty) {
+            empty.remove();
+        }
+        const atBottom = container.scrollHeight - container.scrollTop - container.clientHeight < 50;
+        container.insertAdjacentHTML('beforeend', fresh.map(renderMessage).join(''));
+        lastId = Math.max(lastId, ...fresh.map(message => message.id));
+        if (firstId === null) {
+            firstId = fresh[0].id;
+        }
+        if (atBottom || fresh.some(message => message.sender_id === userId)) {
+            scrollToBottom();
+        }
+        if (fresh.some(message => message.receiver_id === userId)) {
+            markRead(lastId);
+        }
+    }
+
+    function markRead(upTo) {
+        fetch(`${apiUrl}/read`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({up_to: upTo})
+        }).catch(error => console.log('Ошибка отметки прочтения:', error));
+    }
+
+    function showRead(event) {
+        if (event.reader_id === userId) {
+            return;
+        }
+        container.querySelectorAll('[data-read-mark]').forEach(mark => {
+            const id = Number(mark.closest('[data-message-id]').dataset.messageId);
+            if (id <= event.up_to) {
+                mark.classList.replace('fa-check', 'fa-check-double');
+            }
+        });
+    }
+
+    // Догружает все сообщения после lastId; используется при (пере)подключении и в режиме опроса
+    function fetchNew() {
+        return fetch(`${apiUrl}?since=${lastId}`)
+            .then(response => response.json())
+            .then(data => {
+                appendMessages(data.messages);
+                if (data.has_more) {
+                    return fetchNew();
+                }
+            })
+            .catch(error => console.log('Ошибка загрузки сообщений:', error));
+    }
+
+    function startPolling() {
+        if (!pollTimer) {
+            pollTimer = setInterval(fetchNew, 5000);
+        }
+    }
+
+    function connect() {
+        if (!window.EventSource) {
+            startPolling();
+            return;
+        }
+        const source = new EventSource(`${apiUrl}/stream`);
+        // Подписка уже оформлена, когда поток открыт: догружаем то, что пришло до нее
+        source.onopen = fetchNew;
+        source.addEventListener('message', event => appendMessages([JSON.parse(event.data)]));
+        source.addEventListener('read', event => showRead(JSON.parse(event.data)));
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED) {
+                startPolling();
+            }
+        };
+    }
+
+    form.addEventListener('submit', event => {
+        event.preventDefault();
+        const input = form.elements.message;
+        const text = input.value.trim();
+        if (!text) {
+            return;
+        }
+        input.disabled = true;
+        fetch(apiUrl, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({message: text})
+        })
+            .then(response => response.json())
+            .then(message => {
+                if (message.id) {
+                    input.value = '';
+                    appendMessages([message]);
+                }
+            })
+            .catch(error => console.log('Ошибка отправки сообщения:', error))
+            .finally(() => {
+                input.disabled = false;
+                input.focus();
+            });
+    });
+
+    const older = document.getElementById('chatOlder');
+    if (older) {
+        older.querySelector('button').addEventListener('click', () => {
+            fetch(`${apiUrl}?before=${firstId}`)
+                .then(response => response.json())
+                .then(data => {
+                    const height = container.scrollHeight;
+                    data.messages.forEach(message => shown.add(message.id));
+                    older.insertAdjacentHTML('afterend', data.messages.map(renderMessage).join(''));
+                    if (data.messages.length) {
+                        firstId = data.messages[0].id;
+                    }
+                    if (!data.has_more) {
+                        older.remove();
+                    }
+                    container.scrollTop += container.scrollHeight - height;
+                })
+                .catch(error => console.log('Ошибка загрузки сообщений:', error));
+        });
+    }
+
+    scrollToBottom();
+    connect();
+})();
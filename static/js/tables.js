@@ -0,0 +1,103 @@
+// ResaleX - таблицы дашбордов с серверной пагинацией, сортировкой и фильтрами
+
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, ch => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[ch]);
+}
+
+function formatDate(isoString) {
+    return new Date(isoString).toLocaleDateString('ru-RU');
+}
+
+function formatPrice(value) {
+    return `${Math.round(value)} ₽`;
+}
+
+/*
+ * Таблица, которая грузит строки страницами из JSON API.
+ * Разметка: <div data-table> с формой [data-table-filters], <table> с
+ * <th data-sort="..."> в заголовке, <tbody> и кнопками [data-page="prev|next"].
+ */
+class DataTable {
+    constructor(root, options) {
+        this.root = root;
+        this.url = options.url;
+        this.renderRow = options.renderRow;
+        this.columns = options.columns;
+        this.emptyText = options.emptyText || 'Ничего не найдено';
+        this.params = Object.assign({}, options.params || {});
+        this.cursor = {};
+        this.tbody = root.querySelector('tbody');
+        this.pager = {
+            prev: root.querySelector('[data-page="prev"]'),
+            next: root.querySelector('[data-page="next"]')
+        };
+
+        const filters = root.querySelector('[data-table-filters]');
+        if (filters) {
+            filters.addEventListener('submit', event => {
+                event.preventDefault();
+                this.applyFilters(new FormData(filters));
+            });
+            filters.addEventListener('change', () => this.applyFilters(new FormData(filters)));
+        }
+
+        root.querySelectorAll('th[data-sort]').forEach(th => {
+            th.style.cursor = 'pointer';
+            th.addEventListener('click', () => this.sortBy(th.dataset.sort));
+        });
+
+        this.pager.prev.addEventListener('click', () => this.load({before: this.prevCursor}));
+        this.pager.next.addEventListener('click', () => this.load({after: this.nextCursor}));
+    }
+
+    applyFilters(formData) {
+        for (const [key, value] of formData.entries()) {
+            this.params[key] = value;
+        }
+        this.load();
+    }
+
+    sortBy(column) {
+        const direction = this.params.sort === column && this.params.direction !== 'asc' ? 'asc' : 'desc';
+        this.params.sort = column;
+        this.params.direction = direction;
+        this.load();
+    }
+
+    load(cursor = {}) {
+        const query = new URLSearchParams();
+        Object.entries(Object.assign({}, this.params, cursor)).forEach(([key, value]) => {
+            if (value) {
+                query.set(key, value);
+            }
+        });
+
+        return fetch(`${this.url}?${query}`)
+            .then(response => response.json())
+            .then(data => {
+                this.prevCursor = data.prev;
+                this.nextCursor = data.next;
+                this.pager.prev.disabled = !data.prev;
+                this.pager.next.disabled = !data.next;
+                this.tbody.innerHTML = data.items.length
+                    ? data.items.map(this.renderRow).join('')
+                    : `<tr><td colspan="${this.columns}" class="text-center py-4" style="color: var(--text-muted);">${escapeHtml(this.emptyText)}</td></tr>`;
+            })
+            .catch(error => console.log('Ошибка загрузки таблицы:', error));
+    }
+}
+
+// Общее модальное окно смены статуса заказа: заполняется из строки таблицы
+function openOrderModal(button) {
+    const modal = document.getElementById('orderModal');
+    const form = modal.querySelector('form');
+    form.action = button.dataset.statusUrl;
+    modal.querySelector('[data-order-id]').textContent = button.dataset.orderId;
+    form.elements.status.value = button.dataset.status;
+    form.elements.tracking_number.value = button.dataset.tracking || '';
+    bootstrap.Modal.getOrCreateInstance(modal).show();
+}
+
+window.ResaleXTables = { DataTable, escapeHtml, formatDate, formatPrice, openOrderModal };
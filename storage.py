@@ -0,0 +1,158 @@
+"""
+ResaleX - Хранилище загруженных файлов
+Файлы (blob) называются по SHA-256 содержимого, поэтому одинаковые загрузки хранятся один раз,
+а записи с тем же именем никогда не меняют содержимое. Запись идет потоково, кусками CHUNK_SIZE.
+Бэкенды: локальная папка (по умолчанию) и S3-совместимое хранилище (STORAGE_URL=s3://...).
+MemoryS3Client реализует нужную часть API S3 в памяти и подходит для разработки и тестов.
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from urllib.parse import urlparse, parse_qs
+
+CHUNK_SIZE = 64 * 1024
+# Файлы до этого размера хэшируются в памяти, крупнее — во временном файле на диске
+SPOOL_SIZE = 1024 * 1024
+
+
+def hash_stream(stream, chunk_size=CHUNK_SIZE):
+    """
+    Читает поток кусками, одновременно считая SHA-256 и копируя во временный файл.
+    Возвращает (hex-дайджест, файл, перемотанный в начало); весь поток в памяти не держится.
+    """
+    digest = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        spool.write(chunk)
+    spool.seek(0)
+    return digest.hexdigest(), spool
+
+
+class LocalStorage:
+    """Файлы в локальной папке; url_prefix — откуда их отдает веб-сервер"""
+
+    def __init__(self, root, url_prefix=''):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name):
+        if os.path.basename(name) != name:
+            raise ValueError(f'Недопустимое имя файла: {name!r}')
+        return os.path.join(self.root, name)
+
+    def put(self, name, stream, content_type=None, cache_control=None):
+        path = self._path(name)
+        # Пишем во временный файл и переименовываем, чтобы никто не прочитал половину файла
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as out:
+            shutil.copyfileobj(stream, out, CHUNK_SIZE)
+        os.replace(tmp_path, path)
+
+    def open(self, name):
+        return open(self._path(name), 'rb')
+
+    def exists(self, name):
+        return os.path.exists(self._path(name))
+
+    def delete(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def url(self, name):
+        return f'{self.url_prefix}/{name}'
+
+
+class S3Storage:
+    """
+    S3-совместимое хранилище (AWS S3, MinIO, Yandex Object Storage и т.п.).
+    client — boto3-клиент s3 или любой объект с теми же методами, например MemoryS3Client.
+    """
+
+    def __init__(self, client, bucket, prefix='', url_prefix=''):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.url_prefix = url_prefix.rstrip('/')
+
+    def _key(self, name):
+        return self.prefix + name
+
+    def put(self, name, stream, content_type=None, cache_control=None):
+        extra = {}
+        if content_type:
+            extra['ContentType'] = content_type
+        if cache_control:
+            extra['CacheControl'] = cache_control
+        # upload_fileobj читает поток частями и сам переходит на multipart для больших файлов
+        self.client.upload_fileobj(stream, self.bucket, self._key(name), ExtraArgs=extra)
+
+    def open(self, name):
+        body = self.client.get_object(Bucket=self.bucket, Key=self._key(name))['Body']
+        # Pillow нужен seekable-файл, а тело ответа S3 читается только вперед
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        shutil.copyfileobj(body, spool, CHUNK_SIZE)
+        spool.seek(0)
+        return spool
+
+    def exists(self, name):
+        # list_objects_v2 вместо head_object: отсутствие объекта — не исключение botocore
+        key = self._key(name)
+        response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=key, MaxKeys=1)
+        return any(item['Key'] == key for item in response.get('Contents', ()))
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+    def url(self, name):
+        return f'{self.url_prefix}/{self._key(name)}'
+
+
+class MemoryS3Client:
+    """Заглушка клиента S3 в памяти: те методы boto3, которыми пользуется S3Storage"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, stream, bucket, key, ExtraArgs=None):
+        body = b''.join(iter(lambda: stream.read(CHUNK_SIZE), b''))
+        self.objects[(bucket, key)] = (body, dict(ExtraArgs or {}))
+
+    def get_object(self, Bucket, Key):
+        body, extra = self.objects[(Bucket, Key)]
+        return {'Body': io.BytesIO(body), 'ContentLength': len(body), **extra}
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000):
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        return {'Contents': [{'Key': key, 'Size': len(self.objects[(Bucket, key)][0])} for key in keys[:MaxKeys]]}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+def get_storage(url, root=None, url_prefix=''):
+    """
+    Выбирает бэкенд по адресу: s3://bucket/prefix?endpoint_url=... — S3 через boto3,
+    memory-s3://bucket/prefix — S3-заглушка в памяти, пусто — локальная папка root.
+    """
+    if not url:
+        return LocalStorage(root, url_prefix)
+    parsed = urlparse(url)
+    if parsed.scheme == 's3':
+        # boto3 нужен только при хранении в S3, поэтому импортируется здесь
+        import boto3
+        options = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+        client = boto3.client('s3', endpoint_url=options.get('endpoint_url'), region_name=options.get('region'))
+        return S3Storage(client, parsed.netloc, parsed.path, url_prefix)
+    if parsed.scheme == 'memory-s3':
+        return S3Storage(MemoryS3Client(), parsed.netloc, parsed.path, url_prefix)
+    raise ValueError(f'Неизвестное хранилище: {url}')
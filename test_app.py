@@ -90,7 +90,9 @@ def test_database():
     print("\n🗄️ Тестирование базы данных:")
     
     try:
-        from app import app, db, User
+        from app import create_app
+        from models import User
+        app = create_app()
         with app.app_context():
             # Проверяем подключение к БД
             user_count = User.query.count()
@@ -115,7 +117,8 @@ def test_stripe_config():
     print("\n💳 Тестирование Stripe:")
     
     try:
-        from app import app
+        from app import create_app
+        app = create_app()
         with app.app_context():
             stripe_key = app.config.get('STRIPE_SECRET_KEY')
             if stripe_key and stripe_key != 'sk_test_your_stripe_key':
@@ -0,0 +1,1417 @@
+#!/usr/bin/env python3
+"""
+ResaleX - Тесты производительности
+Проверяют планы запросов горячих маршрутов на отдельной временной базе.
+Запуск: python -m pytest -q test_performance.py
+"""
+
+import base64
+import io
+import json
+import os
+import re
+import runpy
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from PIL import Image
+from sqlalchemy import create_engine, event, func, text
+from sqlalchemy.exc import IntegrityError
+from flask_migrate import upgrade
+
+from app import create_app
+from blueprints.auth import user_profile_stats
+from blueprints.api import shutting_down, stream_slots
+from config import get_config, ProductionConfig
+import demo_data
+from events import user_channel
+import extensions
+from extensions import db, search_backend
+from jobs import WorkerPool
+from models import (rebuild_user_stats, compute_user_stats, publish_after_commit, job_queue,
+                    Job, StoredImage, WebhookEvent, User, Product, Order, ChatMessage, ChatReadState, UserStats)
+from storage import LocalStorage, S3Storage, MemoryS3Client
+
+# Тесты работают с отдельной временной базой в файле: часть из них проверяет конкурентный доступ
+_db_fd, _db_path = tempfile.mkstemp(prefix='resalex-test-', suffix='.db')
+app = create_app('testing', SQLALCHEMY_DATABASE_URI=f'sqlite:///{_db_path}')
+with app.app_context():
+    # Сервисы тестового приложения: тесты обращаются к ним и вне запроса
+    catalog_cache = extensions.catalog_cache._get_current_object()
+    event_bus = extensions.event_bus._get_current_object()
+    payment_gateway = extensions.payment_gateway._get_current_object()
+
+
+@pytest.fixture(scope='module')
+def seeded():
+    """Применяет миграции и заполняет базу небольшим набором данных"""
+    with app.app_context():
+        upgrade()
+
+        users = {}
+        for role in ['admin', 'moderator', 'seller', 'user']:
+            user = User(username=f'{role}-test', email=f'{role}@test.local', role=role,
+                        password_hash='not-used')
+            db.session.add(user)
+            users[role] = user
+        db.session.flush()
+
+        categories = ['sneakers', 'clothing', 'accessories']
+        products = []
+        for i in range(40):
+            product = Product(
+                name=f'Product {i}',
+                brand='Nike' if i % 2 else 'Adidas',
+                description=f'Description {i}',
+                category=categories[i % len(categories)],
+                condition='new',
+                price=100 + i,
+                seller_id=users['seller'].id,
+                status='approved' if i % 5 else 'pending'
+            )
+            db.session.add(product)
+            products.append(product)
+        db.session.flush()
+
+        order = Order(buyer_id=users['user'].id, product_id=products[1].id,
+                      total_amount=products[1].price, status='paid')
+        db.session.add(order)
+        db.session.flush()
+
+        for i in range(5):
+            db.session.add(ChatMessage(sender_id=users['seller'].id, receiver_id=users['user'].id,
+                                       order_id=order.id, message=f'Message {i}'))
+        search_backend.rebuild()
+        rebuild_user_stats()
+        db.session.commit()
+
+        ids = {role: user.id for role, user in users.items()}
+        ids['order'] = order.id
+
+    yield ids
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    os.close(_db_fd)
+    os.remove(_db_path)
+
+
+@pytest.fixture(autouse=True)
+def empty_catalog_cache():
+    """Каждый тест начинает с пустого кэша каталога: планы запросов проверяются на промахах"""
+    catalog_cache.clear()
+
+
+def login(client, user_id):
+    """Авторизует тестовый клиент без проверки пароля"""
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+
+
+@contextmanager
+def capture_queries():
+    """Собирает все SQL-запросы, выполненные внутри блока"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def query_plan(statement, parameters):
+    """Возвращает EXPLAIN QUERY PLAN запроса одной строкой"""
+    with app.app_context():
+        with db.engine.connect() as conn:
+            rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    return ' | '.join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize('url, role, table, index', [
+    ('/', None, 'product', 'ix_product_status_created_at'),
+    ('/products', None, 'product', 'ix_product_status_created_at'),
+    ('/products?category=sneakers', None, 'product', 'ix_product_status_category_created_at'),
+    ('/dashboard', 'seller', 'product', 'ix_product_seller_id_created_at'),
+    ('/dashboard', 'seller', 'order', 'ix_order_product_id'),
+    ('/dashboard', 'user', 'order', 'ix_order_buyer_id_created_at'),
+    ('/chat/{order}', 'user', 'chat_message', 'ix_chat_message_order_id_id'),
+    ('/products?search=nik', None, 'product', 'INTEGER PRIMARY KEY'),
+])
+def test_route_uses_index(seeded, url, role, table, index):
+    """Каждый горячий маршрут читает таблицу через свой индекс, а не полным сканированием"""
+    client = app.test_client()
+    if role:
+        login(client, seeded[role])
+
+    with capture_queries() as statements:
+        response = client.get(url.format(**seeded))
+    assert response.status_code == 200
+
+    pattern = re.compile(rf'\b(FROM|JOIN)\s+"?{table}"?(\s|$)')
+    plans = [query_plan(statement, parameters) for statement, parameters in statements
+             if statement.lstrip().upper().startswith('SELECT') and pattern.search(statement)]
+    assert plans, f'{url} не обращается к таблице {table}'
+    assert any(index in plan for plan in plans), plans
+    for plan in plans:
+        assert f'SCAN {table} ' not in plan + ' ', plan
+
+
+def catalog_names(html):
+    """Названия товаров на странице каталога"""
+    return re.findall(r'<h6 class="card-title fw-bold mb-2">(.*?)</h6>', html)
+
+
+def search_names(client, term):
+    """Возвращает названия найденных товаров в порядке выдачи"""
+    html = client.get('/products', query_string={'search': term}).get_data(as_text=True)
+    return catalog_names(html)
+
+
+def test_search_ranking_and_sync(seeded):
+    """Поиск ищет по префиксу, ранжирует по BM25 и следует за модерацией и удалением"""
+    client = app.test_client()
+    login(client, seeded['admin'])
+    for name, description in [('Vintage tee', 'Jordan print'), ('Jordan 4 Retro', 'Bred colorway')]:
+        response = client.post('/add_product', data={
+            'name': name, 'description': description, 'brand': 'Archive',
+            'category': 'clothing', 'condition': 'good', 'price': '150'
+        })
+        assert response.status_code == 302
+
+    with app.app_context():
+        ids = {p.name: p.id for p in Product.query.filter_by(brand='Archive')}
+
+    # До одобрения товаров нет в индексе
+    assert search_names(client, 'jord') == []
+
+    for product_id in ids.values():
+        client.post(f'/update_product_status/{product_id}', data={'status': 'approved'})
+    # Совпадение в названии весит больше, чем в описании
+    assert search_names(client, 'jord') == ['Jordan 4 Retro', 'Vintage tee']
+    assert search_names(client, 'archive bred') == ['Jordan 4 Retro']
+
+    client.post(f"/update_product_status/{ids['Jordan 4 Retro']}", data={'status': 'rejected'})
+    assert search_names(client, 'jord') == ['Vintage tee']
+
+    client.post(f"/edit_product/{ids['Vintage tee']}", data={
+        'name': 'Vintage hoodie', 'description': 'Plain', 'price': '120', 'brand': 'Archive',
+        'category': 'clothing', 'condition': 'good', 'size': 'M'
+    })
+    assert search_names(client, 'jord') == []
+    assert search_names(client, 'hood') == ['Vintage hoodie']
+
+    client.post(f"/delete_product/{ids['Vintage tee']}")
+    assert search_names(client, 'hood') == []
+
+
+def page_link(html, direction):
+    """Ссылка на соседнюю страницу каталога (after или before)"""
+    match = re.search(rf'href="(/products\?{direction}=[^"]+)"', html)
+    return match.group(1).replace('&amp;', '&') if match else None
+
+
+def test_keyset_pagination_walk(seeded):
+    """Курсоры обходят каталог без пропусков и повторов, глубокие страницы не используют OFFSET и COUNT"""
+    client = app.test_client()
+    with app.app_context():
+        expected = [p.name for p in Product.query.filter_by(status='approved')
+                    .order_by(Product.created_at.desc(), Product.id.desc())]
+
+    pages, url = [], '/products'
+    while url:
+        with capture_queries() as statements:
+            html = client.get(url).get_data(as_text=True)
+        pages.append(catalog_names(html))
+        assert 0 < len(pages[-1]) <= 12
+        if len(pages) > 1:
+            for statement, parameters in statements:
+                if 'FROM product' in statement:
+                    # SQLite всегда рендерит LIMIT ? OFFSET ?, поэтому проверяем значение смещения
+                    assert 'OFFSET' not in statement or parameters[-1] == 0, statement
+                    assert 'count(' not in statement, statement
+                    assert 'ix_product_status_created_at' in query_plan(statement, parameters)
+        url = page_link(html, 'after')
+    assert len(pages) > 2
+    assert [name for page in pages for name in page] == expected
+
+    # Назад с последней страницы возвращает предыдущую
+    html = client.get(page_link(html, 'before')).get_data(as_text=True)
+    assert catalog_names(html) == pages[-2]
+
+    # Испорченный курсор (вложенные списки, чужие типы, не список) дает первую страницу, а не 500
+    for payload in ([[1], [2]], [{'dt': 5}, 1], ['x', 'y'], [True, 1], 'ab', {'a': 1}):
+        token = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        response = client.get(f'/products?after={token}')
+        assert response.status_code == 200
+        assert catalog_names(response.get_data(as_text=True)) == pages[0]
+
+
+def count_queries(client, url):
+    """Количество SQL-запросов, которое выполняет один GET-запрос к маршруту"""
+    with capture_queries() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def add_marketplace_activity(seeded, count=5):
+    """
+    Добавляет заказы разных покупателей у разных продавцов, в том числе у тестовых.
+    У каждого товара свое изображение, варианты которого еще собираются
+    """
+    with app.app_context():
+        suffix = User.query.count()
+        for i in range(count):
+            seller = User(username=f'seller-{suffix}-{i}', email=f's{suffix}-{i}@test.local', role='seller',
+                          password_hash='not-used')
+            buyer = User(username=f'buyer-{suffix}-{i}', email=f'b{suffix}-{i}@test.local', role='user',
+                         password_hash='not-used')
+            db.session.add_all([seller, buyer])
+            db.session.flush()
+            for seller_id, buyer_id in [(seller.id, seeded['user']), (seeded['seller'], buyer.id)]:
+                key = uuid.uuid4().hex
+                product = Product(name=f'Extra {suffix}-{i}', brand='Extra', category='sneakers',
+                                  condition='good', price=50, seller_id=seller_id, status='pending',
+                                  image_url=f'/static/uploads/{key}-card.jpg')
+                db.session.add_all([product, StoredImage(key=key, ref_count=1, ready=False)])
+                db.session.flush()
+                db.session.add(Order(buyer_id=buyer_id, product_id=product.id, total_amount=50, status='paid'))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('role, url, limit', [
+    ('admin', '/dashboard', 6),
+    ('moderator', '/dashboard', 4),
+    ('seller', '/dashboard', 5),
+    ('user', '/dashboard', 3),
+    ('admin', '/api/admin/users', 2),
+    ('admin', '/api/admin/products?status=pending', 3),
+    ('moderator', '/api/admin/orders?per_page=100', 2),
+])
+def test_dashboard_query_count(seeded, role, url, limit):
+    """Дашборд выполняет фиксированное число запросов, не зависящее от числа строк"""
+    client = app.test_client()
+    login(client, seeded[role])
+    # В таблицах уже есть товары с изображениями: их готовность проверяется одним запросом на страницу
+    add_marketplace_activity(seeded, count=1)
+
+    before = count_queries(client, url)
+    assert before <= limit
+    add_marketplace_activity(seeded)
+    assert count_queries(client, url) == before
+
+
+def test_admin_tables_page_through_everything(seeded):
+    """JSON-таблицы админа отдают все строки страницами с сортировкой и фильтрами"""
+    client = app.test_client()
+    login(client, seeded['admin'])
+    with app.app_context():
+        expected = [p.id for p in Product.query.filter_by(status='pending')
+                    .order_by(Product.price.asc(), Product.id.asc())]
+
+    seen, params = [], {'status': 'pending', 'sort': 'price', 'direction': 'asc', 'per_page': 7}
+    while True:
+        data = client.get('/api/admin/products', query_string=params).get_json()
+        assert len(data['items']) <= 7
+        assert all(item['status'] == 'pending' for item in data['items'])
+        seen.extend(item['id'] for item in data['items'])
+        if not data['next']:
+            break
+        params['after'] = data['next']
+    assert seen == expected
+
+    login(client, seeded['moderator'])
+    assert client.get('/api/admin/users').status_code == 403
+    assert client.get('/api/admin/orders').status_code == 200
+
+
+def test_profile_stats_use_sql_aggregates(seeded):
+    """Статистика профиля совпадает с подсчетом в Python и не зависит от длины истории заказов"""
+    client = app.test_client()
+    login(client, seeded['seller'])
+    add_marketplace_activity(seeded, count=1)
+
+    before = count_queries(client, '/profile')
+    add_marketplace_activity(seeded)
+    assert count_queries(client, '/profile') == before
+
+    with app.app_context():
+        stats = user_profile_stats(seeded['seller'], include_sales=True)
+        sold = Order.query.join(Product).filter(Product.seller_id == seeded['seller']).all()
+        listed = Product.query.filter_by(seller_id=seeded['seller']).all()
+    assert stats['sold']['count'] == len(sold)
+    assert stats['sold']['amount'] == pytest.approx(sum(order.total_amount for order in sold))
+    assert stats['listed']['count'] == len(listed)
+    assert stats['listed']['by_status']['approved'] == sum(p.status == 'approved' for p in listed)
+
+
+def assert_stats_match_tables():
+    """Счетчики user_stats совпадают с пересчетом по исходным таблицам"""
+    with app.app_context():
+        stored = {row.user_id: (row.unread_messages, row.pending_orders, row.active_listings,
+                                pytest.approx(row.lifetime_gmv)) for row in UserStats.query}
+        for row in compute_user_stats():
+            expected = (row['unread_messages'], row['pending_orders'], row['active_listings'],
+                        pytest.approx(row['lifetime_gmv']))
+            assert stored.get(row['user_id'], (0, 0, 0, 0)) == expected, row
+
+
+def test_user_stats_follow_writes(seeded):
+    """Счетчики обновляются в транзакциях записи и читаются бейджем за один запрос"""
+    moderator, seller, buyer = app.test_client(), app.test_client(), app.test_client()
+    login(moderator, seeded['moderator'])
+    login(seller, seeded['seller'])
+    login(buyer, seeded['user'])
+    with app.app_context():
+        # Предыдущие тесты вставляли заказы в обход приложения — это и есть дрейф, который чинит пересборка
+        rebuild_user_stats()
+        db.session.commit()
+        product_id = Product.query.filter_by(seller_id=seeded['seller'], status='pending').first().id
+    assert_stats_match_tables()
+
+    moderator.post(f'/update_product_status/{product_id}', data={'status': 'approved'})
+    assert_stats_match_tables()
+
+    assert buyer.post(f'/buy/{product_id}').status_code == 302
+    assert_stats_match_tables()
+    with app.app_context():
+        order_id = Order.query.filter_by(product_id=product_id).one().id
+
+    seller.post(f'/chat/{order_id}/send', data={'message': 'Отправлю завтра'})
+    assert buyer.get('/api/notifications/unread').get_json()['unread_messages'] == 1
+    assert_stats_match_tables()
+
+    buyer.get(f'/chat/{order_id}')
+    assert buyer.get('/api/notifications/unread').get_json()['unread_messages'] == 0
+    assert_stats_match_tables()
+
+    seller.post(f'/update_order_status/{order_id}', data={'status': 'cancelled'})
+    with app.app_context():
+        job_queue.run_pending()
+    assert_stats_match_tables()
+
+    with app.app_context():
+        unsold_id = Product.query.filter_by(seller_id=seeded['seller'], status='approved') \
+            .filter(~Product.orders.any()).first().id
+    seller.post(f'/delete_product/{unsold_id}')
+    assert_stats_match_tables()
+
+    # Бейдж не считает заказы: только пользователь и строка счетчиков
+    assert count_queries(seller, '/api/notifications/unread') == 2
+
+
+def read_sse(chunks):
+    """Следующее событие SSE-потока как (имя, данные); пинги пропускаются"""
+    while True:
+        chunk = next(chunks).decode()
+        fields = dict(line.split(': ', 1) for line in chunk.strip().splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            return fields['event'], json.loads(fields['data'])
+
+
+def test_notifications_stream_pushes_committed_events(seeded):
+    """Поток отдает снимок счетчиков, затем события записи — и только после commit"""
+    seller, buyer = app.test_client(), app.test_client()
+    login(seller, seeded['seller'])
+    login(buyer, seeded['user'])
+    with app.app_context():
+        product = Product.query.filter_by(seller_id=seeded['seller'], status='approved') \
+            .filter(~Product.orders.any()).first()
+        product_id, price = product.id, product.price
+        pending_orders = db.session.get(UserStats, seeded['seller']).pending_orders
+
+    response = seller.get('/api/notifications/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert read_sse(chunks) == ('stats', {'unread_messages': 0, 'pending_orders': pending_orders})
+    assert event_bus.subscriber_count(user_channel(seeded['seller'])) == 1
+
+    # Откаченная транзакция ничего не рассылает
+    with app.app_context():
+        publish_after_commit(user_channel(seeded['seller']), 'order', {'order_id': 0})
+        db.session.rollback()
+
+    assert buyer.post(f'/buy/{product_id}').status_code == 302
+    # Бронь снимает товар с витрины, заказ добавляется продавцу
+    assert read_sse(chunks) == ('stats_delta', {'active_listings': -1})
+    assert read_sse(chunks) == ('stats_delta', {'pending_orders': 1, 'lifetime_gmv': price})
+    name, order = read_sse(chunks)
+    assert name == 'order' and order['created'] and order['status'] == 'pending'
+
+    response.close()
+    assert event_bus.subscriber_count(user_channel(seeded['seller'])) == 0
+
+
+
+def test_chat_incremental_fetch_and_push(seeded):
+    """Новые сообщения приходят по SSE и догружаются по since, без повторной загрузки всего чата"""
+    seller, buyer = app.test_client(), app.test_client()
+    login(seller, seeded['seller'])
+    login(buyer, seeded['user'])
+    url = f"/api/chat/{seeded['order']}"
+
+    history = buyer.get(url).get_json()
+    assert history['messages'] and not history['has_more']
+    last_id = history['messages'][-1]['id']
+    assert buyer.get(f'{url}?since={last_id}').get_json()['messages'] == []
+
+    response = buyer.get(f'{url}/stream', buffered=False)
+    chunks = iter(response.response)
+    next(chunks)  # retry
+
+    sent = seller.post(url, json={'message': 'Трек-номер завтра'})
+    assert sent.status_code == 201
+    assert read_sse(chunks) == ('message', sent.get_json())
+
+    new = buyer.get(f'{url}?since={last_id}').get_json()['messages']
+    assert [message['message'] for message in new] == ['Трек-номер завтра']
+
+    buyer.post(f'{url}/read', json={'up_to': new[-1]['id']})
+    assert read_sse(chunks) == ('read', {'reader_id': seeded['user'], 'up_to': new[-1]['id']})
+    assert buyer.get('/api/notifications/unread').get_json()['unread_messages'] == 0
+    response.close()
+
+    assert seller.post(url, json={'message': ' '}).status_code == 400
+    for payload in [['Привет'], 'Привет', {'message': 42}, {'message': {'text': 'Привет'}}]:
+        assert seller.post(url, json=payload).status_code == 400, payload
+
+
+def open_chat_with(seeded, message_count):
+    """Создает заказ с message_count непрочитанными сообщениями покупателю"""
+    with app.app_context():
+        product = Product.query.filter_by(seller_id=seeded['seller'], status='approved') \
+            .filter(~Product.orders.any()).first()
+        order = Order(buyer_id=seeded['user'], product_id=product.id, total_amount=product.price, status='paid')
+        db.session.add(order)
+        db.session.flush()
+        db.session.add_all([ChatMessage(sender_id=seeded['seller'], receiver_id=seeded['user'],
+                                        order_id=order.id, message=f'Message {i}') for i in range(message_count)])
+        rebuild_user_stats()
+        db.session.commit()
+        return order.id
+
+
+def test_chat_read_receipts_cost_constant_statements(seeded):
+    """Открытие чата помечает прочитанным всё одним UPDATE, сколько бы сообщений там ни было"""
+    buyer = app.test_client()
+    login(buyer, seeded['user'])
+    short_chat, long_chat = open_chat_with(seeded, 3), open_chat_with(seeded, 1000)
+
+    with capture_queries() as short_statements:
+        assert buyer.get(f'/chat/{short_chat}').status_code == 200
+    with capture_queries() as long_statements:
+        assert buyer.get(f'/chat/{long_chat}').status_code == 200
+    assert len(long_statements) == len(short_statements)
+    updates = [statement for statement, _ in long_statements if statement.startswith('UPDATE chat_message')]
+    assert len(updates) == 1
+    assert_stats_match_tables()
+
+    with app.app_context():
+        assert ChatMessage.query.filter_by(order_id=long_chat, is_read=False).count() == 0
+        state = db.session.get(ChatReadState, (long_chat, seeded['user']))
+        assert state.last_read_message_id == db.session.query(func.max(ChatMessage.id)) \
+            .filter_by(order_id=long_chat).scalar()
+
+    # Повторное открытие прочитанного чата ничего не пишет
+    with capture_queries() as statements:
+        assert buyer.get(f'/chat/{long_chat}').status_code == 200
+    assert not [statement for statement, _ in statements if statement.startswith(('UPDATE', 'INSERT'))]
+
+
+def test_chat_read_up_to_is_clamped_to_real_messages(seeded):
+    """up_to больше любого id не отмечает прочитанными будущие сообщения"""
+    buyer, seller = app.test_client(), app.test_client()
+    login(buyer, seeded['user'])
+    login(seller, seeded['seller'])
+    order_id = open_chat_with(seeded, 2)
+
+    assert buyer.post(f'/api/chat/{order_id}/read', json={'up_to': 10 ** 9}).get_json() == {'read': 2}
+    with app.app_context():
+        last_message = db.session.query(func.max(ChatMessage.id)).filter_by(order_id=order_id).scalar()
+        assert db.session.get(ChatReadState, (order_id, seeded['user'])).last_read_message_id == last_message
+
+    assert seller.post(f'/api/chat/{order_id}', json={'message': 'Still there?'}).status_code == 201
+    with app.app_context():
+        assert ChatMessage.query.filter_by(order_id=order_id, is_read=False).count() == 1
+    assert buyer.post(f'/api/chat/{order_id}/read', json={'up_to': 10 ** 9}).get_json() == {'read': 1}
+    assert_stats_match_tables()
+
+
+def test_first_read_state_from_parallel_tabs_does_not_conflict(seeded, monkeypatch):
+    """Две вкладки ставят первую отметку о прочтении одновременно: вторая продвигает строку, а не падает"""
+    from blueprints.chat import mark_chat_read
+    order_id = open_chat_with(seeded, 3)
+    with app.app_context():
+        ids = [message_id for (message_id,) in db.session.query(ChatMessage.id)
+               .filter_by(order_id=order_id).order_by(ChatMessage.id)]
+        # Другая вкладка уже вставила отметку, а этот запрос прочитал состояние до ее commit
+        db.session.add(ChatReadState(order_id=order_id, user_id=seeded['user'], last_read_message_id=ids[0]))
+        db.session.commit()
+        monkeypatch.setattr(db.session, 'get', lambda *args, **kwargs: None)
+        assert mark_chat_read(order_id, seeded['user'], ids[-1]) == 3
+        monkeypatch.undo()
+        db.session.commit()
+        assert db.session.get(ChatReadState, (order_id, seeded['user'])).last_read_message_id == ids[-1]
+    assert_stats_match_tables()
+
+
+def test_catalog_cache_serves_repeat_hits_and_invalidates_precisely(seeded):
+    """Повторные анонимные хиты не ходят в базу; модерация сбрасывает только затронутые выдачи"""
+    anonymous, moderator = app.test_client(), app.test_client()
+    login(moderator, seeded['moderator'])
+
+    for url in ['/', '/products?category=sneakers', '/products?category=clothing']:
+        anonymous.get(url)
+        assert count_queries(anonymous, url) == 0
+
+    # Авторизованные получают свою разметку, но выборки берут из кэша: остается только загрузка пользователя
+    assert count_queries(moderator, '/products?category=sneakers') == 1
+
+    with app.app_context():
+        product = Product.query.filter_by(status='pending', category='sneakers').first()
+        product_id, product_name = product.id, product.name
+    assert product_name not in catalog_names(anonymous.get('/products?category=sneakers').get_data(as_text=True))
+
+    moderator.post(f'/update_product_status/{product_id}', data={'status': 'approved'})
+    assert count_queries(anonymous, '/products?category=clothing') == 0
+    assert count_queries(anonymous, '/products?category=sneakers') > 0
+    assert count_queries(anonymous, '/') > 0
+    assert product_name in catalog_names(anonymous.get('/products?category=sneakers').get_data(as_text=True))
+
+    # Отклонение товара, которого нет в выдаче, кэш не трогает
+    with app.app_context():
+        pending_id = Product.query.filter_by(status='pending').first().id
+    moderator.post(f'/update_product_status/{pending_id}', data={'status': 'rejected'})
+    assert count_queries(anonymous, '/') == 0
+
+
+def test_public_pages_answer_conditional_requests(seeded):
+    """Повторный визит с If-None-Match получает 304 без рендера; изменение каталога меняет ETag"""
+    anonymous, moderator = app.test_client(), app.test_client()
+    login(moderator, seeded['moderator'])
+    with app.app_context():
+        product_id = Product.query.filter_by(status='approved').first().id
+
+    for url in ['/', '/products?category=sneakers', f'/product/{product_id}']:
+        response = anonymous.get(url)
+        assert response.status_code == 200
+        assert response.headers['ETag'] and response.headers['Last-Modified']
+        assert response.cache_control.public and response.cache_control.max_age == app.config['HTTP_CACHE_MAX_AGE']
+        assert 'Cookie' in response.vary
+
+        repeat = anonymous.get(url, headers={'If-None-Match': response.headers['ETag']})
+        assert repeat.status_code == 304 and repeat.data == b''
+        assert anonymous.get(url, headers={'If-Modified-Since': response.headers['Last-Modified']}).status_code == 304
+
+    # Листинги отвечают 304 из кэша валидаторов, не обращаясь к базе
+    etag = anonymous.get('/').headers['ETag']
+    with capture_queries() as statements:
+        assert anonymous.get('/', headers={'If-None-Match': etag}).status_code == 304
+    assert statements == []
+
+    with app.app_context():
+        pending_id = Product.query.filter_by(status='pending').first().id
+    moderator.post(f'/update_product_status/{pending_id}', data={'status': 'approved'})
+    assert anonymous.get('/', headers={'If-None-Match': etag}).status_code == 200
+
+    # Персональные страницы не кэшируются прокси
+    response = moderator.get('/')
+    assert 'ETag' not in response.headers
+    assert response.cache_control.private and response.cache_control.no_cache
+
+
+def make_photo(size=(2400, 1800)):
+    """JPEG-«фотография» с EXIF, как из телефона"""
+    image = Image.new('RGB', size, (200, 80, 40))
+    exif = Image.Exif()
+    exif[0x010F] = 'PhoneMaker'  # Make
+    exif[0x0131] = 'Camera 1.0'  # Software
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=95, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def test_uploads_become_stripped_hashed_variants(seeded, tmp_path, monkeypatch):
+    """Загрузка дает варианты thumb/card/detail в WebP и JPEG без EXIF, с именами по хэшу"""
+    monkeypatch.setitem(app.extensions['resalex'], 'image_storage', LocalStorage(str(tmp_path / 'uploads'), '/static/uploads'))
+    monkeypatch.setitem(app.extensions['resalex'], 'upload_staging', LocalStorage(str(tmp_path / 'staging')))
+    uploads = tmp_path / 'uploads'
+    with app.app_context():
+        job_queue.run_pending()  # задачи, оставшиеся от предыдущих тестов
+    seller = app.test_client()
+    login(seller, seeded['seller'])
+    photo = make_photo()
+
+    def upload(name):
+        seller.post('/add_product', data={
+            'name': name, 'brand': 'Nike', 'category': 'sneakers', 'condition': 'new', 'price': '150',
+            'description': '', 'size': '42', 'image': (io.BytesIO(photo), 'IMG_0001.jpg'),
+        }, content_type='multipart/form-data')
+        with app.app_context():
+            return Product.query.filter_by(name=name).one().image_url
+
+    image_url = upload('Uploaded sneakers')
+    assert re.fullmatch(r'/static/uploads/[0-9a-f]{32}-card\.jpg', image_url)
+    key = image_url.rsplit('/', 1)[1].split('-')[0]
+    with app.app_context():
+        product_id = Product.query.filter_by(name='Uploaded sneakers').one().id
+
+    # Запрос только сохранил оригинал и поставил задачу; до ее выполнения видна заглушка
+    assert not list(uploads.iterdir())
+    assert [path.name for path in (tmp_path / 'staging').iterdir()] == [key]
+    html = seller.get(f'/product/{product_id}').get_data(as_text=True)
+    assert 'Изображение обрабатывается' in html and f'{key}-detail' not in html
+    anonymous = app.test_client()
+    placeholder = anonymous.get(f'/product/{product_id}')
+    assert 'Изображение обрабатывается' in placeholder.get_data(as_text=True)
+
+    with app.app_context():
+        assert job_queue.run_pending() == 1
+    # Готовые варианты меняют ETag: повторная проверка кэша получает страницу, а не 304 с заглушкой
+    revalidated = anonymous.get(f'/product/{product_id}', headers={'If-None-Match': placeholder.headers['ETag']})
+    assert revalidated.status_code == 200
+    assert f'{key}-detail' in revalidated.get_data(as_text=True)
+    assert not list((tmp_path / 'staging').iterdir())
+    files = {path.name: path for path in uploads.iterdir()}
+    assert set(files) == {f'{key}-{variant}.{fmt}' for variant in ['thumb', 'card', 'detail']
+                          for fmt in ['webp', 'jpg']}
+
+    for name, path in files.items():
+        with Image.open(path) as variant:
+            assert not variant.getexif(), name
+            assert max(variant.size) <= 1200
+    with Image.open(files[f'{key}-thumb.webp']) as thumb:
+        assert thumb.size == (160, 160)
+    assert files[f'{key}-card.webp'].stat().st_size * 10 < len(photo)
+
+    # Тот же файл под тем же именем у другого товара не перезаписывает и не дублирует варианты
+    assert upload('Same photo again') == image_url
+    with app.app_context():
+        assert job_queue.run_pending() == 0
+    assert len(list(uploads.iterdir())) == 6
+
+    html = seller.get(f'/product/{product_id}').get_data(as_text=True)
+    assert f'/static/uploads/{key}-detail.webp 1200w' in html
+    assert f'/static/uploads/{key}-thumb.jpg' in html
+
+
+def test_failed_job_retries_with_backoff_then_fails(seeded, monkeypatch):
+    """Упавшая задача возвращается в очередь с растущей задержкой, после max_attempts — failed"""
+    calls = []
+
+    def flaky(n):
+        calls.append(n)
+        raise RuntimeError('boom')
+
+    monkeypatch.setitem(job_queue.handlers, 'flaky', flaky)
+    with app.app_context():
+        job = job_queue.enqueue('flaky', max_attempts=2, n=1)
+        db.session.commit()
+        job_id = job.id
+
+        assert job_queue.run_pending() == 1
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.attempts) == ('queued', 1)
+        assert 'RuntimeError: boom' in job.last_error
+        assert job.run_after > datetime.utcnow() + timedelta(seconds=job_queue.retry_delay - 1)
+        # Задача с задержкой не берется раньше времени
+        assert job_queue.run_pending() == 0
+
+        job.run_after = datetime.utcnow()
+        db.session.commit()
+        assert job_queue.run_pending() == 1
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.attempts) == ('failed', 2)
+        assert job.finished_at is not None
+    assert calls == [1, 1]
+
+
+def test_worker_pool_runs_each_job_once(seeded, tmp_path, monkeypatch):
+    """Несколько процессов разбирают общую очередь, и ни одна задача не выполняется дважды"""
+    def touch(n):
+        with open(tmp_path / f'{n}-{os.getpid()}', 'x'):
+            pass
+
+    monkeypatch.setitem(job_queue.handlers, 'touch', touch)
+    with app.app_context():
+        for n in range(20):
+            job_queue.enqueue('touch', n=n)
+        db.session.commit()
+
+    pool = WorkerPool(app, job_queue, processes=3, poll_interval=0.05).start()
+    try:
+        deadline = time.monotonic() + 30
+        while len(list(tmp_path.iterdir())) < 20 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        pool.stop()
+
+    assert sorted(int(path.name.split('-')[0]) for path in tmp_path.iterdir()) == list(range(20))
+    with app.app_context():
+        assert Job.query.filter_by(kind='touch', status='done').count() == 20
+
+
+def test_shared_image_is_deleted_with_last_reference(seeded, monkeypatch):
+    """Одинаковые загрузки хранятся один раз, а файлы удаляются вместе с последней ссылкой"""
+    client = MemoryS3Client()
+    monkeypatch.setitem(app.extensions['resalex'], 'image_storage', S3Storage(client, 'media', 'images', 'https://cdn.test'))
+    monkeypatch.setitem(app.extensions['resalex'], 'upload_staging', S3Storage(client, 'media', 'staging'))
+    seller = app.test_client()
+    login(seller, seeded['seller'])
+    photo = make_photo((800, 600))
+
+    def upload(name):
+        seller.post('/add_product', data={
+            'name': name, 'brand': 'Nike', 'category': 'sneakers', 'condition': 'new', 'price': '150',
+            'description': '', 'size': '42', 'image': (io.BytesIO(photo), 'IMG_0001.jpg'),
+        }, content_type='multipart/form-data')
+        with app.app_context():
+            job_queue.run_pending()
+            return Product.query.filter_by(name=name).one()
+
+    first, second = upload('Shared photo 1'), upload('Shared photo 2')
+    assert first.image_url == second.image_url
+    assert first.image_url.startswith('https://cdn.test/images/')
+    key = first.image_url.rsplit('/', 1)[1].split('-')[0]
+    stored_keys = sorted(key for _, key in client.objects)
+    assert len(stored_keys) == 6 and all(name.startswith(f'images/{key}-') for name in stored_keys)
+    assert client.objects[('media', f'images/{key}-card.webp')][1] == {
+        'ContentType': 'image/webp', 'CacheControl': 'public, max-age=31536000, immutable'}
+    with app.app_context():
+        assert db.session.get(StoredImage, key).ref_count == 2
+
+    seller.post(f'/delete_product/{first.id}')
+    with app.app_context():
+        job_queue.run_pending()
+        assert db.session.get(StoredImage, key).ref_count == 1
+    assert len(client.objects) == 6
+
+    seller.post(f'/delete_product/{second.id}')
+    with app.app_context():
+        job_queue.run_pending()
+        assert db.session.get(StoredImage, key) is None
+    assert client.objects == {}
+
+
+def test_concurrent_first_uploads_of_same_image_share_one_row(seeded):
+    """Одновременные первые загрузки одного содержимого: одна строка StoredImage с двумя ссылками"""
+    from uploads import add_reference
+    key = 'f' * 32
+    barrier = threading.Barrier(2)
+    results, errors = [], []
+
+    def first_upload():
+        with app.app_context():
+            try:
+                barrier.wait()
+                results.append(add_reference(key))
+                db.session.commit()
+            except Exception as exc:
+                errors.append(exc)
+                db.session.rollback()
+
+    threads = [threading.Thread(target=first_upload) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert sorted(results) == [False, True]
+    with app.app_context():
+        assert db.session.get(StoredImage, key).ref_count == 2
+        db.session.delete(db.session.get(StoredImage, key))
+        db.session.commit()
+
+
+def post_webhook(client, payload, signature=None):
+    return client.post('/stripe/webhook', data=payload,
+                       headers={'Stripe-Signature': signature or payment_gateway.sign(payload)})
+
+
+def test_payment_is_created_in_background_and_confirmed_by_webhook(seeded):
+    """Покупка не ждет шлюз, а заказ становится оплаченным по подписанному вебхуку ровно один раз"""
+    buyer, stripe_client = app.test_client(), app.test_client()
+    login(buyer, seeded['user'])
+    with app.app_context():
+        product_id = Product.query.filter_by(seller_id=seeded['seller'], status='approved') \
+            .filter(~Product.orders.any()).first().id
+
+    response = buyer.post(f'/buy/{product_id}')
+    with app.app_context():
+        order = Order.query.filter_by(product_id=product_id).one()
+        order_id, amount = order.id, order.total_amount
+        assert order.payment_intent_id is None
+    assert response.headers['Location'].endswith(f'/payment/{order_id}')
+    assert 'Подготовка оплаты' in buyer.get(f'/payment/{order_id}').get_data(as_text=True)
+    assert buyer.get(f'/api/orders/{order_id}/payment').get_json() == {'status': 'pending', 'client_secret': None}
+
+    with app.app_context():
+        job_queue.run_pending()
+        intent_id = db.session.get(Order, order_id).payment_intent_id
+    payment = buyer.get(f'/api/orders/{order_id}/payment').get_json()
+    assert payment['client_secret'].startswith(f'{intent_id}_secret_')
+    # Повтор задачи с тем же ключом идемпотентности не создает второе намерение
+    assert payment_gateway.create_intent(round(amount * 100), 'usd', order_id,
+                                         idempotency_key=f'order-{order_id}').id == intent_id
+
+    payload = payment_gateway.event_payload('payment_intent.succeeded', intent_id, order_id, event_id='evt_paid_1')
+    assert post_webhook(stripe_client, payload, signature='t=1,v1=forged').status_code == 400
+    assert post_webhook(stripe_client, payload, payment_gateway.sign(payload, timestamp=time.time() - 3600)) \
+        .status_code == 400
+    with app.app_context():
+        assert db.session.get(Order, order_id).status == 'pending'
+
+    assert post_webhook(stripe_client, payload).get_json() == {'status': 'ok'}
+    assert post_webhook(stripe_client, payload).get_json() == {'status': 'duplicate'}
+    # Опоздавшая отмена не откатывает оплаченный заказ
+    canceled = payment_gateway.event_payload('payment_intent.canceled', intent_id, order_id)
+    assert post_webhook(stripe_client, canceled).get_json() == {'status': 'ok'}
+    with app.app_context():
+        assert db.session.get(Order, order_id).status == 'paid'
+        assert db.session.get(Product, product_id).status == 'sold'
+        assert WebhookEvent.query.filter_by(id='evt_paid_1').count() == 1
+    assert_stats_match_tables()
+
+
+def test_webhook_failure_is_retried_not_reported_as_duplicate(seeded, monkeypatch):
+    """Ошибка при применении события (в том числе IntegrityError) дает 500 и не записывает событие"""
+    import blueprints.orders
+    stripe_client = app.test_client()
+    payload = payment_gateway.event_payload('payment_intent.succeeded', 'pi_unknown', 0, event_id='evt_retry_1')
+
+    def broken(event):
+        raise IntegrityError('UPDATE "order"', {}, Exception('constraint failed'))
+    monkeypatch.setattr(blueprints.orders, 'apply_payment_event', broken)
+    assert post_webhook(stripe_client, payload).status_code == 500
+    with app.app_context():
+        assert db.session.get(WebhookEvent, 'evt_retry_1') is None
+
+    monkeypatch.undo()
+    assert post_webhook(stripe_client, payload).get_json() == {'status': 'ok'}
+    assert post_webhook(stripe_client, payload).get_json() == {'status': 'duplicate'}
+
+
+def test_seller_cancels_pending_order_through_gateway(seeded):
+    """Отмена неоплаченного заказа сначала отменяет намерение оплаты; отгрузить его нельзя"""
+    buyer, seller = app.test_client(), app.test_client()
+    login(buyer, seeded['user'])
+    login(seller, seeded['seller'])
+    with app.app_context():
+        product_id = Product.query.filter_by(seller_id=seeded['seller'], status='approved') \
+            .filter(~Product.orders.any()).first().id
+    buyer.post(f'/buy/{product_id}')
+    with app.app_context():
+        job_queue.run_pending()
+        order = Order.query.filter_by(product_id=product_id).one()
+        order_id, intent_id = order.id, order.payment_intent_id
+
+    seller.post(f'/update_order_status/{order_id}', data={'status': 'shipped'})
+    with app.app_context():
+        assert db.session.get(Order, order_id).status == 'pending'
+        assert db.session.get(Product, product_id).status == 'reserved'
+
+    seller.post(f'/update_order_status/{order_id}', data={'status': 'cancelled'})
+    with app.app_context():
+        job_queue.run_pending()
+        assert db.session.get(Order, order_id).status == 'cancelled'
+        assert db.session.get(Product, product_id).status == 'approved'
+    assert intent_id in payment_gateway.canceled
+    assert_stats_match_tables()
+
+
+def test_concurrent_buyers_only_one_reserves(seeded):
+    """Одновременные покупатели одного товара: заказ получает ровно один, бронь снимается без оплаты"""
+    with app.app_context():
+        buyers = [User(username=f'rush-{i}', email=f'rush-{i}@test.local', role='user', password_hash='not-used')
+                  for i in range(8)]
+        db.session.add_all(buyers)
+        product = Product.query.filter_by(seller_id=seeded['seller'], status='approved') \
+            .filter(~Product.orders.any()).first()
+        db.session.commit()
+        buyer_ids, product_id = [buyer.id for buyer in buyers], product.id
+
+    barrier = threading.Barrier(len(buyer_ids))
+    results = []
+
+    def buy(buyer_id):
+        client = app.test_client()
+        login(client, buyer_id)
+        barrier.wait()
+        response = client.post(f'/buy/{product_id}')
+        results.append((response.status_code, response.headers.get('Location', '')))
+
+    threads = [threading.Thread(target=buy, args=(buyer_id,)) for buyer_id in buyer_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == len(buyer_ids) and all(status == 302 for status, _ in results)
+    assert sum('/payment/' in location for _, location in results) == 1
+    with app.app_context():
+        order = Order.query.filter_by(product_id=product_id).one()
+        assert order.buyer_id in buyer_ids
+        assert db.session.get(Product, product_id).status == 'reserved'
+    assert_stats_match_tables()
+
+    # Бронь истекла: намерение отменено, заказ отменен, товар вернулся в каталог
+    with app.app_context():
+        job_queue.run_pending()
+        intent_id = db.session.get(Order, order.id).payment_intent_id
+        Job.query.filter_by(kind='expire_reservation').update({Job.run_after: datetime.utcnow()})
+        db.session.commit()
+        job_queue.run_pending()
+        assert db.session.get(Order, order.id).status == 'cancelled'
+        assert db.session.get(Product, product_id).status == 'approved'
+    assert intent_id in payment_gateway.canceled
+    assert_stats_match_tables()
+
+
+def test_server_shutdown_closes_event_streams(seeded, monkeypatch):
+    """При остановке процесса открытые SSE-потоки завершаются на ближайшем пинге, а не держат его"""
+    monkeypatch.setitem(app.config, 'SSE_HEARTBEAT_SECONDS', 0.05)
+    client = app.test_client()
+    login(client, seeded['user'])
+    response = client.get('/api/notifications/stream', buffered=False)
+    chunks = iter(response.response)
+    assert read_sse(chunks)[0] == 'stats'
+    try:
+        shutting_down.set()
+        started = time.monotonic()
+        list(chunks)
+        assert time.monotonic() - started < 1
+    finally:
+        shutting_down.clear()
+    assert event_bus.subscriber_count(user_channel(seeded['user'])) == 0
+
+
+def test_event_streams_are_capped_per_process_and_user(seeded, monkeypatch):
+    """SSE-потоки не занимают все потоки процесса: сверх лимитов 503, закрытый поток освобождает место"""
+    monkeypatch.setitem(app.config, 'SSE_MAX_STREAMS', 2)
+    monkeypatch.setitem(app.config, 'SSE_MAX_STREAMS_PER_USER', 1)
+    user, seller, admin = app.test_client(), app.test_client(), app.test_client()
+    login(user, seeded['user'])
+    login(seller, seeded['seller'])
+    login(admin, seeded['admin'])
+
+    first = user.get('/api/notifications/stream', buffered=False)
+    assert first.status_code == 200
+    # Вторая вкладка того же пользователя переходит на опрос
+    refused = user.get('/api/notifications/stream', buffered=False)
+    assert refused.status_code == 503 and refused.headers['Retry-After']
+    second = seller.get('/api/notifications/stream', buffered=False)
+    assert second.status_code == 200
+    # Процесс исчерпал лимит: поток не получает и другой пользователь
+    assert admin.get('/api/notifications/stream', buffered=False).status_code == 503
+    assert stream_slots.count() == 2
+
+    # Клиент ушел до первого чанка: место освобождается при закрытии ответа
+    first.close()
+    second.close()
+    assert stream_slots.count() == 0
+    assert event_bus.subscriber_count(user_channel(seeded['user'])) == 0
+    third = admin.get('/api/notifications/stream', buffered=False)
+    assert third.status_code == 200
+    third.close()
+    assert stream_slots.count(seeded['admin']) == 0
+
+
+def test_production_settings_come_from_environment(monkeypatch):
+    """FLASK_ENV выбирает класс настроек, а gunicorn берет число процессов и потоков из окружения"""
+    monkeypatch.setenv('FLASK_ENV', 'production')
+    assert get_config() is ProductionConfig and not get_config().DEBUG
+    monkeypatch.setenv('FLASK_ENV', 'prod')
+    with pytest.raises(ValueError):
+        get_config()
+
+    monkeypatch.setenv('WEB_CONCURRENCY', '6')
+    monkeypatch.setenv('GUNICORN_THREADS', '16')
+    settings = runpy.run_path(os.path.join(os.path.dirname(__file__), 'gunicorn.conf.py'))
+    assert (settings['workers'], settings['threads'], settings['worker_class']) == (6, 16, 'gthread')
+
+
+def test_read_only_views_read_from_replica(seeded, tmp_path, monkeypatch):
+    """Каталог и уведомления читают с реплики, а покупка читает и пишет в основную базу"""
+    replica_path = tmp_path / 'replica.db'
+    with app.app_context():
+        assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        # Реплика — снимок основной базы в отдельном файле; дальше они расходятся
+        primary = db.engine.raw_connection()
+        with sqlite3.connect(replica_path) as target:
+            primary.driver_connection.backup(target)
+        primary.close()
+        monkeypatch.setitem(db.engines, 'replica_0', create_engine(f'sqlite:///{replica_path}'))
+
+        product = Product(name='Only on primary', brand='Nike', category='sneakers', condition='new',
+                          price=99, seller_id=seeded['seller'], status='approved')
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+
+    replica_statements = []
+    with app.app_context():
+        replica = db.engines['replica_0']
+    event.listen(replica, 'before_cursor_execute', lambda *args: replica_statements.append(args[2]))
+
+    anonymous, buyer = app.test_client(), app.test_client()
+    assert anonymous.get(f'/product/{product_id}').status_code == 404
+    assert any('FROM product' in statement for statement in replica_statements)
+
+    # Кэш каталога заполняется из основной базы: отстающая реплика не вернет в него старую выдачу
+    replica_statements.clear()
+    assert 'Only on primary' in anonymous.get('/products').get_data(as_text=True)
+    assert not any('FROM product' in statement for statement in replica_statements)
+
+    login(buyer, seeded['user'])
+    replica_statements.clear()
+    assert buyer.get('/api/notifications/unread').status_code == 200
+    assert any('user_stats' in statement for statement in replica_statements)
+
+    # Вне представлений только для чтения реплика не используется
+    replica_statements.clear()
+    response = buyer.post(f'/buy/{product_id}')
+    assert '/payment/' in response.headers['Location']
+    assert replica_statements == []
+    with app.app_context():
+        assert Order.query.filter_by(product_id=product_id).count() == 1
+    replica.dispose()
+
+
+def test_isolated_apps_do_not_share_state():
+    """Каждое create_app('testing') получает свою базу, кэш и шлюз: приложения можно гонять параллельно"""
+    apps = [create_app('testing') for _ in range(2)]
+    for isolated in apps:
+        with isolated.app_context():
+            upgrade()
+
+    def register(isolated, name):
+        client = isolated.test_client()
+        for i in range(5):
+            client.post('/register', data={'username': f'{name}-{i}', 'email': f'{name}-{i}@example.com',
+                                           'password': 'secret1', 'confirm_password': 'secret1'})
+
+    threads = [threading.Thread(target=register, args=(isolated, f'app{index}'))
+               for index, isolated in enumerate(apps)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    services = []
+    for index, isolated in enumerate(apps):
+        with isolated.app_context():
+            assert sorted(name for name, in db.session.query(User.username)) == [f'app{index}-{i}' for i in range(5)]
+            services.append(extensions.catalog_cache._get_current_object())
+            db.session.remove()
+            db.engine.dispose()
+    assert services[0] is not services[1]
+
+
+def test_startup_does_not_import_optional_sdks():
+    """Запуск и первый запрос не импортируют stripe: SDK нужен только воркеру, создающему платежи"""
+    from benchmarks.startup import measure
+    run = measure('production', {'DATABASE_URL': 'sqlite://', 'PAYMENT_GATEWAY': 'stripe'})
+    assert run['loaded'] == []
+
+
+def metric_value(text, line_prefix):
+    """Значение строки экспозиции Prometheus, начинающейся с line_prefix"""
+    values = [float(line.rsplit(' ', 1)[1]) for line in text.splitlines() if line.startswith(line_prefix)]
+    assert len(values) == 1, line_prefix
+    return values[0]
+
+
+def test_metrics_record_latency_queries_and_templates(seeded):
+    """/metrics отдает по endpoint число запросов, SQL, время шаблонов и размер ответа"""
+    client = app.test_client()
+    for _ in range(3):
+        assert client.get('/products?category=clothing').status_code == 200
+
+    text = client.get('/metrics').get_data(as_text=True)
+    endpoint = '{endpoint="catalog.products"}'
+    assert metric_value(text, 'resalex_requests_total{endpoint="catalog.products",method="GET",status="200"}') >= 3
+    assert metric_value(text, f'resalex_request_duration_seconds_count{endpoint}') >= 3
+    assert metric_value(text, f'resalex_request_db_queries_sum{endpoint}') >= 1
+    assert metric_value(text, f'resalex_request_db_seconds_sum{endpoint}') > 0
+    assert metric_value(text, f'resalex_request_template_seconds_sum{endpoint}') > 0
+    assert metric_value(text, f'resalex_response_size_bytes_sum{endpoint}') > 1000
+    # Корзины накопительные и заканчиваются +Inf, равной _count
+    assert metric_value(text, 'resalex_request_duration_seconds_bucket{endpoint="catalog.products",le="+Inf"}') == \
+        metric_value(text, f'resalex_request_duration_seconds_count{endpoint}')
+
+
+def test_slow_queries_are_logged_with_route(seeded, monkeypatch, caplog):
+    """SQL дольше SLOW_QUERY_MS пишется в журнал с маршрутом и текстом запроса"""
+    monkeypatch.setattr(app.extensions['metrics'], 'slow_query_seconds', 0)
+    with caplog.at_level('WARNING', logger='resalex.slow_queries'):
+        app.test_client().get(f'/product/{seeded["order"]}')
+    messages = [record.getMessage() for record in caplog.records if record.name == 'resalex.slow_queries']
+    assert messages and all('GET /product/' in message and 'catalog.product_detail' in message for message in messages)
+    assert any('FROM product' in message for message in messages)
+
+
+def test_metrics_need_token_in_production_and_survive_failed_queries(seeded):
+    """В продакшене /metrics без METRICS_TOKEN не подключается; упавший SQL не сбивает замеры"""
+    production = create_app('production', SQLALCHEMY_DATABASE_URI='sqlite://')
+    assert production.test_client().get('/metrics').status_code == 404
+    protected = create_app('production', SQLALCHEMY_DATABASE_URI='sqlite://', METRICS_TOKEN='secret')
+    assert protected.test_client().get('/metrics').status_code == 401
+
+    with app.app_context():
+        connection = db.session.connection()
+        with pytest.raises(Exception):
+            connection.execute(text('SELECT * FROM no_such_table'))
+        assert not connection.info.get('metrics_query_started')
+        db.session.rollback()
+
+
+def test_metrics_are_summed_across_processes(tmp_path, monkeypatch):
+    """С METRICS_DIR /metrics складывает счетчики всех процессов, включая завершившиеся"""
+    from metrics import archive_process
+    isolated = create_app('testing', METRICS_DIR=str(tmp_path), METRICS_TOKEN='secret')
+    client = isolated.test_client()
+    assert client.get('/metrics').status_code == 401
+    headers = {'Authorization': 'Bearer secret'}
+
+    # Снимок другого процесса: 5 запросов к главной
+    other = {'resalex_requests_total': [[['catalog.index', 'GET', '200'], 5]],
+             'resalex_request_duration_seconds': [[['catalog.index'], [5] + [0] * 11 + [0.02]]]}
+    (tmp_path / '999999.json').write_text(json.dumps(other))
+    index_total = 'resalex_requests_total{endpoint="catalog.index",method="GET",status="200"}'
+    text = client.get('/metrics', headers=headers).get_data(as_text=True)
+    assert metric_value(text, index_total) == 5
+    assert metric_value(text, 'resalex_request_duration_seconds_bucket{endpoint="catalog.index",le="0.005"}') == 5
+
+    # Процесс завершился: его счетчики переезжают в архив и не пропадают
+    archive_process(str(tmp_path), 999999)
+    assert not (tmp_path / '999999.json').exists()
+    text = client.get('/metrics', headers=headers).get_data(as_text=True)
+    assert metric_value(text, index_total) == 5
+    assert metric_value(text, 'resalex_requests_total{endpoint="metrics",method="GET",status="200"}') >= 1
+    with isolated.app_context():
+        db.engine.dispose()
+
+
+def test_benchmark_suite_runs_all_workloads(tmp_path):
+    """Нагрузочный прогон на крошечном наборе: все сценарии проходят без ошибок, регрессии видны в сравнении"""
+    from benchmarks.run import run, compare
+    results = run(scale=0.0002, requests=5, warmup=2, rounds=2, data_dir=str(tmp_path),
+                  progress=lambda message: None)
+    assert set(results['workloads']) == {'browse', 'search', 'checkout', 'chat', 'dashboard'}
+    for workload in results['workloads'].values():
+        assert workload['requests'] > 0 and workload['rps'] > 0
+        for route, stats in workload['routes'].items():
+            assert stats['errors'] == 0, route
+            assert 0 < stats['p50_ms'] <= stats['p95_ms'] <= stats['p99_ms']
+
+    assert compare(results, results) == []
+    faster = json.loads(json.dumps(results))
+    faster['workloads']['checkout']['routes']['POST /buy/<id>']['p95_ms'] /= 10
+    assert ('checkout', 'POST /buy/<id>') in [(name, route) for name, route, *_ in compare(results, faster)]
+
+
+def test_bulk_import_batches_and_rejects(seeded, tmp_path):
+    """Импорт CSV/JSONL: INSERT и поиск продавцов по разу на пачку, отклоненные строки в файле ошибок"""
+    from importer import import_file
+    catalog = tmp_path / 'catalog.csv'
+    rows = ['name,brand,category,condition,size,price,description,seller']
+    rows += [f'Imported Zebra {i},Brand,sneakers,new,42,{10 + i},Import,' for i in range(5)]
+    rows += ['Not a seller,Brand,sneakers,new,42,10,,user-test',
+             'Unknown seller,Brand,sneakers,new,42,10,,nobody',
+             'Bad category,Brand,food,new,42,10,,']
+    catalog.write_text('\n'.join(rows) + '\n')
+
+    with app.app_context():
+        listings = db.session.get(UserStats, seeded['seller']).active_listings
+        with capture_queries() as statements:
+            report, rejected_path = import_file('products', str(catalog), batch_size=4,
+                                                seller='seller-test', status='approved')
+        assert (report['rows'], report['imported'], report['rejected']) == (8, 5, 3)
+        assert report['rows_per_second'] > 0
+        product_inserts = [sql for sql, _ in statements if sql.startswith('INSERT INTO product ')]
+        seller_lookups = [sql for sql, _ in statements if sql.startswith('SELECT') and 'FROM user' in sql]
+        assert len(product_inserts) == 2 and len(seller_lookups) <= 2
+
+        errors = rejected_path and open(rejected_path).read()
+        assert 'user-test не может продавать' in errors and 'nobody не найден' in errors and 'category:' in errors
+        # Опубликованные товары сразу в поиске и в счетчике продавца
+        assert db.session.get(UserStats, seeded['seller']).active_listings == listings + 5
+    assert b'Imported Zebra 3' in app.test_client().get('/products?search=zebra').data
+
+    users = tmp_path / 'users.jsonl'
+    users.write_text('\n'.join([
+        json.dumps({'username': 'imported-a', 'email': 'a@example.com', 'password': 'secret123'}),
+        json.dumps({'username': 'imported-b', 'email': 'b@example.com', 'role': 'seller'}),
+        json.dumps({'username': 'admin-test', 'email': 'c@example.com'}),
+        '{broken',
+    ]) + '\n')
+    with app.app_context():
+        report, rejected_path = import_file('users', str(users))
+        assert (report['imported'], report['rejected']) == (2, 2)
+        assert User.query.filter_by(username='imported-a').one().check_password('secret123')
+        # Без пароля вход закрыт, пока его не зададут
+        assert not User.query.filter_by(username='imported-b').one().check_password('')
+        assert sorted(json.loads(line)['line'] for line in open(rejected_path)) == [3, 4]
+
+        Product.query.filter(Product.name.like('Imported Zebra%')).delete(synchronize_session=False)
+        User.query.filter(User.username.like('imported-%')).delete(synchronize_session=False)
+        search_backend.rebuild()
+        rebuild_user_stats()
+        db.session.commit()
+
+
+def test_demo_orders_update_seller_counters(monkeypatch):
+    """Демо-заказы проходят через счетчики продавца: бейдж и дашборд совпадают с таблицами"""
+    monkeypatch.setattr(demo_data.random, 'choice', lambda items: items[0])
+    isolated = create_app('testing')
+    with isolated.app_context():
+        upgrade()
+        demo_data.create_demo_users()
+        demo_data.create_demo_products()
+        demo_data.create_demo_orders()
+        seller = User.query.filter_by(username='seller1').one()
+        orders = Order.query.join(Order.product).filter(Product.seller_id == seller.id).all()
+        expected = compute_user_stats([seller.id])[0]
+        assert len(orders) == 4 and expected['pending_orders'] == 2
+        assert expected['lifetime_gmv'] == pytest.approx(sum(order.total_amount for order in orders))
+
+    client = isolated.test_client()
+    login(client, seller.id)
+    counts = client.get('/api/notifications/unread').get_json()
+    assert counts['pending_orders'] == expected['pending_orders']
+    with isolated.app_context():
+        stats = db.session.get(UserStats, seller.id)
+        assert stats.lifetime_gmv == pytest.approx(expected['lifetime_gmv'])
+
+
+def test_exports_stream_in_batches_with_filters(seeded, monkeypatch):
+    """Выгрузки идут потоком пачками по EXPORT_BATCH_SIZE, с фильтрами и только в пределах прав"""
+    import csv as csv_module
+    import exporter
+    monkeypatch.setattr(exporter, 'EXPORT_BATCH_SIZE', 5)
+    seller, admin, buyer = app.test_client(), app.test_client(), app.test_client()
+    login(seller, seeded['seller'])
+    login(admin, seeded['admin'])
+    login(buyer, seeded['user'])
+
+    response = seller.get('/export/products.csv')
+    assert response.status_code == 200 and response.is_streamed
+    assert response.headers['Content-Disposition'].startswith('attachment; filename="products-')
+    chunks = list(response.response)
+    rows = list(csv_module.DictReader(io.StringIO(b''.join(chunks).decode('utf-8-sig'))))
+    with app.app_context():
+        own = Product.query.filter_by(seller_id=seeded['seller']).count()
+        admin_own = Product.query.filter_by(seller_id=seeded['admin']).count()
+        pending = Product.query.filter(Product.seller_id == seeded['seller'],
+                                       Product.status.in_(['pending', 'rejected'])).count()
+    assert len(rows) == own and len(chunks) >= own // 5
+    assert {row['seller_id'] for row in rows} == {str(seeded['seller'])}
+
+    text = seller.get('/export/products.csv?status=pending,rejected').get_data(as_text=True)
+    assert len(text.strip().splitlines()) == 1 + pending
+    assert seller.get('/export/products.csv?to=2000-01-01').get_data(as_text=True).count('\n') == 1
+    # Продавец не выгрузит чужое, подставив seller_id
+    assert len(admin.get(f'/export/products.csv?seller_id={seeded["admin"]}').get_data().splitlines()) == 1 + admin_own
+    assert len(seller.get(f'/export/products.csv?seller_id={seeded["admin"]}').get_data().splitlines()) == 1 + own
+
+    orders = [json.loads(line) for line in admin.get('/export/orders.jsonl?status=paid').get_data().splitlines()]
+    users = [json.loads(line) for line in admin.get('/export/users.jsonl?role=seller').get_data().splitlines()]
+    with app.app_context():
+        assert [order['id'] for order in orders] == \
+            [order_id for (order_id,) in db.session.query(Order.id).filter_by(status='paid').order_by(Order.id)]
+        assert [user['username'] for user in users] == \
+            [username for (username,) in db.session.query(User.username).filter_by(role='seller').order_by(User.id)]
+    assert all(order['buyer'] and order['seller'] for order in orders)
+
+    assert buyer.get('/export/orders.csv').status_code == 403
+    assert seller.get('/export/users.csv').status_code == 403
+    assert admin.get('/export/orders.csv?status=lost').status_code == 400
+    assert admin.get('/export/orders.csv?from=yesterday').status_code == 400
+    assert admin.get('/export/orders.xml').status_code == 404
+
+
+def test_password_rehash_rate_limits_and_busy_hasher():
+    """
+    Смена PASSWORD_HASH_METHOD пересчитывает хэш при входе; лимиты по IP и аккаунту отвечают 429
+    до хэширования, а переполненный пул хэширования — 503
+    """
+    from passwords import PasswordHasher, PasswordHasherBusy
+    from werkzeug.security import generate_password_hash
+
+    isolated = create_app('testing', PASSWORD_HASH_METHOD='bcrypt:4', LOGIN_IP_LIMIT=8,
+                          LOGIN_ACCOUNT_LIMIT=3, REGISTER_IP_LIMIT=1)
+    with isolated.app_context():
+        upgrade()
+        db.session.add(User(username='legacy', email='legacy@example.com',
+                            password_hash=generate_password_hash('secret1', 'pbkdf2:sha256:1000')))
+        db.session.commit()
+    client = isolated.test_client()
+
+    def login(username, password, **environ):
+        return client.post('/login', data={'username': username, 'password': password},
+                           environ_base={'REMOTE_ADDR': '10.0.0.1', **environ})
+
+    # Старый pbkdf2-хэш подходит и заменяется bcrypt с новой стоимостью
+    assert login('legacy', 'secret1').status_code == 302
+    client.get('/logout')
+    with isolated.app_context():
+        assert db.session.query(User.password_hash).filter_by(username='legacy').scalar().startswith('$2b$04$')
+    assert login('legacy', 'secret1').status_code == 302
+    client.get('/logout')
+
+    # Неудачные попытки блокируют аккаунт, и проверка пароля уже не запускается
+    verified = []
+    hasher = isolated.extensions['resalex']['password_hasher']
+    original_verify = hasher.verify
+    hasher.verify = lambda *args: verified.append(1) or original_verify(*args)
+    for _ in range(3):
+        assert login('legacy', 'wrong-password').status_code == 200
+    blocked = login('legacy', 'secret1')
+    assert blocked.status_code == 429 and int(blocked.headers['Retry-After']) > 0
+    assert len(verified) == 3
+    # Другой аккаунт с того же IP пускают, пока не исчерпан лимит IP (8 попыток за окно)
+    assert login('nobody', 'secret1').status_code == 200
+    assert login('nobody', 'secret1').status_code == 200
+    assert login('nobody', 'secret1').status_code == 429
+    assert login('nobody', 'secret1', REMOTE_ADDR='10.0.0.2').status_code == 200
+
+    register = {'password': 'secret1', 'confirm_password': 'secret1'}
+    assert client.post('/register', data={'username': 'fresh1', 'email': 'fresh1@example.com', **register}).status_code == 302
+    assert client.post('/register', data={'username': 'fresh2', 'email': 'fresh2@example.com', **register}).status_code == 429
+
+    # Все слоты пула заняты: запрос ждет не дольше wait и получает 503
+    busy = PasswordHasher('pbkdf2:sha256:1000', workers=1, queue=0, wait=0.05)
+    busy._slots.acquire()
+    with pytest.raises(PasswordHasherBusy):
+        busy.verify(None, 'secret1')
+    isolated.extensions['resalex']['password_hasher'] = busy
+    response = login('fresh1', 'secret1', REMOTE_ADDR='10.0.0.3')
+    assert response.status_code == 503 and response.headers['Retry-After']
+    busy._slots.release()
+    assert busy.needs_rehash(generate_password_hash('x', 'pbkdf2:sha256:2000'))
+    assert not busy.needs_rehash(busy.hash('secret1'))
+    # Неполная настройка дополняется параметрами по умолчанию, как их пишет werkzeug: без лишних пересчетов
+    partial = PasswordHasher('scrypt:1024')
+    assert partial.method == 'scrypt:1024:8:1'
+    assert not partial.needs_rehash(partial.hash('secret1'))
+    assert partial.needs_rehash(generate_password_hash('x', 'scrypt:2048:8:1'))
+    assert not PasswordHasher('pbkdf2:sha256').needs_rehash(generate_password_hash('x', 'pbkdf2'))
+    # Возврат с bcrypt на scrypt пересчитывает bcrypt-хэши
+    assert PasswordHasher('scrypt').needs_rehash(PasswordHasher('bcrypt:4').hash('secret1'))
+    with isolated.app_context():
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,158 @@
+"""
+ResaleX - Загруженные изображения
+Прием загрузок, учет ссылок на изображения, фоновые задачи сборки и удаления вариантов
+и функции шаблонов для выбора варианта.
+"""
+
+from datetime import datetime
+
+from flask import request, flash, current_app, g
+from database import insert_or_ignore
+from images import (inspect_image, content_key, write_variants, key_url, delete_image,
+                    image_key, variant_url, srcset, ImageError)
+from storage import hash_stream
+from extensions import db, image_storage, upload_staging, ready_images
+from models import job_queue, invalidate_after_commit, StoredImage, Product, User
+
+# Загруженные изображения: варианты thumb/card/detail в WebP и JPEG с именами по хэшу содержимого.
+# Запрос проверяет файл и ставит задачу, варианты кодирует воркер. StoredImage.ref_count считает
+# ссылки из товаров и профилей: файлы удаляются, только когда последняя ссылка исчезла
+def store_upload(file):
+    """
+    Принимает загруженное изображение и засчитывает ссылку на него; вызывающий присваивает URL
+    товару или профилю. Если файл не читается, показывает ошибку и возвращает None
+    """
+    digest, spool = hash_stream(file.stream)
+    with spool:
+        try:
+            inspect_image(spool)
+        except ImageError as exc:
+            flash(str(exc), 'error')
+            return None
+        
+        key = content_key(digest)
+        if add_reference(key):
+            # Новое содержимое: оригинал ждет воркера в закрытом хранилище
+            spool.seek(0)
+            upload_staging.put(key, spool)
+            job_queue.enqueue('image_variants', key=key)
+    return key_url(key, image_storage)
+
+def add_reference(key):
+    """
+    Засчитывает ссылку на изображение; True, если его еще не было. Две одновременные первые
+    загрузки одного файла не вставят ключ дважды: проигравшая вставка превращается
+    в увеличение ref_count.
+    """
+    inserted = insert_or_ignore(db, StoredImage, ['key'], key=key, ref_count=1)
+    if not inserted:
+        db.session.query(StoredImage).filter(StoredImage.key == key).update(
+            {StoredImage.ref_count: StoredImage.ref_count + 1}, synchronize_session=False
+        )
+    return inserted
+
+def release_image(url):
+    """Снимает ссылку на изображение; файлы удалит воркер, если ссылок не осталось"""
+    if not url:
+        return
+    key = image_key(url)
+    if key:
+        db.session.query(StoredImage).filter(StoredImage.key == key).update(
+            {StoredImage.ref_count: StoredImage.ref_count - 1}, synchronize_session=False
+        )
+    job_queue.enqueue('release_image', url=url)
+
+@job_queue.handler('image_variants')
+def build_image_variants(key):
+    stored = db.session.get(StoredImage, key)
+    if stored is None or stored.ready:
+        # Изображение уже удалено или собрано другой задачей
+        return
+    with upload_staging.open(key) as source:
+        write_variants(source, key, image_storage)
+    stored.ready = True
+    url = key_url(key, image_storage)
+    # Страницы каталога с заглушкой вместо этого изображения больше не актуальны
+    categories = db.session.query(Product.category).filter(
+        Product.image_url == url, Product.status == 'approved'
+    ).distinct().all()
+    # ETag и Last-Modified страниц строятся из updated_at: без сдвига браузеры и CDN
+    # продолжали бы получать 304 и показывать заглушку
+    db.session.query(Product).filter(Product.image_url == url).update(
+        {Product.updated_at: datetime.utcnow()}, synchronize_session=False)
+    if categories:
+        invalidate_after_commit('catalog:all', *(f'catalog:{category}' for category, in categories))
+    db.session.commit()
+    upload_staging.delete(key)
+
+@job_queue.handler('release_image')
+def release_unused_image(url):
+    key = image_key(url)
+    if key is None:
+        # Старые загрузки без вариантов не учтены в StoredImage: проверяем ссылки напрямую
+        in_use = db.session.query(Product.id).filter(Product.image_url == url).first() or \
+            db.session.query(User.id).filter(User.avatar_url == url).first()
+        if not in_use:
+            delete_image(url, image_storage)
+        return
+    # Удаляем запись, только если ссылок по-прежнему нет: новая загрузка того же файла
+    # до этого момента увеличила бы ref_count
+    deleted = db.session.query(StoredImage).filter(StoredImage.key == key, StoredImage.ref_count <= 0) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    if deleted:
+        ready_images.discard(key)
+        delete_image(url, image_storage)
+        upload_staging.delete(key)
+
+def preload_images(urls):
+    """
+    Готовность изображений списка одним запросом: после этого image_ready для этих URL
+    до конца запроса не обращается к базе, сколько бы строк ни было в таблице или выдаче
+    """
+    states = g.setdefault('image_states', {})
+    keys = {key for key in map(image_key, urls) if key and key not in ready_images and key not in states}
+    if not keys:
+        return
+    stored = dict(db.session.query(StoredImage.key, StoredImage.ready).filter(StoredImage.key.in_(keys)))
+    for key in keys:
+        # Изображение без записи считается готовым, как и в image_ready
+        states[key] = stored.get(key, True)
+    ready_images.update(key for key, ready in stored.items() if ready)
+
+def image_ready(url):
+    """Собраны ли варианты изображения; старые загрузки без вариантов считаются готовыми"""
+    key = image_key(url)
+    if key is None or key in ready_images:
+        return True
+    if key in g.get('image_states', {}):
+        return g.image_states[key]
+    stored = db.session.get(StoredImage, key)
+    if stored is None:
+        return True
+    if stored.ready:
+        ready_images.add(key)
+    return stored.ready
+
+def image_variant(url, variant, fmt='jpg'):
+    # Старые записи edit_product и edit_profile хранили только имя файла
+    if url and '/' not in url:
+        url = f"{current_app.config['UPLOAD_URL']}/{url}"
+    return variant_url(url, variant, fmt)
+
+def image_srcset(url, fmt='jpg', variants=('card', 'detail')):
+    return srcset(url, fmt, variants)
+
+def cache_hashed_uploads(response):
+    # Имена вариантов содержат хэш содержимого, поэтому файл по такому URL никогда не меняется
+    if request.endpoint == 'static' and response.status_code == 200 and image_key(request.path):
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    return response
+
+def init_app(app):
+    app.add_template_global(image_ready, 'image_ready')
+    app.add_template_filter(image_variant, 'image_variant')
+    app.add_template_global(image_srcset, 'image_srcset')
+    app.after_request(cache_hashed_uploads)
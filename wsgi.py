@@ -0,0 +1,15 @@
+"""
+ResaleX - Точка входа WSGI для продакшен-сервера
+Запуск: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import os
+
+# Продакшен-сервер по умолчанию работает с ProductionConfig; FLASK_ENV можно переопределить
+os.environ.setdefault('FLASK_ENV', 'production')
+
+from app import create_app  # noqa: E402
+
+app = create_app()
+
+application = app